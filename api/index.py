@@ -3,6 +3,7 @@ Vercel serverless function для парсера лизинга
 """
 import sys
 import os
+import threading
 import traceback
 
 # Настройка логирования в самом начале
@@ -14,89 +15,47 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Определяем корневую директорию проекта
-# На Vercel файлы находятся в /var/task, но структура может отличаться
-try:
-    # Текущая директория файла (api/)
-    current_file_dir = os.path.dirname(os.path.abspath(__file__))
-    # Родительская директория (корень проекта)
-    project_root = os.path.dirname(current_file_dir)
-    
-    # Проверяем разные возможные пути
-    possible_roots = [
-        '/var/task',  # Vercel production
-        project_root,  # Локальная разработка
-        os.getcwd(),  # Текущая рабочая директория
-    ]
-    
-    root_dir = None
-    for possible_root in possible_roots:
-        # Проверяем наличие ключевых файлов
-        if os.path.exists(possible_root) and (
-            os.path.exists(os.path.join(possible_root, 'parser.py')) or
-            os.path.exists(os.path.join(possible_root, 'database.py'))
-        ):
-            root_dir = possible_root
-            break
-    
-    # Если не нашли, используем родительскую директорию
-    if not root_dir:
-        root_dir = project_root
-    
-    # Добавляем все возможные пути в sys.path
-    for path in possible_roots + [root_dir]:
-        if path and os.path.exists(path) and path not in sys.path:
-            sys.path.insert(0, path)
-    
-    # Ищем шаблоны в разных местах
-    template_dirs = [
-        os.path.join(root_dir, 'templates'),
-        os.path.join(project_root, 'templates'),
-        os.path.join('/var/task', 'templates'),
-        'templates',
-    ]
-    
-    template_dir = None
-    for td in template_dirs:
-        if os.path.exists(td):
-            template_dir = td
-            break
-    
-    if not template_dir:
-        template_dir = os.path.join(root_dir, 'templates')
-    
-    logger.info(f"Root dir: {root_dir}")
-    logger.info(f"Template dir: {template_dir}")
-    logger.info(f"Template exists: {os.path.exists(template_dir)}")
-    logger.info(f"Current dir: {os.getcwd()}")
-    logger.info(f"Files in root: {os.listdir(root_dir)[:10] if os.path.exists(root_dir) else 'N/A'}")
-    
-except Exception as e:
-    logger.error(f"Ошибка при настройке путей: {e}")
-    logger.error(traceback.format_exc())
-    # Продолжаем с дефолтными значениями
-    root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    template_dir = os.path.join(root_dir, 'templates')
+# На Vercel файлы находятся в /var/task, но структура может отличаться.
+# При импорте делаем только дешевые проверки: холодный старт serverless-функции
+# не должен тратить время на обход файловой системы (подробности - в /test и /api/health)
+current_file_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_file_dir)
+
+# Возможные корни проекта в порядке приоритета
+possible_roots = [
+    '/var/task',  # Vercel production
+    project_root,  # Локальная разработка
+    os.getcwd(),  # Текущая рабочая директория
+]
+
+root_dir = next(
+    (path for path in possible_roots if os.path.exists(os.path.join(path, 'database.py'))),
+    project_root
+)
+if root_dir not in sys.path:
+    sys.path.insert(0, root_dir)
+
+template_dir = os.path.join(root_dir, 'templates')
+if not os.path.exists(template_dir):
+    template_dir = os.path.join(project_root, 'templates')
 
 # Импорт модулей с обработкой ошибок
 try:
-    from flask import Flask, render_template, jsonify, request
-    logger.info("Flask импортирован успешно")
+    from flask import Flask, Response, render_template, jsonify, request, stream_with_context
 except ImportError as e:
     logger.error(f"Ошибка импорта Flask: {e}")
     logger.error(traceback.format_exc())
     raise
 
-# Импортируем модули проекта
+# Импортируем модули проекта. Парсер (bs4, requests) тяжелый и нужен только
+# маршрутам запуска парсинга, поэтому загружается лениво (см. load_parsers)
 Database = None
-run_all_parsers = None
 
 try:
     from database import Database
-    logger.info("Database импортирован успешно")
 except ImportError as e:
     logger.error(f"Ошибка импорта Database: {e}")
     logger.error(f"sys.path: {sys.path}")
-    logger.error(f"Проверяемые пути: {[p for p in sys.path[:5] if os.path.exists(p)]}")
     logger.error(traceback.format_exc())
     # Создаем заглушку для диагностики
     class DatabaseStub:
@@ -105,62 +64,103 @@ except ImportError as e:
     Database = DatabaseStub
 
 try:
-    from parser import run_all_parsers
-    logger.info("Parser импортирован успешно")
+    from response_cache import cached_response
 except ImportError as e:
-    logger.error(f"Ошибка импорта Parser: {e}")
-    logger.error(f"sys.path: {sys.path}")
-    logger.error(traceback.format_exc())
-    def run_all_parsers_stub():
-        raise ImportError(f"Parser module not found. sys.path: {sys.path[:5]}")
-    run_all_parsers = run_all_parsers_stub
+    logger.error(f"Ошибка импорта response_cache: {e}")
+    # Без кэша ответов приложение работает, просто каждый запрос идет в базу
+    def cached_response(get_generation, ttl=None):
+        return lambda view: view
+
+try:
+    from resilience import BREAKERS
+except ImportError as e:
+    logger.error(f"Ошибка импорта resilience: {e}")
+    BREAKERS = None
+
+try:
+    import metrics
+except ImportError as e:
+    logger.error(f"Ошибка импорта metrics: {e}")
+    metrics = None
+
+try:
+    from crawl_lock import CRAWL_LOCK_NAME
+    from jobs import CRAWL_JOBS, run_crawl
+except ImportError as e:
+    logger.error(f"Ошибка импорта jobs: {e}")
+    CRAWL_LOCK_NAME = CRAWL_JOBS = run_crawl = None
+
+# На Vercel запись возможна только в /tmp: там хранятся база и HTTP-кэш парсеров
+os.environ.setdefault('LEASING_DB_PATH', os.path.join('/tmp', 'leasing_products.db'))
+os.environ.setdefault('PARSER_HTTP_CACHE_DIR', os.path.join('/tmp', 'http_cache'))
+
+# Лимит времени функции: должен совпадать с maxDuration для api/index.py в vercel.json
+FUNCTION_MAX_DURATION = float(os.environ.get('FUNCTION_MAX_DURATION', '300'))
+# После ответа Vercel замораживает функцию вместе с фоновыми потоками, поэтому
+# запрос запуска парсинга ждет задачу до JOB_WAIT_TIMEOUT секунд. Ожидание
+# заканчивается за JOB_RESPONSE_MARGIN секунд до лимита функции, чтобы успеть
+# ответить. Не дождавшись, возвращает 202 и id задачи для /api/jobs/<id>.
+JOB_RESPONSE_MARGIN = 20
+JOB_WAIT_TIMEOUT = min(
+    float(os.environ.get('JOB_WAIT_TIMEOUT', FUNCTION_MAX_DURATION - JOB_RESPONSE_MARGIN)),
+    FUNCTION_MAX_DURATION - JOB_RESPONSE_MARGIN,
+)
+
+
+def load_parsers():
+    """Импортирует парсер при первом запуске парсинга. ImportError, если модуль недоступен."""
+    try:
+        from parser import run_parsers
+    except ImportError as e:
+        logger.error(f"Ошибка импорта Parser: {e}")
+        logger.error(f"sys.path: {sys.path}")
+        logger.error(traceback.format_exc())
+        raise ImportError(f"Parser module not found. sys.path: {sys.path[:5]}") from e
+    return run_parsers
+
+
+def diagnostics():
+    """Сведения о путях и модулях для /test и /api/health (обход файловой системы - только здесь)"""
+    files_in_root = []
+    try:
+        files_in_root = [f for f in os.listdir(root_dir) if f.endswith('.py')][:5]
+    except OSError:
+        pass
+    return {
+        'root_dir': root_dir,
+        'possible_roots': {path: os.path.exists(path) for path in possible_roots},
+        'template_dir': template_dir,
+        'template_exists': os.path.exists(template_dir),
+        'files_in_root': files_in_root,
+        'sys_path': sys.path[:5],
+        'cwd': os.getcwd(),
+        'modules_loaded': {
+            'Database': Database is not None,
+            'parser': 'parser' in sys.modules,
+        }
+    }
 
 # Настройка Flask приложения
 try:
-    # Если шаблоны не найдены, используем относительный путь
-    if not os.path.exists(template_dir):
-        logger.warning(f"Template dir не найден: {template_dir}, пробуем относительный путь")
-        template_dir = 'templates'
-    
     app = Flask(__name__, template_folder=template_dir)
-    logger.info(f"Flask app создан. Template dir: {template_dir}")
-    logger.info(f"Template dir существует: {os.path.exists(template_dir)}")
-    
-    # Проверяем наличие модулей
-    if Database is None or run_all_parsers is None:
-        logger.warning("Некоторые модули не загружены! Приложение может работать некорректно.")
-        
 except Exception as e:
     logger.error(f"Ошибка при создании Flask app: {e}")
     logger.error(traceback.format_exc())
     # Создаем минимальное приложение для диагностики
     app = Flask(__name__)
 
+if metrics is not None:
+    metrics.instrument_app(app)
+
 # Простой тестовый endpoint для проверки работоспособности
 @app.route('/test', methods=['GET'])
 def test():
     """Простой тест для проверки работоспособности"""
     try:
-        files_in_root = []
-        if os.path.exists(root_dir):
-            try:
-                files_in_root = [f for f in os.listdir(root_dir) if f.endswith('.py')][:5]
-            except:
-                pass
-        
         return jsonify({
             'status': 'ok',
             'message': 'Serverless function работает!',
-            'root_dir': root_dir,
-            'template_dir': template_dir,
-            'template_exists': os.path.exists(template_dir),
-            'files_in_root': files_in_root,
-            'sys_path': sys.path[:5],
-            'cwd': os.getcwd(),
-            'modules_loaded': {
-                'Database': Database is not None,
-                'run_all_parsers': run_all_parsers is not None
-            }
+            **diagnostics()
         })
     except Exception as e:
         return jsonify({
@@ -169,22 +169,42 @@ def test():
             'traceback': traceback.format_exc()
         }), 500
 
-# Инициализация БД с путем для Vercel
+# База и ее движок создаются один раз на "теплый" контейнер: create_all и миграции
+# выполняются при первом обращении, дальше запросы берут сессии из общего пула
+_db = None
+_db_lock = threading.Lock()
+
 def get_db():
-    """Получает экземпляр базы данных"""
+    """Получает общий экземпляр базы данных"""
+    global _db
     if Database is None:
         raise ImportError("Database module not imported. Check logs for details.")
     
-    # На Vercel используем /tmp для записи файлов БД
-    # /tmp доступен для записи в serverless функциях
-    db_path = os.path.join('/tmp', 'leasing_products.db')
-    try:
-        return Database(db_path=db_path)
-    except Exception as e:
-        logger.error(f"Ошибка при создании БД: {e}", exc_info=True)
-        raise
+    if _db is None:
+        with _db_lock:
+            if _db is None:
+                try:
+                    _db = Database()
+                except Exception as e:
+                    logger.error(f"Ошибка при создании БД: {e}", exc_info=True)
+                    raise
+    return _db
+
+@app.teardown_appcontext
+def remove_session(exception=None):
+    """Возвращает соединение сессии запроса в пул"""
+    if _db is not None:
+        _db.remove_session()
+
+def get_generation():
+    """Поколение данных для кэша ответов"""
+    return get_db().get_generation()
+
+# Выборка "за последние 24 часа" устаревает и без новых данных, поэтому кэшируется ненадолго
+RECENT_CACHE_TTL = 300
 
 @app.route('/', methods=['GET'])
+@cached_response(get_generation)
 def index():
     """Главная страница с результатами парсинга"""
     try:
@@ -197,46 +217,22 @@ def index():
                 'root_dir': root_dir
             }), 500
         
-        db = get_db()
-        products = db.get_all_products(limit=200)
-        products_48_months = db.get_products_48_months()
-        
-        # Группируем по сайтам
-        products_by_site = {}
-        for product in products:
-            site = product['site']
-            if site not in products_by_site:
-                products_by_site[site] = []
-            products_by_site[site].append(product)
-        
-        # Группируем товары с 48 месяцами по сайтам
-        products_48_by_site = {}
-        for product in products_48_months:
-            site = product['site']
-            if site not in products_48_by_site:
-                products_48_by_site[site] = []
-            products_48_by_site[site].append(product)
-        
-        db.close()
-        
         # Проверяем наличие шаблона
         template_path = os.path.join(template_dir, 'index.html')
         if not os.path.exists(template_path):
             logger.warning(f"Template not found: {template_path}")
             # Возвращаем JSON вместо HTML если шаблон не найден
+            summary = get_db().get_site_summary()
             return jsonify({
                 'error': 'Template not found',
                 'template_path': template_path,
-                'products_by_site': products_by_site,
-                'total_count': len(products),
-                'count_48_months': len(products_48_months)
+                'sites': summary,
+                'total_count': sum(site['product_count'] for site in summary),
+                'count_48_months': sum(site['count_48'] for site in summary)
             })
         
-        return render_template('index.html', 
-                             products_by_site=products_by_site,
-                             products_48_by_site=products_48_by_site,
-                             total_count=len(products),
-                             count_48_months=len(products_48_months))
+        from dashboard import build_dashboard
+        return render_template('index.html', **build_dashboard(get_db()))
     except Exception as e:
         logger.error(f"Ошибка в index: {e}", exc_info=True)
         error_details = traceback.format_exc()
@@ -250,73 +246,118 @@ def index():
         }), 500
 
 @app.route('/api/products', methods=['GET'])
+@cached_response(get_generation)
 def api_products():
-    """API endpoint для получения всех товаров"""
+    """
+    API endpoint для постраничного получения товаров.
+
+    Параметры: limit, cursor, site, since, months, min_price, max_price, sort=price.
+    """
     try:
-        db = get_db()
-        products = db.get_all_products(limit=200)
-        db.close()
-        return jsonify(products)
+        from product_filters import parse_page_args
+        try:
+            page = parse_page_args(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify(get_db().get_products_page(**page))
     except Exception as e:
         logger.error(f"Ошибка в api_products: {e}", exc_info=True)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/products/<site>', methods=['GET'])
+@cached_response(get_generation)
 def api_products_by_site(site):
-    """API endpoint для получения товаров по сайту"""
+    """API endpoint для постраничного получения товаров по сайту"""
     try:
-        db = get_db()
-        products = db.get_products_by_site(site)
-        db.close()
-        return jsonify(products)
+        from product_filters import parse_page_args
+        try:
+            page = parse_page_args(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        page['site'] = site
+        return jsonify(get_db().get_products_page(**page))
     except Exception as e:
         logger.error(f"Ошибка в api_products_by_site: {e}", exc_info=True)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/recent', methods=['GET'])
+@cached_response(get_generation, ttl=RECENT_CACHE_TTL)
 def api_recent():
     """API endpoint для получения недавно найденных товаров"""
     try:
-        db = get_db()
-        products = db.get_recent_products(hours=24)
-        db.close()
-        return jsonify(products)
+        return jsonify(get_db().get_recent_products(hours=24))
     except Exception as e:
         logger.error(f"Ошибка в api_recent: {e}", exc_info=True)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/products/48months', methods=['GET'])
+@cached_response(get_generation)
 def api_products_48_months():
     """API endpoint для получения товаров с лизингом на 48 месяцев"""
     try:
-        db = get_db()
-        products = db.get_products_48_months()
-        db.close()
-        return jsonify(products)
+        return jsonify(get_db().get_products_48_months())
     except Exception as e:
         logger.error(f"Ошибка в api_products_48_months: {e}", exc_info=True)
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/export', methods=['GET'])
+def api_export():
+    """Потоковая выгрузка всех товаров: format=ndjson|csv, gzip=1 для сжатия"""
+    try:
+        from export import EXPORT_FORMATS, export_filename, export_stream
+        fmt = request.args.get('format', 'ndjson')
+        compress = request.args.get('gzip') in ('1', 'true')
+        try:
+            stream = export_stream(get_db(), fmt, compress)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        return Response(
+            stream_with_context(stream),
+            mimetype='application/gzip' if compress else EXPORT_FORMATS[fmt],
+            headers={'Content-Disposition': f'attachment; filename={export_filename(fmt, compress)}'},
+        )
+    except Exception as e:
+        logger.error(f"Ошибка в api_export: {e}", exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
+def start_crawl(trigger):
+    """
+    Ставит парсинг в очередь (или присоединяется к идущему) и ждет его до JOB_WAIT_TIMEOUT.
+
+    Возвращает (ответ, код): 200 с результатом, если задача завершилась, иначе 202.
+    """
+    load_parsers()
+    if CRAWL_JOBS is None:
+        raise ImportError("Jobs module not loaded. Check server logs.")
+    db = get_db()
+    job, created = CRAWL_JOBS.submit(lambda progress: run_crawl(db, progress), trigger=trigger)
+    job.wait(JOB_WAIT_TIMEOUT)
+    body = {
+        'success': job.status != 'error',
+        'job_id': job.id,
+        'coalesced': not created,
+        'status_url': f'/api/jobs/{job.id}',
+        'job': job.to_dict(),
+    }
+    if job.status == 'done':
+        body.update(job.result)
+    elif job.status == 'error':
+        body['error'] = job.error
+    return body, 200 if job.finished else 202
+
 @app.route('/api/refresh', methods=['POST'])
 def api_refresh():
     """API endpoint для ручного запуска парсинга"""
     try:
-        if run_all_parsers is None:
+        try:
+            body, status = start_crawl('manual')
+        except ImportError:
             return jsonify({
                 'success': False,
                 'error': 'Parser module not loaded. Check server logs.'
             }), 500
-        
-        db = get_db()
-        results = run_all_parsers()
-        added = db.add_products(results)
-        db.close()
-        return jsonify({
-            'success': True,
-            'found': len(results),
-            'added': added,
-            'message': f'Найдено {len(results)} товаров, добавлено {added} новых'
-        })
+        return jsonify(body), status
     except Exception as e:
         logger.error(f"Ошибка при парсинге: {e}", exc_info=True)
         return jsonify({
@@ -325,21 +366,26 @@ def api_refresh():
             'traceback': traceback.format_exc()
         }), 500
 
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def api_job(job_id):
+    """Статус задачи парсинга и ход по сайтам"""
+    job = CRAWL_JOBS.get(job_id) if CRAWL_JOBS is not None else None
+    if job is None:
+        # Задачи хранятся в памяти экземпляра функции: другой экземпляр о ней не знает
+        return jsonify({'error': 'Задача не найдена'}), 404
+    return jsonify(job.to_dict())
+
 @app.route('/api/health', methods=['GET'])
 def api_health():
     """Health check endpoint для диагностики"""
     try:
         return jsonify({
             'status': 'ok',
-            'root_dir': root_dir,
-            'template_dir': template_dir,
-            'template_exists': os.path.exists(template_dir),
-            'sys_path': sys.path[:5],
-            'cwd': os.getcwd(),
-            'modules_loaded': {
-                'Database': Database is not None,
-                'run_all_parsers': run_all_parsers is not None
-            }
+            **diagnostics(),
+            # Предохранители сайтов живут в "теплом" контейнере между запусками парсинга
+            'breakers': BREAKERS.snapshot() if BREAKERS is not None else {},
+            # Аренда блокировки парсинга: какой процесс сейчас обходит сайты
+            'crawl_lock': get_db().get_lock(CRAWL_LOCK_NAME) if CRAWL_LOCK_NAME is not None else None,
         })
     except Exception as e:
         return jsonify({
@@ -347,6 +393,13 @@ def api_health():
             'error': str(e)
         }), 500
 
+@app.route('/api/metrics', methods=['GET'])
+def api_metrics():
+    """Метрики производительности в формате Prometheus (замеры этого экземпляра функции)"""
+    if metrics is None or not metrics.METRICS_ENABLED:
+        return jsonify({'error': 'Metrics disabled'}), 404
+    return Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
 @app.route('/api/cron', methods=['GET', 'POST'])
 def api_cron():
     """Cron job для автоматического парсинга (2 раза в сутки)"""
@@ -358,25 +411,21 @@ def api_cron():
         if cron_secret and auth_header != f'Bearer {cron_secret}':
             return jsonify({'error': 'Unauthorized'}), 401
         
-        if run_all_parsers is None:
+        try:
+            body, status = start_crawl('cron')
+        except ImportError:
             logger.error("Parser module not loaded in cron job")
             return jsonify({
                 'success': False,
                 'error': 'Parser module not loaded'
             }), 500
-        
-        db = get_db()
-        results = run_all_parsers()
-        added = db.add_products(results)
-        db.close()
-        
-        logger.info(f"Cron job выполнен. Найдено: {len(results)}, Добавлено: {added}")
-        return jsonify({
-            'success': True,
-            'found': len(results),
-            'added': added,
-            'message': f'Найдено {len(results)} товаров, добавлено {added} новых'
-        })
+
+        if body.get('skipped'):
+            logger.info(f"Cron job пропущен: {body['message']}")
+        elif body['job']['status'] == 'done':
+            logger.info(f"Cron job выполнен. Найдено: {body['found']}, Добавлено: {body['added']}, "
+                        f"Пропало: {body['disappeared']}")
+        return jsonify(body), status
     except Exception as e:
         logger.error(f"Ошибка в cron job: {e}", exc_info=True)
         return jsonify({
@@ -1,62 +1,76 @@
 """
 Веб-приложение Flask для отображения результатов парсинга
 """
-from flask import Flask, render_template, jsonify
+from flask import Flask, Response, render_template, jsonify, request, stream_with_context
+from dashboard import build_dashboard
 from database import Database
-from parser import run_all_parsers
+from export import EXPORT_FORMATS, export_filename, export_stream
+from product_filters import parse_page_args
+from response_cache import cached_response
+from jobs import CRAWL_JOBS, run_crawl
+from crawl_lock import CRAWL_LOCK_NAME
+from metrics import CONTENT_TYPE, METRICS_ENABLED, REGISTRY, instrument_app
+from resilience import BREAKERS
 import logging
 
 app = Flask(__name__)
 db = Database()
+instrument_app(app)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Выборка "за последние 24 часа" устаревает и без новых данных, поэтому кэшируется ненадолго
+RECENT_CACHE_TTL = 300
+
+
+def get_generation():
+    """Поколение данных для кэша ответов"""
+    return db.get_generation()
+
+
+@app.teardown_appcontext
+def remove_session(exception=None):
+    """Возвращает соединение сессии запроса в пул"""
+    db.remove_session()
+
 
 @app.route('/')
+@cached_response(get_generation)
 def index():
     """Главная страница с результатами парсинга"""
-    products = db.get_all_products(limit=200)
-    products_48_months = db.get_products_48_months()
-    
-    # Группируем по сайтам
-    products_by_site = {}
-    for product in products:
-        site = product['site']
-        if site not in products_by_site:
-            products_by_site[site] = []
-        products_by_site[site].append(product)
-    
-    # Группируем товары с 48 месяцами по сайтам
-    products_48_by_site = {}
-    for product in products_48_months:
-        site = product['site']
-        if site not in products_48_by_site:
-            products_48_by_site[site] = []
-        products_48_by_site[site].append(product)
-    
-    return render_template('index.html', 
-                         products_by_site=products_by_site,
-                         products_48_by_site=products_48_by_site,
-                         total_count=len(products),
-                         count_48_months=len(products_48_months))
+    return render_template('index.html', **build_dashboard(db))
 
 
 @app.route('/api/products')
+@cached_response(get_generation)
 def api_products():
-    """API endpoint для получения всех товаров"""
-    products = db.get_all_products(limit=200)
-    return jsonify(products)
+    """
+    API endpoint для постраничного получения товаров.
+
+    Параметры: limit, cursor, site, since, months, min_price, max_price, sort=price.
+    """
+    try:
+        page = parse_page_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(db.get_products_page(**page))
 
 
 @app.route('/api/products/<site>')
+@cached_response(get_generation)
 def api_products_by_site(site):
-    """API endpoint для получения товаров по сайту"""
-    products = db.get_products_by_site(site)
-    return jsonify(products)
+    """API endpoint для постраничного получения товаров по сайту"""
+    try:
+        page = parse_page_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    page['site'] = site
+    return jsonify(db.get_products_page(**page))
 
 
 @app.route('/api/recent')
+@cached_response(get_generation, ttl=RECENT_CACHE_TTL)
 def api_recent():
     """API endpoint для получения недавно найденных товаров"""
     products = db.get_recent_products(hours=24)
@@ -64,30 +78,81 @@ def api_recent():
 
 
 @app.route('/api/products/48months')
+@cached_response(get_generation)
 def api_products_48_months():
     """API endpoint для получения товаров с лизингом на 48 месяцев"""
     products = db.get_products_48_months()
     return jsonify(products)
 
 
+@app.route('/api/export')
+def api_export():
+    """Потоковая выгрузка всех товаров: format=ndjson|csv, gzip=1 для сжатия"""
+    fmt = request.args.get('format', 'ndjson')
+    compress = request.args.get('gzip') in ('1', 'true')
+    try:
+        stream = export_stream(db, fmt, compress)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return Response(
+        stream_with_context(stream),
+        mimetype='application/gzip' if compress else EXPORT_FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename={export_filename(fmt, compress)}'},
+    )
+
+
+@app.route('/api/health')
+def api_health():
+    """Состояние приложения: база, предохранители сайтов и блокировка парсинга"""
+    try:
+        generation = db.get_generation()
+    except Exception as e:
+        logger.error(f"Ошибка при проверке базы: {e}")
+        return jsonify({'status': 'error', 'error': str(e), 'breakers': BREAKERS.snapshot()}), 500
+    return jsonify({'status': 'ok', 'generation': generation, 'breakers': BREAKERS.snapshot(),
+                    'crawl_lock': db.get_lock(CRAWL_LOCK_NAME)})
+
+
+@app.route('/api/metrics')
+def api_metrics():
+    """Метрики производительности в формате Prometheus"""
+    if not METRICS_ENABLED:
+        return jsonify({'error': 'Метрики отключены (METRICS_ENABLED=0)'}), 404
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+
 @app.route('/api/refresh', methods=['POST'])
 def api_refresh():
-    """API endpoint для ручного запуска парсинга"""
+    """
+    API endpoint для ручного запуска парсинга.
+
+    Парсинг выполняется в фоне: ответ 202 с id задачи сразу, ход - в /api/jobs/<id>.
+    Если парсинг уже идет, новый не запускается - возвращается текущая задача.
+    """
     try:
-        results = run_all_parsers()
-        added = db.add_products(results)
-        return jsonify({
-            'success': True,
-            'found': len(results),
-            'added': added,
-            'message': f'Найдено {len(results)} товаров, добавлено {added} новых'
-        })
+        job, created = CRAWL_JOBS.submit(lambda progress: run_crawl(db, progress), trigger='manual')
     except Exception as e:
-        logger.error(f"Ошибка при парсинге: {e}")
+        logger.error(f"Ошибка при запуске парсинга: {e}")
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
+    return jsonify({
+        'success': True,
+        'job_id': job.id,
+        'coalesced': not created,
+        'status_url': f'/api/jobs/{job.id}',
+        'job': job.to_dict(),
+    }), 202
+
+
+@app.route('/api/jobs/<job_id>')
+def api_job(job_id):
+    """Статус задачи парсинга и ход по сайтам"""
+    job = CRAWL_JOBS.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Задача не найдена'}), 404
+    return jsonify(job.to_dict())
 
 
 if __name__ == '__main__':
@@ -0,0 +1,315 @@
+"""
+Микробенчмарки парсера
+
+Запуск:
+    python benchmark.py            # все бенчмарки
+    python benchmark.py matcher    # только поиск ключевых слов и сроков лизинга
+    python benchmark.py startup    # холодный старт serverless-функции (api/index.py)
+    python benchmark.py parsers    # скорость парсеров сайтов на сохраненных страницах
+    python benchmark.py parsers --check           # сравнить с benchmark_baseline.json (код 1 при регрессии)
+    python benchmark.py parsers --save-baseline   # записать текущие результаты как базовые
+"""
+import argparse
+import json
+import math
+import os
+import random
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Dict, Optional
+
+from matcher import LeasingMatcher
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+# Базовые результаты бенчмарка парсеров, с которыми сравнивает --check
+BASELINE_PATH = os.environ.get('BENCH_BASELINE', os.path.join(ROOT_DIR, 'benchmark_baseline.json'))
+# Во сколько раз время на страницу может превысить базовое, прежде чем --check сочтет это регрессией
+BENCH_TOLERANCE = float(os.environ.get('BENCH_TOLERANCE', '2.0'))
+# Во сколько раз страница размножается для синтетических страниц
+PARSER_SCALES = (1, 10, 100)
+# Предельный показатель роста времени с числом товаров: 1 - линейный, 2 - квадратичный
+MAX_GROWTH_EXPONENT = float(os.environ.get('BENCH_MAX_GROWTH', '1.3'))
+
+
+# Прежние реализации LeasingParser.search_leasing_keywords и extract_leasing_period,
+# с которыми сравнивается LeasingMatcher. Исправлены так же, как LeasingMatcher:
+# "10%" не считается 0%, а срок 48 месяцев - только число 48, а не "148".
+def legacy_search_leasing_keywords(text: str) -> bool:
+    text_lower = text.lower()
+    has_leasing = any(keyword in text_lower for keyword in ['leasing', 'liising'])
+    has_zero_percent = any([
+        re.search(r'(?<!\d)0\s*%', text),
+        re.search(r'(?<!\d)0 protsenti', text_lower),
+        'null protsenti' in text_lower,
+        re.search(r'null\s*%', text_lower)
+    ])
+    return has_leasing and has_zero_percent
+
+
+def legacy_extract_leasing_period(text: str) -> Optional[str]:
+    text_lower = text.lower()
+    patterns = [
+        (r'(?<!\d)48\s*(месяц|kuud?|мес|месяцев|kuud)', '48 месяцев'),
+        (r'(?<!\d)48\s*(мес\.|kuud\.)', '48 месяцев'),
+        (r'(\d+)\s*(месяц|kuud?|мес|месяцев|kuud)', None),
+        (r'(\d+)\s*(мес\.|kuud\.)', None),
+    ]
+    for pattern, period in patterns:
+        match = re.search(pattern, text_lower, re.IGNORECASE)
+        if match:
+            if period:
+                return period
+            numbers = re.findall(r'\d+', match.group(0))
+            if numbers:
+                return f"{numbers[0]} месяцев"
+    return None
+
+
+def make_card_texts(count: int, seed: int = 42):
+    """Тексты карточек товаров, похожие на те, что встречаются на страницах магазинов"""
+    rnd = random.Random(seed)
+    names = ['Lenovo IdeaPad 5', 'Apple iPhone 15 128GB', 'Samsung Galaxy A55', 'Sony WH-1000XM5',
+             'ASUS ROG Strix G16', 'Dell XPS 13 9340', 'HP Pavilion 15', 'Xiaomi Redmi Note 13']
+    offers = ['Liising 0% {m} kuud', 'liising 0 % {m} kuud', 'Järelmaks {m} kuud', 'LIISING null % {m} мес.',
+              'Liising 0 protsenti, {m} kuu', 'Leasing 10% {m} месяцев', 'Intress 0%', 'Liising0%{m} kuud',
+              'Liising 100 protsenti {m} kuud', '']
+    texts = []
+    for _ in range(count):
+        text = f"{rnd.choice(names)} {rnd.randint(100, 2999)},{rnd.randint(0, 99):02d} € " \
+               f"{rnd.choice(offers).format(m=rnd.choice([6, 12, 24, 36, 48, 148]))} " \
+               f"{'Tasuta tarne. ' * rnd.randint(0, 5)}"
+        texts.append(text)
+    return texts
+
+
+def time_it(func, texts, repeat: int = 3) -> float:
+    """Лучшее из repeat время обработки всех текстов (секунды)"""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for text in texts:
+            func(text)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def bench_matcher():
+    """Сравнивает LeasingMatcher с прежними функциями по скорости и результатам"""
+    unique_texts = make_card_texts(20000)
+    # На реальных страницах одни и те же блоки (баннеры, условия) повторяются
+    repeated_texts = make_card_texts(200) * 100
+
+    def legacy(text):
+        return legacy_search_leasing_keywords(text), legacy_extract_leasing_period(text)
+
+    for title, texts in (('уникальные тексты', unique_texts), ('повторяющиеся тексты', repeated_texts)):
+        matcher = LeasingMatcher()
+
+        def compiled(text):
+            return matcher.has_zero_leasing(text), matcher.leasing_period(text)
+
+        mismatches = sum(1 for text in texts if legacy(text) != compiled(text))
+        if mismatches:
+            raise AssertionError(f"LeasingMatcher расходится с прежней реализацией на {mismatches} текстах")
+
+        legacy_time = time_it(legacy, texts)
+        compiled_time = time_it(compiled, texts)
+        batch_time = time_it(lambda batch: matcher.classify_many(batch), [texts])
+        print(f"matcher, {title} ({len(texts)} шт.):")
+        print(f"  прежние функции:   {legacy_time * 1000:8.1f} мс")
+        print(f"  LeasingMatcher:    {compiled_time * 1000:8.1f} мс  (x{legacy_time / compiled_time:.1f})")
+        print(f"  classify_many:     {batch_time * 1000:8.1f} мс  (x{legacy_time / batch_time:.1f})")
+
+
+# Выполняется в отдельном интерпретаторе: импорт api/index.py и первые запросы,
+# как при холодном старте serverless-функции
+STARTUP_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+sys.path.insert(0, 'api')
+import index
+imported = time.perf_counter()
+client = index.app.test_client()
+client.get('/api/products?limit=10')
+first = time.perf_counter()
+client.get('/api/products?limit=10&site=RDE')
+second = time.perf_counter()
+print(json.dumps({
+    'import': imported - started,
+    'first_request': first - imported,
+    'warm_request': second - first,
+    'parser_loaded': 'parser' in sys.modules,
+}))
+"""
+
+
+def bench_startup(runs: int = 5):
+    """Импорт api/index.py и задержка первого запроса в новом процессе"""
+    root = os.path.dirname(os.path.abspath(__file__))
+    samples = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for run in range(runs):
+            env = dict(os.environ, LEASING_DB_PATH=os.path.join(tmp, 'products.db'),
+                       PARSER_HTTP_CACHE_DIR=os.path.join(tmp, 'http_cache'))
+            output = subprocess.run(
+                [sys.executable, '-c', STARTUP_SCRIPT], cwd=root, env=env,
+                capture_output=True, text=True, check=True,
+            ).stdout
+            samples.append(json.loads(output.strip().splitlines()[-1]))
+
+    # Первый запуск создает базу и применяет миграции, остальные - как теплая база
+    print(f"startup ({runs} запусков, медиана; первый запуск создает базу):")
+    for key, title in (('import', 'импорт api/index.py'), ('first_request', 'первый запрос'),
+                       ('warm_request', 'повторный запрос')):
+        values = [sample[key] for sample in samples]
+        print(f"  {title + ':':22} {statistics.median(values) * 1000:8.1f} мс"
+              f"  (первый запуск {values[0] * 1000:.1f} мс)")
+    print(f"  парсер загружен при старте: {'да' if samples[0]['parser_loaded'] else 'нет'}")
+
+
+def site_page(parser_class) -> bytes:
+    """Главная страница сайта: записанная (page_fixtures.py record) или из fixtures/"""
+    from page_fixtures import ReplayTransport
+
+    parser = parser_class(transport=ReplayTransport(directory=None))
+    recorded = ReplayTransport().get(parser.page_url)
+    if recorded.status_code == 200:
+        return recorded.content
+    with open(os.path.join(ROOT_DIR, 'fixtures', f'{parser.site_name.lower()}.html'), 'rb') as f:
+        return f.read()
+
+
+def measure_parser(parser_class, content: bytes, min_time: float = 0.5) -> Dict:
+    """Полный проход парсера (загрузка, разбор, извлечение) по странице без сети"""
+    from crawler import HostRateLimiter
+    from page_fixtures import ReplayTransport
+
+    def run_once():
+        parser = parser_class(transport=transport)
+        parser.rate_limiter = HostRateLimiter(rate=0)
+        return len(parser.parse())
+
+    transport = ReplayTransport(directory=None)
+    transport.pages[parser_class(transport=transport).page_url] = content
+    products = run_once()
+
+    pages = 0
+    started = time.perf_counter()
+    while pages < 3 or time.perf_counter() - started < min_time:
+        run_once()
+        pages += 1
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    run_once()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        'products': products,
+        'pages_per_sec': round(pages / elapsed, 1),
+        'ms_per_page': round(elapsed / pages * 1000, 3),
+        'peak_kb': round(peak / 1024),
+    }
+
+
+def growth_exponent(small: Dict, large: Dict) -> float:
+    """Показатель степени роста времени от числа товаров между двумя масштабами страницы"""
+    return math.log(large['ms_per_page'] / small['ms_per_page']) / math.log(large['products'] / small['products'])
+
+
+def compare_with_baseline(results: Dict, baseline: Dict) -> list:
+    """Регрессии относительно базовых результатов (пустой список - регрессий нет)"""
+    problems = []
+    for site_name, scales in results.items():
+        for scale, result in scales.items():
+            expected = baseline.get(site_name, {}).get(scale)
+            if expected is None:
+                continue
+            if result['products'] != expected['products']:
+                problems.append(f"{site_name} x{scale}: найдено {result['products']} товаров, "
+                                f"в базовых результатах {expected['products']}")
+            if result['ms_per_page'] > expected['ms_per_page'] * BENCH_TOLERANCE:
+                problems.append(f"{site_name} x{scale}: {result['ms_per_page']:.1f} мс на страницу, "
+                                f"базовое {expected['ms_per_page']:.1f} мс (допуск x{BENCH_TOLERANCE})")
+        exponent = growth_exponent(scales[str(PARSER_SCALES[-2])], scales[str(PARSER_SCALES[-1])])
+        if exponent > MAX_GROWTH_EXPONENT:
+            problems.append(f"{site_name}: время растет как n^{exponent:.2f} от числа товаров "
+                            f"(допустимо до n^{MAX_GROWTH_EXPONENT})")
+    return problems
+
+
+def bench_parsers(check: bool = False, save_baseline: bool = False) -> bool:
+    """
+    Страниц в секунду, миллисекунд на страницу и пиковая память парсеров сайтов.
+
+    Каждая страница измеряется как есть и размноженной в 10 и 100 раз: рост
+    времени быстрее числа товаров выдает квадратичные участки извлечения.
+    Возвращает False, если при check найдены регрессии.
+    """
+    from page_fixtures import ReplayTransport, scale_page
+    from parser import ArvutitarkParser, KlickParser, RDEParser
+
+    results = {}
+    print("parsers (полный проход parse() на сохраненной странице, без сети):")
+    print(f"  {'сайт':12} {'масштаб':>8} {'товаров':>8} {'стр/с':>9} {'мс/стр':>9} {'пик, КБ':>9}")
+    for parser_class in (RDEParser, KlickParser, ArvutitarkParser):
+        content = site_page(parser_class)
+        site_name = parser_class(transport=ReplayTransport(directory=None)).site_name
+        results[site_name] = {}
+        for scale in PARSER_SCALES:
+            result = results[site_name][str(scale)] = measure_parser(parser_class, scale_page(content, scale))
+            print(f"  {site_name:12} {'x' + str(scale):>8} {result['products']:>8} {result['pages_per_sec']:>9.1f} "
+                  f"{result['ms_per_page']:>9.2f} {result['peak_kb']:>9}")
+        exponent = growth_exponent(results[site_name][str(PARSER_SCALES[-2])],
+                                   results[site_name][str(PARSER_SCALES[-1])])
+        print(f"  {site_name:12} рост времени от числа товаров: n^{exponent:.2f}")
+
+    if save_baseline:
+        with open(BASELINE_PATH, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"  базовые результаты записаны в {BASELINE_PATH}")
+
+    if check:
+        with open(BASELINE_PATH, encoding='utf-8') as f:
+            problems = compare_with_baseline(results, json.load(f))
+        for problem in problems:
+            print(f"  РЕГРЕССИЯ: {problem}")
+        if problems:
+            return False
+        print("  регрессий относительно базовых результатов нет")
+    return True
+
+
+BENCHMARKS = {
+    'matcher': bench_matcher,
+    'startup': bench_startup,
+    'parsers': bench_parsers,
+}
+
+
+if __name__ == '__main__':
+    arguments = argparse.ArgumentParser(description='Бенчмарки производительности')
+    arguments.add_argument('benchmarks', nargs='*', metavar='benchmark',
+                           help=f"{', '.join(BENCHMARKS)} (по умолчанию все)")
+    arguments.add_argument('--check', action='store_true',
+                           help='сравнить парсеры с базовыми результатами, код 1 при регрессии')
+    arguments.add_argument('--save-baseline', action='store_true', help='записать результаты парсеров как базовые')
+    args = arguments.parse_args()
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        arguments.error(f"неизвестные бенчмарки: {', '.join(sorted(unknown))}")
+
+    passed = True
+    for name in args.benchmarks or list(BENCHMARKS):
+        if name == 'parsers':
+            passed = bench_parsers(check=args.check, save_baseline=args.save_baseline) and passed
+        else:
+            BENCHMARKS[name]()
+    sys.exit(0 if passed else 1)
@@ -0,0 +1,29 @@
+"""
+Общие фикстуры тестов
+"""
+import pytest
+
+from database import Database
+from response_cache import FRAGMENT_CACHE, RESPONSE_CACHE
+
+
+@pytest.fixture
+def db(tmp_path):
+    """Пустая база во временном каталоге"""
+    database = Database(str(tmp_path / 'products.db'))
+    yield database
+    database.close()
+
+
+@pytest.fixture
+def web(tmp_path, monkeypatch):
+    """Модуль веб-приложения (app.py) с пустой базой во временном каталоге и чистыми кэшами ответов"""
+    monkeypatch.setenv('LEASING_DB_PATH', str(tmp_path / 'products.db'))
+    import app as web_app
+    monkeypatch.setattr(web_app, 'db', Database())
+    RESPONSE_CACHE.clear()
+    FRAGMENT_CACHE.clear()
+    yield web_app
+    web_app.db.close()
+    RESPONSE_CACHE.clear()
+    FRAGMENT_CACHE.clear()
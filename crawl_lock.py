@@ -0,0 +1,114 @@
+"""
+Блокировка парсинга между процессами
+
+Планировщик (scheduler.py, main.py), cron и ручной запуск могут работать в
+разных процессах с одной базой. Перед парсингом процесс берет аренду (lease)
+блокировки в таблице crawl_locks на CRAWL_LOCK_TTL секунд и продлевает ее из
+фонового потока каждые CRAWL_LOCK_HEARTBEAT секунд. Если процесс упал или
+завис, аренда истекает, и следующий запуск забирает блокировку сам. Запуск,
+не получивший блокировку, пропускается (CRAWL_LOCK_MODE=skip) или ждет ее
+(CRAWL_LOCK_MODE=wait) не дольше CRAWL_LOCK_WAIT_TIMEOUT секунд.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+CRAWL_LOCK_NAME = 'crawl'
+# skip - пропустить запуск, если парсинг уже идет в другом процессе; wait - дождаться его
+CRAWL_LOCK_MODE = os.environ.get('CRAWL_LOCK_MODE', 'skip').lower()
+# Срок аренды и интервал ее продления (секунды)
+CRAWL_LOCK_TTL = float(os.environ.get('CRAWL_LOCK_TTL', '120'))
+CRAWL_LOCK_HEARTBEAT = float(os.environ.get('CRAWL_LOCK_HEARTBEAT', '30'))
+# Сколько ждать блокировку в режиме wait и как часто проверять, не освободилась ли она
+CRAWL_LOCK_WAIT_TIMEOUT = float(os.environ.get('CRAWL_LOCK_WAIT_TIMEOUT', '1800'))
+CRAWL_LOCK_POLL = float(os.environ.get('CRAWL_LOCK_POLL', '5'))
+
+LOCK_MODES = ('skip', 'wait')
+
+
+class CrawlLockLost(RuntimeError):
+    """Аренда блокировки истекла во время парсинга и могла перейти другому процессу"""
+
+
+class CrawlLock:
+    """
+    Аренда блокировки в базе с продлением из фонового потока.
+
+    Используется как контекстный менеджер после успешного acquire():
+
+        lock = CrawlLock(db)
+        if lock.acquire():
+            with lock:
+                ...
+
+    Если продлить аренду не удалось (ее забрал другой процесс после
+    истечения), lost становится True.
+    """
+
+    def __init__(self, db, name: str = CRAWL_LOCK_NAME, ttl: float = CRAWL_LOCK_TTL,
+                 heartbeat: float = CRAWL_LOCK_HEARTBEAT):
+        if heartbeat >= ttl:
+            raise ValueError(f"Интервал продления ({heartbeat} с) должен быть меньше срока аренды ({ttl} с)")
+        self.db = db
+        self.name = name
+        self.ttl = ttl
+        self.heartbeat = heartbeat
+        self.owner = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def acquire(self, mode: str = CRAWL_LOCK_MODE, timeout: float = CRAWL_LOCK_WAIT_TIMEOUT,
+                poll: float = CRAWL_LOCK_POLL) -> bool:
+        """
+        Берет блокировку. В режиме skip - одна попытка, в режиме wait - попытки
+        каждые poll секунд в течение timeout. Возвращает, получена ли блокировка.
+        """
+        if mode not in LOCK_MODES:
+            raise ValueError(f"Неизвестный режим блокировки {mode!r}: ожидается {' или '.join(LOCK_MODES)}")
+        deadline = time.monotonic() + timeout
+        while not self.db.acquire_lock(self.name, self.owner, self.ttl):
+            remaining = deadline - time.monotonic()
+            if mode == 'skip' or remaining <= 0:
+                return False
+            time.sleep(min(poll, remaining))
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._renew, name=f'lock-{self.name}', daemon=True)
+        self._thread.start()
+        return True
+
+    def _renew(self):
+        while not self._stop.wait(self.heartbeat):
+            try:
+                if not self.db.renew_lock(self.name, self.owner, self.ttl):
+                    logger.error(f"Блокировка {self.name} потеряна: аренда истекла и перешла другому процессу")
+                    self.lost = True
+                    return
+            except Exception as e:
+                # База занята записью результатов: аренда еще действует, попробуем на следующем шаге
+                logger.warning(f"Не удалось продлить блокировку {self.name}: {e}")
+
+    def release(self):
+        """Останавливает продление и снимает блокировку"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.db.release_lock(self.name, self.owner)
+
+    def holder(self) -> Optional[Dict]:
+        """Текущая аренда блокировки (кто выполняет парсинг) или None"""
+        return self.db.get_lock(self.name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
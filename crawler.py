@@ -0,0 +1,191 @@
+"""
+Обход каталога сайта: очередь страниц с приоритетами и ограничение частоты запросов
+
+Парсер начинает с главной страницы, а найденные на ней ссылки на акции, категории
+и страницы пагинации попадают в очередь (Frontier). Страницы из очереди загружают
+несколько потоков; запросы к одному хосту ограничиваются "ведром токенов"
+(TokenBucket), чтобы обход всего каталога не перегружал сайт.
+"""
+import heapq
+import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+# Сколько страниц одного сайта загружается за запуск (1 - только главная)
+MAX_PAGES = int(os.environ.get('PARSER_MAX_PAGES', '1'))
+# Насколько глубоко от главной страницы идет обход (главная - глубина 0)
+MAX_DEPTH = int(os.environ.get('PARSER_MAX_DEPTH', '2'))
+# Сколько страниц одного сайта загружается одновременно
+CRAWL_WORKERS = int(os.environ.get('PARSER_CRAWL_WORKERS', '4'))
+# Запросов в секунду к одному хосту и допустимый всплеск
+HOST_RATE = float(os.environ.get('PARSER_HOST_RATE', '2'))
+HOST_BURST = int(os.environ.get('PARSER_HOST_BURST', '4'))
+# Приоритет страниц, известных заранее: после акций, пагинации и категорий
+SEED_PRIORITY = 3
+
+
+class TokenBucket:
+    """
+    Ведро токенов: в среднем rate запросов в секунду, до capacity подряд.
+
+    Потокобезопасно. acquire() ждет токен и возвращает False, если до
+    дедлайна (time.monotonic) токен не появится.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """Берет токен; возвращает, сколько секунд нужно подождать до его появления"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def acquire(self, deadline: Optional[float] = None) -> bool:
+        if self.rate <= 0:
+            return True
+        wait_time = self._reserve()
+        if deadline is not None and time.monotonic() + wait_time > deadline:
+            # Возвращаем токен: запрос не будет выполнен
+            with self._lock:
+                self._tokens += 1
+            return False
+        if wait_time:
+            time.sleep(wait_time)
+        return True
+
+
+class HostRateLimiter:
+    """Отдельное ведро токенов на каждый хост"""
+
+    def __init__(self, rate: float = HOST_RATE, capacity: int = HOST_BURST):
+        self.rate = rate
+        self.capacity = capacity
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, url: str, deadline: Optional[float] = None) -> bool:
+        host = urlsplit(url).netloc.lower()
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = self._buckets[host] = TokenBucket(self.rate, self.capacity)
+        return bucket.acquire(deadline)
+
+
+# Общий ограничитель для всех парсеров: сайты парсятся параллельно, но лимит на хост один
+RATE_LIMITER = HostRateLimiter()
+
+
+class Frontier:
+    """
+    Очередь страниц сайта для обхода.
+
+    Страницы выдаются по возрастанию приоритета (при равном - по глубине и порядку
+    добавления). Каждый URL попадает в очередь один раз; страницы глубже max_depth
+    и сверх бюджета max_pages не добавляются.
+    """
+
+    def __init__(self, max_pages: int = MAX_PAGES, max_depth: int = MAX_DEPTH):
+        self.max_pages = max_pages
+        self.max_depth = max_depth
+        self.visited = set()
+        # True, если страницы отбрасывались из-за бюджета max_pages (обход неполный)
+        self.truncated = False
+        self._heap: List[Tuple[int, int, int, str]] = []
+        self._counter = 0
+
+    def push(self, url: str, depth: int = 0, priority: int = 0) -> bool:
+        """Добавляет страницу. Возвращает False, если она уже была или не входит в бюджет."""
+        if url in self.visited or depth > self.max_depth:
+            return False
+        if len(self.visited) >= self.max_pages:
+            self.truncated = True
+            return False
+        self.visited.add(url)
+        heapq.heappush(self._heap, (priority, depth, self._counter, url))
+        self._counter += 1
+        return True
+
+    def pop(self) -> Optional[Tuple[str, int]]:
+        """Следующая страница (url, глубина) или None, если очередь пуста"""
+        if not self._heap:
+            return None
+        _, depth, _, url = heapq.heappop(self._heap)
+        return url, depth
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+
+def crawl(parser, start_url: str, max_pages: int = MAX_PAGES, max_depth: int = MAX_DEPTH,
+          workers: int = CRAWL_WORKERS, seeds: Iterable[str] = ()) -> Tuple[List[Dict], Set[str], bool]:
+    """
+    Обходит сайт начиная со start_url и возвращает (товары, загруженные страницы, полный ли обход).
+
+    parser должен предоставлять parse_page(url) -> (товары, [(ссылка, приоритет)])
+    или None, если страницу загрузить не удалось. Очередь ведется в вызывающем
+    потоке, страницы загружаются пулом из workers потоков. seeds - страницы,
+    известные заранее (например, из карты сайта): они загружаются после
+    start_url в пределах бюджета, но ссылки с них не обходятся.
+
+    Обход неполный, если какая-то страница не загрузилась (ошибка, дедлайн
+    сайта) или бюджет max_pages не вместил все найденные страницы: товары
+    с незагруженных страниц нельзя считать пропавшими.
+    """
+    workers = max(1, workers)
+    frontier = Frontier(max_pages, max_depth)
+    frontier.push(start_url)
+    for url in seeds:
+        if not frontier.push(url, max_depth, SEED_PRIORITY) and len(frontier.visited) >= max_pages:
+            break
+    results = []
+    seen_urls = set()
+    fetched = set()
+    failed = 0
+
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='crawl')
+    in_flight = {}
+    try:
+        while len(frontier) or in_flight:
+            while len(frontier) and len(in_flight) < workers:
+                url, depth = frontier.pop()
+                in_flight[executor.submit(parser.parse_page, url)] = (url, depth)
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                url, depth = in_flight.pop(future)
+                try:
+                    page = future.result()
+                except Exception as e:
+                    logger.error(f"Ошибка при обходе {url}: {e}")
+                    failed += 1
+                    continue
+                if page is None:
+                    failed += 1
+                    continue
+                fetched.add(url)
+                page_results, links = page
+                for result in page_results:
+                    if result['url'] not in seen_urls:
+                        seen_urls.add(result['url'])
+                        results.append(result)
+                for link, priority in links:
+                    frontier.push(link, depth + 1, priority)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return results, fetched, not failed and not frontier.truncated
@@ -0,0 +1,59 @@
+"""
+Данные главной страницы: сводка по сайтам и кэшируемые блоки товаров
+"""
+from typing import Dict
+
+from flask import render_template
+from markupsafe import Markup
+
+from response_cache import FRAGMENT_CACHE, FragmentCache
+
+SECTION_TEMPLATE = '_site_section.html'
+
+
+def build_dashboard(db, cache: FragmentCache = FRAGMENT_CACHE) -> Dict:
+    """
+    Собирает контекст шаблона index.html.
+
+    Счетчики берутся из сводки site_summary, блоки товаров сайтов отрисовываются
+    из шаблона _site_section.html и кэшируются по версии данных сайта. Товары
+    запрашиваются одним запросом и только для сайтов, блоков которых нет в кэше.
+    """
+    summary = db.get_site_summary()
+    keys = {}
+    keys_48 = {}
+    for site in summary:
+        keys[site['site']] = ('site', site['site'], site['version'])
+        if site['count_48']:
+            keys_48[site['site']] = ('site_48', site['site'], site['version'])
+
+    rendered = {}
+    for key in list(keys.values()) + list(keys_48.values()):
+        fragment = cache.get(key)
+        if fragment is not None:
+            rendered[key] = fragment
+
+    missing = [site for site, key in keys.items() if key not in rendered]
+    missing_48 = [site for site, key in keys_48.items() if key not in rendered]
+    if missing or missing_48:
+        products = db.get_dashboard_products(missing, missing_48)
+        counts = {site['site']: site for site in summary}
+        for section, sites, section_keys, count_field in (
+            ('all', missing, keys, 'product_count'),
+            ('48', missing_48, keys_48, 'count_48'),
+        ):
+            for site in sites:
+                fragment = render_template(
+                    SECTION_TEMPLATE, site=site, products=products[section][site],
+                    count=counts[site][count_field], highlight=section == '48',
+                )
+                rendered[section_keys[site]] = fragment
+                cache.put(section_keys[site], fragment)
+
+    return {
+        'sections': [Markup(rendered[key]) for key in keys.values()],
+        'sections_48': [Markup(rendered[key]) for key in keys_48.values()],
+        'site_counts': {site['site']: site['product_count'] for site in summary},
+        'total_count': sum(site['product_count'] for site in summary),
+        'count_48_months': sum(site['count_48'] for site in summary),
+    }
@@ -1,14 +1,52 @@
 """
 Модуль для работы с базой данных
 """
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text
+from sqlalchemy import (
+    create_engine, event, case, Column, Integer, String, DateTime, Text, Index, delete, func, literal, or_, select,
+    tuple_, union_all, update,
+)
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from datetime import datetime
+from sqlalchemy.orm import aliased, scoped_session, sessionmaker
+from datetime import datetime, timedelta
+import json
 import os
+import re
+from metrics import DB_WRITE_SECONDS
+from migrations import migrate
+from prices import parse_price
+from product_filters import DEFAULT_PAGE_LIMIT, encode_cursor
 
 Base = declarative_base()
 
+# Путь к базе по умолчанию (переопределяется переменной LEASING_DB_PATH)
+DEFAULT_DB_PATH = 'leasing_products.db'
+# Размер пула соединений: по соединению на поток веб-сервера и планировщик
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '10'))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', '20'))
+# Сколько ждать снятия блокировки записи, прежде чем вернуть "database is locked"
+DB_BUSY_TIMEOUT_MS = int(os.environ.get('DB_BUSY_TIMEOUT_MS', '5000'))
+# Сколько товаров вставляется одним запросом INSERT
+INSERT_BATCH_SIZE = int(os.environ.get('DB_INSERT_BATCH_SIZE', '100'))
+# Сколько строк читается из курсора базы за раз при выгрузке
+EXPORT_CHUNK_SIZE = int(os.environ.get('DB_EXPORT_CHUNK_SIZE', '1000'))
+# Сколько последних товаров каждого сайта показывается на главной странице
+DASHBOARD_SITE_LIMIT = int(os.environ.get('DASHBOARD_SITE_LIMIT', '100'))
+# Поля товара, которые приходят от парсеров
+PRODUCT_FIELDS = ('site', 'title', 'price', 'url', 'category', 'leasing_period', 'found_at')
+# Число месяцев в начале строки срока лизинга ("48 месяцев")
+MONTHS_RE = re.compile(r'^\s*(\d+)')
+
+
+def parse_leasing_months(leasing_period):
+    """Извлекает число месяцев из срока лизинга: "48 месяцев" -> 48"""
+    if not leasing_period:
+        return None
+    match = MONTHS_RE.match(leasing_period)
+    if not match or int(match.group(1)) == 0:
+        return None
+    return int(match.group(1))
+
 
 class LeasingProduct(Base):
     """Модель товара с лизингом 0%"""
@@ -21,8 +59,31 @@ class LeasingProduct(Base):
     url = Column(Text, nullable=False)
     category = Column(String(200))
     leasing_period = Column(String(50))  # Срок лизинга (например, "48 месяцев")
+    leasing_months = Column(Integer)  # Срок лизинга в месяцах (например, 48)
+    price_cents = Column(Integer)  # Цена в центах, разобранная из price
+    currency = Column(String(3))  # Валюта цены (например, "EUR")
     found_at = Column(DateTime, default=datetime.now)
     created_at = Column(DateTime, default=datetime.now)
+    first_seen = Column(DateTime)  # Первый запуск парсинга, в котором товар найден
+    last_seen = Column(DateTime)  # Последний запуск, в котором товар был на сайте
+    disappeared_at = Column(DateTime)  # Когда предложение пропало с сайта (NULL - действует)
+    last_run_id = Column(Integer)  # Последний запуск парсинга, видевший товар
+
+    # Товар однозначно определяется ссылкой и названием
+    # Индексы совпадают с создаваемыми миграциями (см. migrations.py)
+    __table_args__ = (
+        Index('uq_leasing_products_url_title', 'url', 'title', unique=True),
+        Index('ix_leasing_products_site_found_at', 'site', 'found_at'),
+        Index('ix_leasing_products_found_at', 'found_at'),
+        Index('ix_leasing_products_leasing_months', 'leasing_months', 'found_at'),
+        Index('ix_leasing_products_price_cents', 'price_cents'),
+        Index('ix_leasing_products_site_months', 'site', 'leasing_months', 'found_at'),
+        # Частичные индексы только по действующим предложениям
+        Index('ix_leasing_products_active_found_at', 'found_at',
+              sqlite_where=disappeared_at.is_(None)),
+        Index('ix_leasing_products_active_site', 'site', 'found_at',
+              sqlite_where=disappeared_at.is_(None)),
+    )
     
     def to_dict(self):
         """Преобразует объект в словарь"""
@@ -34,71 +95,501 @@ class LeasingProduct(Base):
             'url': self.url,
             'category': self.category,
             'leasing_period': self.leasing_period,
+            'leasing_months': self.leasing_months,
+            'price_cents': self.price_cents,
+            'currency': self.currency,
             'found_at': self.found_at.isoformat() if self.found_at else None,
-            'created_at': self.created_at.isoformat() if self.created_at else None
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'first_seen': self.first_seen.isoformat() if self.first_seen else None,
+            'last_seen': self.last_seen.isoformat() if self.last_seen else None,
+            'disappeared_at': self.disappeared_at.isoformat() if self.disappeared_at else None
+        }
+
+
+class Meta(Base):
+    """Служебные значения базы (ключ -> число)"""
+    __tablename__ = 'meta'
+
+    key = Column(String(50), primary_key=True)
+    value = Column(Integer, nullable=False)
+
+
+class SiteSummary(Base):
+    """Сводка по сайту, обновляемая при добавлении товаров"""
+    __tablename__ = 'site_summary'
+
+    site = Column(String(50), primary_key=True)
+    product_count = Column(Integer, nullable=False)
+    count_48 = Column(Integer, nullable=False)
+    # Увеличивается при каждом изменении товаров сайта (ключ кэша фрагментов страницы)
+    version = Column(Integer, nullable=False)
+
+    def to_dict(self):
+        """Преобразует объект в словарь"""
+        return {
+            'site': self.site,
+            'product_count': self.product_count,
+            'count_48': self.count_48,
+            'version': self.version,
+        }
+
+
+class CrawlRun(Base):
+    """Запуск парсинга всех сайтов"""
+    __tablename__ = 'crawl_runs'
+
+    id = Column(Integer, primary_key=True)
+    started_at = Column(DateTime, nullable=False)
+    finished_at = Column(DateTime)
+    sites = Column(Text)  # Статусы сайтов (JSON, как в отчете run_parsers)
+    found = Column(Integer)
+    added = Column(Integer)
+    disappeared = Column(Integer)
+
+    def to_dict(self):
+        """Преобразует объект в словарь"""
+        return {
+            'id': self.id,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'sites': json.loads(self.sites) if self.sites else {},
+            'found': self.found,
+            'added': self.added,
+            'disappeared': self.disappeared,
+        }
+
+
+class CrawlPage(Base):
+    """Хэш содержимого страницы с последнего запуска (для пропуска неизменившихся страниц)"""
+    __tablename__ = 'crawl_pages'
+
+    url = Column(String(500), primary_key=True)
+    site = Column(String(50), nullable=False)
+    content_hash = Column(String(64), nullable=False)
+    changed_at = Column(DateTime, nullable=False)
+    crawled_at = Column(DateTime, nullable=False)
+
+
+class CrawlLock(Base):
+    """Аренда блокировки (lease): кто из процессов сейчас выполняет парсинг"""
+    __tablename__ = 'crawl_locks'
+
+    name = Column(String(50), primary_key=True)
+    owner = Column(String(100), nullable=False)
+    acquired_at = Column(DateTime, nullable=False)
+    heartbeat_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
+    def to_dict(self):
+        """Преобразует объект в словарь"""
+        return {
+            'name': self.name,
+            'owner': self.owner,
+            'acquired_at': self.acquired_at.isoformat(),
+            'heartbeat_at': self.heartbeat_at.isoformat(),
+            'expires_at': self.expires_at.isoformat(),
         }
 
 
+# Счетчик поколений данных: увеличивается при каждом изменении товаров
+GENERATION_KEY = 'generation'
+
+
+def _configure_sqlite(dbapi_connection, connection_record):
+    """
+    Настройки каждого нового соединения SQLite.
+
+    WAL позволяет читателям работать параллельно с транзакцией записи парсинга,
+    busy_timeout заставляет конкурирующих писателей ждать, а не падать сразу.
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute(f'PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}')
+    # В режиме WAL NORMAL не рискует целостностью базы и заметно ускоряет запись
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.close()
+
+
 class Database:
-    """Класс для работы с базой данных"""
+    """
+    Класс для работы с базой данных.
+
+    Один экземпляр можно разделять между потоками: self.session - scoped_session,
+    у каждого потока (запроса Flask, планировщика) своя сессия из общего пула
+    соединений. По окончании запроса сессию нужно освобождать через remove_session().
+    """
     
-    def __init__(self, db_path='leasing_products.db'):
-        self.db_path = db_path
-        self.engine = create_engine(f'sqlite:///{db_path}', echo=False)
+    def __init__(self, db_path=None):
+        self.db_path = db_path or os.environ.get('LEASING_DB_PATH', DEFAULT_DB_PATH)
+        self.engine = create_engine(
+            f'sqlite:///{self.db_path}',
+            echo=False,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            connect_args={'timeout': DB_BUSY_TIMEOUT_MS / 1000, 'check_same_thread': False},
+        )
+        event.listen(self.engine, 'connect', _configure_sqlite)
         
-        # Обновляем схему базы данных (добавляем новые поля, если их нет)
-        try:
-            Base.metadata.create_all(self.engine)
-            # Проверяем наличие поля leasing_period и добавляем его, если нужно
-            from sqlalchemy import inspect, text
-            inspector = inspect(self.engine)
-            if inspector.has_table('leasing_products'):
-                columns = [col['name'] for col in inspector.get_columns('leasing_products')]
-                if 'leasing_period' not in columns:
-                    with self.engine.connect() as conn:
-                        conn.execute(text('ALTER TABLE leasing_products ADD COLUMN leasing_period VARCHAR(50)'))
-                        conn.commit()
-        except Exception as e:
-            # Если таблицы нет, создаем её
-            Base.metadata.create_all(self.engine)
+        # Создаем таблицы и применяем недостающие миграции схемы
+        Base.metadata.create_all(self.engine)
+        self.schema_version = migrate(self.engine)
         
-        Session = sessionmaker(bind=self.engine)
-        self.session = Session()
+        self.session = scoped_session(sessionmaker(bind=self.engine))
     
-    def add_products(self, products: list):
-        """Добавляет товары в базу данных (избегая дубликатов)"""
-        from dateutil import parser as date_parser
+    @DB_WRITE_SECONDS.timed('add_products')
+    def add_products(self, products: list, batch_size: int = INSERT_BATCH_SIZE, update_existing: bool = False):
+        """
+        Добавляет товары в базу данных пакетами по batch_size (избегая дубликатов).
+
+        Дубликаты по (url, title) отсекает уникальный индекс: INSERT ... ON CONFLICT
+        DO NOTHING, а при update_existing=True - DO UPDATE (обновляются цена,
+        категория и срок лизинга). Возвращает количество действительно добавленных товаров.
+        """
+        now = datetime.now()
+        rows = self._prepare_rows(products, now)
+        for row in rows:
+            row['first_seen'] = row['last_seen'] = row['found_at']
+        
+        table = LeasingProduct.__table__
+        insert_ignore = sqlite_insert(table).on_conflict_do_nothing(index_elements=['url', 'title'])
+        upsert = sqlite_insert(table)
+        upsert = upsert.on_conflict_do_update(
+            index_elements=['url', 'title'],
+            set_={field: upsert.excluded[field] for field in ('price', 'price_cents', 'currency', 'category',
+                                                        'leasing_period', 'leasing_months')}
+        )
         
         added_count = 0
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            if update_existing:
+                keys = {(row['url'], row['title']) for row in batch}
+                existing = self.session.execute(
+                    select(LeasingProduct.url, LeasingProduct.title).where(
+                        tuple_(LeasingProduct.url, LeasingProduct.title).in_(keys)
+                    )
+                ).all()
+                self.session.execute(upsert, batch)
+                added_count += len(keys) - len(existing)
+            else:
+                added_count += self.session.execute(insert_ignore, batch).rowcount
+        
+        if added_count or (update_existing and rows):
+            self._refresh_site_summary({row['site'] for row in rows})
+            self._bump_generation()
+        self.session.commit()
+        return added_count
+
+    def _prepare_rows(self, products: list, now: datetime) -> list:
+        """Строки для вставки: поля товара, found_at в datetime, разобранные срок и цена"""
+        from dateutil import parser as date_parser
+
+        rows = []
         for product_data in products:
+            row = {field: product_data.get(field) for field in PRODUCT_FIELDS}
             # Преобразуем found_at из строки в datetime, если нужно
-            if 'found_at' in product_data and isinstance(product_data['found_at'], str):
+            if isinstance(row['found_at'], str):
                 try:
-                    product_data['found_at'] = date_parser.parse(product_data['found_at'])
-                except:
-                    product_data['found_at'] = datetime.now()
-            
-            # Проверяем, существует ли уже такой товар
-            existing = self.session.query(LeasingProduct).filter_by(
-                url=product_data['url'],
-                title=product_data['title']
-            ).first()
-            
-            if not existing:
-                product = LeasingProduct(**product_data)
-                self.session.add(product)
-                added_count += 1
-        
+                    # Парсеры отдают ISO-формат, он разбирается без dateutil
+                    row['found_at'] = datetime.fromisoformat(row['found_at'])
+                except ValueError:
+                    try:
+                        row['found_at'] = date_parser.parse(row['found_at'])
+                    except (ValueError, OverflowError):
+                        row['found_at'] = now
+            row['found_at'] = row['found_at'] or now
+            row['leasing_months'] = parse_leasing_months(row['leasing_period'])
+            row['price_cents'], row['currency'] = parse_price(row['price']) or (None, None)
+            row['created_at'] = now
+            rows.append(row)
+        return rows
+
+    def _bump_generation(self):
+        """Новое поколение данных делает недействительными закэшированные ответы"""
+        self.session.execute(
+            update(Meta).where(Meta.key == GENERATION_KEY).values(value=Meta.value + 1)
+        )
+
+    @DB_WRITE_SECONDS.timed('record_crawl')
+    def record_crawl(self, report: dict, started_at: datetime = None, batch_size: int = INSERT_BATCH_SIZE):
+        """
+        Сохраняет результаты запуска парсинга (отчет run_parsers) одной транзакцией.
+
+        Для сайтов со статусом 'ok' товары вставляются или обновляются (last_seen,
+        цена, срок; пропавший ранее товар снова становится действующим), а действующие
+        товары сайта, не найденные в этом запуске, получают disappeared_at. Для сайтов
+        со статусом 'unchanged' (страница не изменилась) всем действующим товарам
+        сдвигается last_seen. Товары со страниц из report['listed'] (есть в карте сайта,
+        но не менялись и не загружались) тоже остаются действующими. Для сайтов со
+        статусом 'partial' (каталог обойден не полностью) товары сохраняются как для
+        'ok', но пропавшими не отмечаются: их страницы могли не загружаться. Сайты
+        с ошибкой или таймаутом не трогаются. Хэши страниц сохраняются для следующего запуска
+        (см. get_page_hashes).
+
+        Возвращает {'run_id', 'found', 'added', 'disappeared'}.
+        """
+        now = datetime.now()
+        sites = report.get('sites', {})
+        ok_sites = {name for name, site in sites.items() if site['status'] == 'ok'}
+        partial_sites = {name for name, site in sites.items() if site['status'] == 'partial'}
+        saved_sites = ok_sites | partial_sites
+        unchanged_sites = {name for name, site in sites.items() if site['status'] == 'unchanged'}
+
+        run = CrawlRun(started_at=started_at or now, sites=json.dumps(sites, ensure_ascii=False))
+        self.session.add(run)
+        self.session.flush()
+
+        rows = [row for row in self._prepare_rows(report.get('results', []), now) if row['site'] in saved_sites]
+        for row in rows:
+            row.update(first_seen=now, last_seen=now, disappeared_at=None, last_run_id=run.id)
+
+        upsert = sqlite_insert(LeasingProduct.__table__)
+        upsert = upsert.on_conflict_do_update(
+            index_elements=['url', 'title'],
+            set_={field: upsert.excluded[field] for field in ('price', 'price_cents', 'currency', 'category',
+                                                        'leasing_period', 'leasing_months', 'last_seen',
+                                                        'disappeared_at', 'last_run_id')}
+        )
+        for start in range(0, len(rows), batch_size):
+            self.session.execute(upsert, rows[start:start + batch_size])
+
+        # first_seen = now только у вставленных в этом запуске строк
+        added = self.session.execute(
+            select(func.count()).select_from(LeasingProduct).where(
+                LeasingProduct.last_run_id == run.id, LeasingProduct.first_seen == now
+            )
+        ).scalar()
+
+        active = LeasingProduct.disappeared_at.is_(None)
+        for site_name, urls in report.get('listed', {}).items():
+            if site_name not in saved_sites:
+                continue
+            for start in range(0, len(urls), batch_size):
+                self.session.execute(
+                    update(LeasingProduct)
+                    .where(LeasingProduct.site == site_name, active,
+                           LeasingProduct.url.in_(urls[start:start + batch_size]))
+                    .values(last_seen=now, last_run_id=run.id)
+                )
+
+        disappeared = 0
+        if ok_sites:
+            disappeared = self.session.execute(
+                update(LeasingProduct)
+                .where(LeasingProduct.site.in_(ok_sites), active, LeasingProduct.last_run_id.is_distinct_from(run.id))
+                .values(disappeared_at=now)
+            ).rowcount
+        if unchanged_sites:
+            self.session.execute(
+                update(LeasingProduct)
+                .where(LeasingProduct.site.in_(unchanged_sites), active)
+                .values(last_seen=now, last_run_id=run.id)
+            )
+
+        pages = [
+            {'url': page['url'], 'site': site_name, 'content_hash': page['hash'], 'changed_at': now, 'crawled_at': now}
+            for site_name, page in report.get('pages', {}).items()
+            if site_name in ok_sites | unchanged_sites
+        ]
+        if pages:
+            upsert_pages = sqlite_insert(CrawlPage)
+            upsert_pages = upsert_pages.on_conflict_do_update(
+                index_elements=['url'],
+                set_={
+                    'content_hash': upsert_pages.excluded.content_hash,
+                    'crawled_at': upsert_pages.excluded.crawled_at,
+                    'changed_at': case(
+                        (CrawlPage.content_hash == upsert_pages.excluded.content_hash, CrawlPage.changed_at),
+                        else_=upsert_pages.excluded.changed_at,
+                    ),
+                }
+            )
+            self.session.execute(upsert_pages, pages)
+
+        run.finished_at = datetime.now()
+        run.found = len(rows)
+        run.added = added
+        run.disappeared = disappeared
+        if saved_sites or unchanged_sites:
+            self._refresh_site_summary(saved_sites | unchanged_sites)
+            self._bump_generation()
         self.session.commit()
-        return added_count
+        return {'run_id': run.id, 'found': len(rows), 'added': added, 'disappeared': disappeared}
+
+    def get_page_hashes(self) -> dict:
+        """Хэши страниц с прошлых запусков: адрес -> хэш (для run_parsers)"""
+        return dict(self.session.execute(select(CrawlPage.url, CrawlPage.content_hash)).all())
+
+    def get_last_crawl_times(self, limit=50) -> dict:
+        """
+        Начало последнего успешного запуска по каждому сайту: сайт -> started_at.
+
+        Просматриваются последние limit запусков (для run_parsers).
+        """
+        times = {}
+        runs = self.session.query(CrawlRun).order_by(CrawlRun.id.desc()).limit(limit)
+        for run in runs:
+            for site_name, site in json.loads(run.sites or '{}').items():
+                if site.get('status') in ('ok', 'unchanged'):
+                    times.setdefault(site_name, run.started_at)
+        return times
+
+    def acquire_lock(self, name: str, owner: str, ttl: float) -> bool:
+        """
+        Берет аренду блокировки name на ttl секунд.
+
+        Удается, если блокировка свободна, ее аренда истекла (владелец завис или
+        упал) или она уже принадлежит owner. Выполняется отдельной транзакцией,
+        поэтому видна другим процессам сразу.
+        """
+        now = datetime.now()
+        expires_at = now + timedelta(seconds=ttl)
+        stmt = sqlite_insert(CrawlLock).values(name=name, owner=owner, acquired_at=now, heartbeat_at=now,
+                                               expires_at=expires_at)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['name'],
+            set_={'owner': owner, 'acquired_at': now, 'heartbeat_at': now, 'expires_at': expires_at},
+            where=or_(CrawlLock.expires_at <= now, CrawlLock.owner == owner),
+        )
+        with self.engine.begin() as conn:
+            conn.execute(stmt)
+            holder = conn.execute(select(CrawlLock.owner).where(CrawlLock.name == name)).scalar()
+        return holder == owner
+
+    def renew_lock(self, name: str, owner: str, ttl: float) -> bool:
+        """Продлевает аренду (heartbeat). False, если блокировка уже не принадлежит owner."""
+        now = datetime.now()
+        with self.engine.begin() as conn:
+            renewed = conn.execute(
+                update(CrawlLock).where(CrawlLock.name == name, CrawlLock.owner == owner)
+                .values(heartbeat_at=now, expires_at=now + timedelta(seconds=ttl))
+            ).rowcount
+        return renewed == 1
+
+    def release_lock(self, name: str, owner: str):
+        """Снимает блокировку, если она принадлежит owner"""
+        with self.engine.begin() as conn:
+            conn.execute(delete(CrawlLock).where(CrawlLock.name == name, CrawlLock.owner == owner))
+
+    def get_lock(self, name: str):
+        """Действующая аренда блокировки (словарь) или None"""
+        with self.engine.connect() as conn:
+            row = conn.execute(
+                select(CrawlLock.__table__).where(CrawlLock.name == name, CrawlLock.expires_at > datetime.now())
+            ).first()
+        return CrawlLock(**row._mapping).to_dict() if row else None
+
+    def get_crawl_runs(self, limit=10):
+        """Последние запуски парсинга"""
+        runs = self.session.query(CrawlRun).order_by(CrawlRun.id.desc()).limit(limit).all()
+        return [run.to_dict() for run in runs]
+
+    def _refresh_site_summary(self, sites):
+        """Пересчитывает сводку для сайтов, товары которых изменились"""
+        counts = select(
+            LeasingProduct.site,
+            func.count(),
+            func.coalesce(func.sum(LeasingProduct.leasing_months == 48), 0),
+            literal(1),
+        ).where(LeasingProduct.site.in_(sites)).group_by(LeasingProduct.site)
+        stmt = sqlite_insert(SiteSummary).from_select(
+            ['site', 'product_count', 'count_48', 'version'], counts
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['site'],
+            set_={
+                'product_count': stmt.excluded.product_count,
+                'count_48': stmt.excluded.count_48,
+                'version': SiteSummary.version + 1,
+            }
+        )
+        self.session.execute(stmt)
+
+    def get_generation(self) -> int:
+        """Текущее поколение данных (меняется после каждого изменения товаров)"""
+        with self.engine.connect() as conn:
+            return conn.execute(select(Meta.value).where(Meta.key == GENERATION_KEY)).scalar() or 0
     
-    def get_all_products(self, limit=100):
-        """Получает все товары из базы данных"""
-        products = self.session.query(LeasingProduct).order_by(
-            LeasingProduct.found_at.desc()
-        ).limit(limit).all()
+    def get_all_products(self, limit=100, min_price=None, max_price=None, sort='found_at'):
+        """
+        Получает все товары из базы данных.
+
+        min_price и max_price (в центах) ограничивают цену; sort='price' сортирует
+        по возрастанию цены (товары без распознанной цены при этом не выводятся).
+        """
+        query = self.session.query(LeasingProduct)
+        if min_price is not None:
+            query = query.filter(LeasingProduct.price_cents >= min_price)
+        if max_price is not None:
+            query = query.filter(LeasingProduct.price_cents <= max_price)
+        if sort == 'price':
+            query = query.filter(LeasingProduct.price_cents.isnot(None)).order_by(
+                LeasingProduct.price_cents.asc(), LeasingProduct.id.asc()
+            )
+        else:
+            query = query.order_by(LeasingProduct.found_at.desc())
+        products = query.limit(limit).all()
         return [p.to_dict() for p in products]
     
+    def get_products_page(self, limit=DEFAULT_PAGE_LIMIT, cursor=None, site=None, since=None,
+                          months=None, min_price=None, max_price=None, sort='found_at', active=False):
+        """
+        Страница товаров с фильтрами и курсором (keyset-пагинация).
+
+        active=True оставляет только действующие предложения (disappeared_at IS NULL).
+        Товары упорядочены по (found_at, id) от новых к старым или, при sort='price',
+        по (price_cents, id) по возрастанию. cursor - пара (значение ключа, id) последнего
+        товара предыдущей страницы: следующая страница выбирается условием по индексу,
+        а не OFFSET, поэтому дальние страницы не дороже первой.
+
+        Возвращает {'products': [...], 'next_cursor': строка или None}.
+        """
+        query = self.session.query(LeasingProduct)
+        if active:
+            query = query.filter(LeasingProduct.disappeared_at.is_(None))
+        if site is not None:
+            query = query.filter(LeasingProduct.site == site)
+        if since is not None:
+            query = query.filter(LeasingProduct.found_at >= since)
+        if months is not None:
+            query = query.filter(LeasingProduct.leasing_months == months)
+        if min_price is not None:
+            query = query.filter(LeasingProduct.price_cents >= min_price)
+        if max_price is not None:
+            query = query.filter(LeasingProduct.price_cents <= max_price)
+
+        if sort == 'price':
+            key_column = LeasingProduct.price_cents
+            query = query.filter(key_column.isnot(None))
+            if cursor is not None:
+                query = query.filter(tuple_(key_column, LeasingProduct.id) > tuple_(*cursor))
+            query = query.order_by(key_column.asc(), LeasingProduct.id.asc())
+        else:
+            key_column = LeasingProduct.found_at
+            if cursor is not None:
+                query = query.filter(tuple_(key_column, LeasingProduct.id) < tuple_(*cursor))
+            query = query.order_by(key_column.desc(), LeasingProduct.id.desc())
+
+        # Лишняя строка показывает, есть ли следующая страница
+        products = query.limit(limit + 1).all()
+        next_cursor = None
+        if len(products) > limit:
+            products = products[:limit]
+            last = products[-1]
+            next_cursor = encode_cursor(sort, getattr(last, key_column.key), last.id)
+        return {'products': [p.to_dict() for p in products], 'next_cursor': next_cursor}
+
+    def get_active_products(self, site=None, limit=DEFAULT_PAGE_LIMIT):
+        """
+        Действующие предложения (товар был на сайте в последнем успешном запуске),
+        от новых к старым. Выборка идет по частичному индексу действующих товаров.
+        """
+        query = self.session.query(LeasingProduct).filter(LeasingProduct.disappeared_at.is_(None))
+        if site is not None:
+            query = query.filter(LeasingProduct.site == site)
+        products = query.order_by(LeasingProduct.found_at.desc(), LeasingProduct.id.desc()).limit(limit).all()
+        return [p.to_dict() for p in products]
+
     def get_products_by_site(self, site: str):
         """Получает товары по сайту"""
         products = self.session.query(LeasingProduct).filter_by(
@@ -118,11 +609,70 @@ class Database:
     def get_products_48_months(self):
         """Получает товары с лизингом на 48 месяцев"""
         products = self.session.query(LeasingProduct).filter(
-            LeasingProduct.leasing_period.contains('48')
+            LeasingProduct.leasing_months == 48
         ).order_by(LeasingProduct.found_at.desc()).all()
         return [p.to_dict() for p in products]
     
+    def get_site_summary(self):
+        """Сводка по сайтам: количество товаров, из них на 48 месяцев, и версия данных сайта"""
+        summary = self.session.query(SiteSummary).order_by(SiteSummary.site).all()
+        return [s.to_dict() for s in summary]
+
+    def get_dashboard_products(self, sites, sites_48=(), limit=DASHBOARD_SITE_LIMIT):
+        """
+        Последние товары сайтов для главной страницы одним запросом.
+
+        Для каждого сайта из sites берется limit последних товаров, для каждого из
+        sites_48 - limit последних товаров на 48 месяцев. Каждая выборка - отдельная
+        ветка UNION ALL с LIMIT по индексу, поэтому время запроса не растет с историей.
+
+        Возвращает {'all': {сайт: [...]}, '48': {сайт: [...]}}.
+        """
+        result = {'all': {site: [] for site in sites}, '48': {site: [] for site in sites_48}}
+        order = (LeasingProduct.found_at.desc(), LeasingProduct.id.desc())
+        branches = [
+            select(LeasingProduct, literal('all').label('section'))
+            .where(LeasingProduct.site == site).order_by(*order).limit(limit).subquery()
+            for site in sites
+        ] + [
+            select(LeasingProduct, literal('48').label('section'))
+            .where(LeasingProduct.site == site, LeasingProduct.leasing_months == 48)
+            .order_by(*order).limit(limit).subquery()
+            for site in sites_48
+        ]
+        if not branches:
+            return result
+
+        union = union_all(*[select(branch) for branch in branches]).subquery()
+        product = aliased(LeasingProduct, union)
+        rows = self.session.execute(
+            select(product, union.c.section).order_by(union.c.found_at.desc(), union.c.id.desc())
+        ).all()
+        for row, section in rows:
+            result[section][row.site].append(row.to_dict())
+        return result
+
+    def iter_products(self, chunk_size=EXPORT_CHUNK_SIZE):
+        """
+        Итератор по всем товарам (словари с полями столбцов) в порядке id.
+
+        Строки читаются из серверного курсора порциями по chunk_size, поэтому
+        память не зависит от размера таблицы. Соединение держится, пока итератор
+        не исчерпан или не закрыт.
+        """
+        table = LeasingProduct.__table__
+        with self.engine.connect() as conn:
+            result = conn.execution_options(stream_results=True, yield_per=chunk_size).execute(
+                select(table).order_by(table.c.id)
+            )
+            for row in result.mappings():
+                yield dict(row)
+
+    def remove_session(self):
+        """Закрывает и забывает сессию текущего потока (вызывается в конце запроса)"""
+        self.session.remove()
+
     def close(self):
-        """Закрывает сессию"""
+        """Закрывает сессию текущего потока"""
         self.session.close()
 
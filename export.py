@@ -0,0 +1,115 @@
+"""
+Потоковая выгрузка всей истории товаров в NDJSON или CSV
+
+Использование из командной строки:
+    python export.py --format csv --gzip -o products.csv.gz
+"""
+import argparse
+import csv
+import io
+import json
+import sys
+import zlib
+from datetime import datetime
+from typing import Dict, Iterable, Iterator
+
+from database import EXPORT_CHUNK_SIZE, Database
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+# Порядок столбцов выгрузки
+EXPORT_FIELDS = (
+    'id', 'site', 'title', 'price', 'price_cents', 'currency', 'url', 'category',
+    'leasing_period', 'leasing_months', 'found_at', 'created_at', 'first_seen', 'last_seen', 'disappeared_at',
+)
+
+
+def _serialize(row: Dict) -> Dict:
+    return {
+        field: value.isoformat() if isinstance(value, datetime) else value
+        for field, value in ((field, row.get(field)) for field in EXPORT_FIELDS)
+    }
+
+
+def _chunked(rows: Iterable[Dict], chunk_size: int) -> Iterator[list]:
+    chunk = []
+    for row in rows:
+        chunk.append(_serialize(row))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_ndjson(rows: Iterable[Dict], chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[bytes]:
+    """Строки NDJSON, по chunk_size товаров в одном куске"""
+    for chunk in _chunked(rows, chunk_size):
+        yield ''.join(json.dumps(row, ensure_ascii=False) + '\n' for row in chunk).encode('utf-8')
+
+
+def iter_csv(rows: Iterable[Dict], chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[bytes]:
+    """CSV с заголовком, по chunk_size товаров в одном куске"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+    for chunk in _chunked(rows, chunk_size):
+        writer.writerows(chunk)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    # Пустая выгрузка - только заголовок
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def gzip_stream(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Сжимает поток кусков в формат gzip, не собирая его целиком"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_stream(db: Database, fmt: str = 'ndjson', compress: bool = False,
+                  chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[bytes]:
+    """Поток байтов выгрузки всех товаров. ValueError для неизвестного формата."""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Параметр format должен быть одним из: {', '.join(EXPORT_FORMATS)}")
+    rows = db.iter_products(chunk_size=chunk_size)
+    chunks = iter_ndjson(rows, chunk_size) if fmt == 'ndjson' else iter_csv(rows, chunk_size)
+    return gzip_stream(chunks) if compress else chunks
+
+
+def export_filename(fmt: str, compress: bool) -> str:
+    """Имя файла выгрузки для Content-Disposition"""
+    return f"leasing_products.{fmt}" + ('.gz' if compress else '')
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description='Выгрузка всех товаров в NDJSON или CSV')
+    arg_parser.add_argument('--format', choices=list(EXPORT_FORMATS), default='ndjson', help='формат выгрузки')
+    arg_parser.add_argument('--gzip', action='store_true', help='сжать выгрузку gzip')
+    arg_parser.add_argument('-o', '--output', help='файл для записи (по умолчанию stdout)')
+    arg_parser.add_argument('--db', help='путь к базе данных (по умолчанию LEASING_DB_PATH или leasing_products.db)')
+    arg_parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE,
+                            help='сколько строк читать из базы за раз')
+    args = arg_parser.parse_args(argv)
+
+    db = Database(db_path=args.db)
+    output = open(args.output, 'wb') if args.output else sys.stdout.buffer
+    try:
+        for chunk in export_stream(db, args.format, args.gzip, args.chunk_size):
+            output.write(chunk)
+    finally:
+        if args.output:
+            output.close()
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,304 @@
+"""
+Дисковый HTTP-кэш с условными запросами (ETag/Last-Modified) для транспорта парсеров
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from transport import REQUEST_TIMEOUT, Response, Transport
+
+logger = logging.getLogger(__name__)
+
+# Каталог кэша; пустая строка отключает кэш
+CACHE_DIR = os.environ.get('PARSER_HTTP_CACHE_DIR', '.http_cache')
+# Сколько хранить запись (секунды)
+CACHE_TTL = float(os.environ.get('PARSER_HTTP_CACHE_TTL', str(7 * 24 * 3600)))
+# Максимальный размер кэша на диске (байты)
+CACHE_MAX_SIZE = int(float(os.environ.get('PARSER_HTTP_CACHE_MAX_MB', '50')) * 1024 * 1024)
+# Через сколько записей каталог кэша просматривается целиком (устаревшие записи,
+# изменения из других процессов); между просмотрами размер считается по записям
+CACHE_EVICT_EVERY = int(os.environ.get('PARSER_HTTP_CACHE_EVICT_EVERY', '500'))
+
+
+class HttpCache:
+    """
+    Хранит тело страницы, валидаторы ETag/Last-Modified и хэш содержимого.
+
+    Для каждого URL на диске лежат два файла: <key>.json с метаданными
+    и <key>.body со сжатым телом. Записи старше ttl удаляются, а при
+    превышении max_size удаляются давно не использованные записи.
+
+    Размер кэша ведется нарастающим итогом: каталог просматривается целиком
+    (evict) при первой записи, при превышении max_size и раз в evict_every
+    записей, а не при каждой сохраненной странице.
+    """
+
+    def __init__(self, directory: str, max_size: int = CACHE_MAX_SIZE, ttl: float = CACHE_TTL,
+                 evict_every: int = CACHE_EVICT_EVERY):
+        self.directory = directory
+        self.max_size = max_size
+        self.ttl = ttl
+        self.evict_every = evict_every
+        os.makedirs(directory, exist_ok=True)
+        # Размер записей на диске (None - еще не подсчитан) и число записей с последнего просмотра
+        self._size: Optional[int] = None
+        self._stores_since_evict = 0
+        self._size_lock = threading.Lock()
+
+    def _paths(self, url: str):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        base = os.path.join(self.directory, key)
+        return base + '.json', base + '.body'
+
+    def _write_atomic(self, path: str, data: bytes) -> int:
+        """Записывает файл целиком и возвращает изменение его размера"""
+        previous = self._file_size(path)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return len(data) - previous
+
+    @staticmethod
+    def _file_size(path: str) -> int:
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+
+    def _track(self, delta: int, stored: bool = False):
+        """Учитывает изменение размера кэша; после записи страницы при необходимости вызывает evict"""
+        with self._size_lock:
+            if self._size is not None:
+                self._size += delta
+            if not stored:
+                return
+            self._stores_since_evict += 1
+            needs_evict = (self._size is None or self._size > self.max_size
+                           or self._stores_since_evict >= self.evict_every)
+        if needs_evict:
+            self.evict()
+
+    def lookup(self, url: str) -> Optional[Dict]:
+        """Возвращает метаданные записи для url или None, если записи нет или она устарела"""
+        meta_path, _ = self._paths(url)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - meta.get('stored_at', 0) > self.ttl:
+            self.delete(url)
+            return None
+        # mtime метаданных используется как время последнего обращения для LRU
+        os.utime(meta_path)
+        return meta
+
+    def load_body(self, url: str) -> Optional[bytes]:
+        """Читает сохраненное тело страницы"""
+        _, body_path = self._paths(url)
+        try:
+            with open(body_path, 'rb') as f:
+                return gzip.decompress(f.read())
+        except (OSError, EOFError, gzip.BadGzipFile):
+            return None
+
+    def store(self, url: str, response: Response) -> Dict:
+        """Сохраняет ответ 200 и возвращает метаданные записи"""
+        meta_path, body_path = self._paths(url)
+        body_hash = hashlib.sha256(response.content).hexdigest()
+        previous = self.lookup(url)
+        meta = {
+            'url': url,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'content_type': response.headers.get('Content-Type'),
+            'body_hash': body_hash,
+            'stored_at': time.time(),
+        }
+        # Результаты извлечения остаются валидными, пока не изменилось тело страницы
+        if previous and previous.get('body_hash') == body_hash and 'results' in previous:
+            meta['results'] = previous['results']
+            meta['results_key'] = previous.get('results_key')
+        delta = self._write_atomic(body_path, gzip.compress(response.content))
+        delta += self._write_atomic(meta_path, json.dumps(meta, ensure_ascii=False).encode('utf-8'))
+        self._track(delta, stored=True)
+        return meta
+
+    def refresh(self, url: str, meta: Dict, response: Response):
+        """Продлевает запись после ответа 304 (с новыми валидаторами, если они пришли)"""
+        meta_path, _ = self._paths(url)
+        meta['stored_at'] = time.time()
+        meta['etag'] = response.headers.get('ETag') or meta.get('etag')
+        meta['last_modified'] = response.headers.get('Last-Modified') or meta.get('last_modified')
+        self._track(self._write_atomic(meta_path, json.dumps(meta, ensure_ascii=False).encode('utf-8')))
+
+    def store_results(self, url: str, body_hash: str, results: List[Dict], extraction_key: str):
+        """
+        Запоминает результаты извлечения для страницы с данным хэшем тела.
+
+        extraction_key - версия логики извлечения (LeasingParser.extraction_key):
+        результаты, извлеченные другой версией, не возвращаются.
+        """
+        meta = self.lookup(url)
+        if not meta or meta.get('body_hash') != body_hash:
+            return
+        meta_path, _ = self._paths(url)
+        meta['results'] = results
+        meta['results_key'] = extraction_key
+        self._track(self._write_atomic(meta_path, json.dumps(meta, ensure_ascii=False).encode('utf-8')))
+
+    def cached_results(self, url: str, body_hash: str, extraction_key: str) -> Optional[List[Dict]]:
+        """Результаты прошлого извлечения, если не изменились ни тело страницы, ни логика извлечения"""
+        meta = self.lookup(url)
+        if meta and meta.get('body_hash') == body_hash and meta.get('results_key') == extraction_key:
+            return meta.get('results')
+        return None
+
+    def delete(self, url: str):
+        """Удаляет запись для url"""
+        for path in self._paths(url):
+            size = self._file_size(path)
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self._track(-size)
+
+    def evict(self):
+        """
+        Просматривает каталог целиком: удаляет устаревшие записи и самые старые
+        по обращению, пока кэш больше max_size, и заново подсчитывает его размер.
+        """
+        entries = []
+        total_size = 0
+        now = time.time()
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            meta_path = os.path.join(self.directory, name)
+            body_path = meta_path[:-len('.json')] + '.body'
+            try:
+                accessed = os.stat(meta_path).st_mtime_ns / 1e9
+                size = os.path.getsize(meta_path) + (os.path.getsize(body_path) if os.path.exists(body_path) else 0)
+            except OSError:
+                continue
+            if now - accessed > self.ttl:
+                for path in (meta_path, body_path):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                continue
+            entries.append((accessed, size, meta_path, body_path))
+            total_size += size
+
+        entries.sort()
+        while entries and total_size > self.max_size:
+            _, size, meta_path, body_path = entries.pop(0)
+            for path in (meta_path, body_path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total_size -= size
+
+        with self._size_lock:
+            self._size = total_size
+            self._stores_since_evict = 0
+
+
+class _InflightRequest:
+    """Запрос, результат которого ждут другие потоки"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.response = None
+        self.error = None
+
+
+class CachingTransport(Transport):
+    """
+    Транспорт-обертка: условные запросы через HttpCache и объединение одинаковых запросов.
+
+    Если несколько потоков одновременно запрашивают один и тот же URL, реальный
+    запрос выполняет только первый, остальные получают его результат.
+    Ответ 304 превращается в ответ 200 с телом из кэша и from_cache=True.
+    """
+
+    def __init__(self, inner: Transport, cache: HttpCache):
+        super().__init__(inner.per_host_limit, inner.max_workers)
+        self.inner = inner
+        self.cache = cache
+        self._inflight: Dict[str, _InflightRequest] = {}
+        self._inflight_lock = threading.Lock()
+
+    def get(self, url: str, timeout: float = REQUEST_TIMEOUT,
+            headers: Optional[Dict[str, str]] = None) -> Response:
+        with self._inflight_lock:
+            call = self._inflight.get(url)
+            leader = call is None
+            if leader:
+                call = self._inflight[url] = _InflightRequest()
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.response
+
+        try:
+            call.response = self._conditional_get(url, timeout, headers)
+            return call.response
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._inflight_lock:
+                del self._inflight[url]
+            call.event.set()
+
+    def _conditional_get(self, url: str, timeout: float,
+                         headers: Optional[Dict[str, str]]) -> Response:
+        meta = self.cache.lookup(url)
+        request_headers = dict(headers or {})
+        if meta:
+            if meta.get('etag'):
+                request_headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                request_headers['If-Modified-Since'] = meta['last_modified']
+
+        response = self.inner.get(url, timeout=timeout, headers=request_headers or None)
+
+        if response.status_code == 304 and meta:
+            body = self.cache.load_body(url)
+            if body is not None:
+                self.cache.refresh(url, meta, response)
+                cached = Response(url, 200, {'Content-Type': meta.get('content_type') or 'text/html'}, body)
+                cached.from_cache = True
+                cached.body_hash = meta['body_hash']
+                return cached
+            # Тело потеряно - повторяем запрос без валидаторов
+            self.cache.delete(url)
+            response = self.inner.get(url, timeout=timeout, headers=headers)
+
+        if response.status_code == 200:
+            try:
+                response.body_hash = self.cache.store(url, response)['body_hash']
+            except OSError as e:
+                logger.warning(f"Не удалось сохранить {url} в HTTP-кэш: {e}")
+        return response
+
+    def stream(self, url: str, timeout: float = REQUEST_TIMEOUT,
+               headers: Optional[Dict[str, str]] = None):
+        """Потоковые ответы (большие карты сайта) не кэшируются"""
+        return self.inner.stream(url, timeout=timeout, headers=headers)
+
+    def close(self):
+        super().close()
+        self.inner.close()
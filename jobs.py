@@ -0,0 +1,180 @@
+"""
+Фоновые задачи парсинга
+
+Запуск парсинга занимает минуты, поэтому /api/refresh не выполняет его внутри
+HTTP-запроса: задача ставится в JobRunner, а клиент сразу получает ее id и
+следит за ходом через /api/jobs/<id>. Одновременно выполняется не больше одной
+задачи: запрос, пришедший, пока задача в очереди или выполняется, получает ту
+же задачу, поэтому несколько нажатий кнопки или совпавший с ними запуск по
+расписанию не обходят сайты дважды. Запуски из других процессов исключает
+блокировка в базе (crawl_lock.py).
+"""
+import logging
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, Optional, Tuple
+
+from crawl_lock import CRAWL_LOCK_MODE, CrawlLock, CrawlLockLost
+
+logger = logging.getLogger(__name__)
+
+# Сколько последних задач хранится для /api/jobs/<id>
+JOB_HISTORY = int(os.environ.get('JOB_HISTORY', '50'))
+
+
+class Job:
+    """
+    Задача парсинга: статус (queued, running, done, error), ход по сайтам и результат.
+
+    Ход по сайтам обновляется из потоков парсеров через progress().
+    """
+
+    def __init__(self, trigger: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.trigger = trigger
+        self.status = 'queued'
+        self.created_at = datetime.now()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.sites: Dict[str, Dict] = {}
+        self.result: Optional[Dict] = None
+        self.error: Optional[str] = None
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def finished(self) -> bool:
+        return self._done.is_set()
+
+    def progress(self, site_name: str, site: Dict):
+        """Обновляет статус сайта (передается в run_parsers)"""
+        with self._lock:
+            self.sites[site_name] = dict(site)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Ждет завершения задачи. Возвращает False, если время ожидания вышло."""
+        return self._done.wait(timeout)
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            sites = {name: dict(site) for name, site in self.sites.items()}
+        return {
+            'id': self.id,
+            'trigger': self.trigger,
+            'status': self.status,
+            'created_at': self.created_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'sites': sites,
+            'result': self.result,
+            'error': self.error,
+        }
+
+
+class JobRunner:
+    """
+    Очередь задач парсинга с объединением повторных запросов.
+
+    submit() запускает задачу в фоновом потоке или возвращает уже
+    поставленную незавершенную задачу. Хранится не больше history задач.
+    """
+
+    def __init__(self, history: int = JOB_HISTORY):
+        self.history = history
+        self._jobs: 'OrderedDict[str, Job]' = OrderedDict()
+        self._current: Optional[Job] = None
+        self._lock = threading.Lock()
+
+    def submit(self, target: Callable[[Callable[[str, Dict], None]], Dict],
+               trigger: str = 'manual') -> Tuple[Job, bool]:
+        """
+        Ставит задачу target(progress) -> результат.
+
+        Возвращает (задача, создана ли она): False - запрос присоединен к
+        задаче, которая уже в очереди или выполняется.
+        """
+        with self._lock:
+            if self._current is not None and not self._current.finished:
+                return self._current, False
+            job = self._current = Job(trigger)
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.history:
+                self._jobs.popitem(last=False)
+
+        threading.Thread(target=self._run, args=(job, target), name=f'job-{job.id}', daemon=True).start()
+        return job, True
+
+    def _run(self, job: Job, target):
+        job.status = 'running'
+        job.started_at = datetime.now()
+        try:
+            job.result = target(job.progress)
+            job.status = 'done'
+        except Exception as e:
+            logger.error(f"Задача {job.id} завершилась с ошибкой: {e}", exc_info=True)
+            job.error = str(e)
+            job.status = 'error'
+        finally:
+            job.finished_at = datetime.now()
+            job._done.set()
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    @property
+    def current(self) -> Optional[Job]:
+        """Последняя поставленная задача"""
+        return self._current
+
+
+# Общая очередь процесса: веб-приложение и планировщик не запускают парсинг параллельно
+CRAWL_JOBS = JobRunner()
+
+
+def run_crawl(db, progress: Optional[Callable[[str, Dict], None]] = None,
+              lock_mode: str = CRAWL_LOCK_MODE) -> Dict:
+    """
+    Один запуск парсинга: все сайты, затем запись результатов (Database.record_crawl).
+
+    Парсинг выполняется под блокировкой между процессами (см. crawl_lock.py).
+    Если ее держит другой процесс, запуск пропускается (или сначала ждет
+    блокировку, lock_mode='wait') и возвращает 'skipped': True и аренду в 'lock'.
+    Если аренда истекла во время обхода (lock.lost), результаты не записываются
+    и выбрасывается CrawlLockLost.
+    Возвращает {'run_id', 'found', 'added', 'disappeared', 'sites', 'message'}.
+    """
+    # Парсер (bs4, requests) загружается только при запуске парсинга
+    import parser
+
+    lock = CrawlLock(db)
+    try:
+        if not lock.acquire(mode=lock_mode):
+            holder = lock.holder()
+            owner = holder['owner'] if holder else 'другой процесс'
+            logger.info(f"Парсинг пропущен: его уже выполняет {owner}")
+            return {
+                'run_id': None, 'found': 0, 'added': 0, 'disappeared': 0, 'sites': {},
+                'skipped': True, 'lock': holder,
+                'message': f"Парсинг уже выполняется ({owner}), запуск пропущен",
+            }
+        with lock:
+            started_at = datetime.now()
+            report = parser.run_parsers(page_hashes=db.get_page_hashes(), crawled_since=db.get_last_crawl_times(),
+                                        progress=progress)
+            # Без аренды результаты мог уже записывать другой процесс: не пишем поверх
+            if lock.lost:
+                raise CrawlLockLost("Блокировка парсинга потеряна во время обхода, результаты не записаны")
+            crawl = db.record_crawl(report, started_at=started_at)
+    finally:
+        # Задача выполняется в своем потоке: возвращаем его соединение в пул
+        db.remove_session()
+    return {
+        **crawl,
+        'sites': report['sites'],
+        'message': f"Найдено {crawl['found']} товаров, добавлено {crawl['added']} новых, "
+                   f"пропало {crawl['disappeared']}",
+    }
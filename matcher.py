@@ -0,0 +1,90 @@
+"""
+Предкомпилированный поиск признаков лизинга 0% и срока лизинга в тексте
+"""
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
+
+# Одно регулярное выражение на все признаки: за один проход по тексту находятся
+# упоминания лизинга, варианты "0%" и сроки в месяцах. Опережающая проверка первого
+# символа позволяет быстро пропускать позиции, с которых не начинается ни один признак;
+# "мес" и "kuu" покрывают "месяц", "месяцев", "мес." и "kuud". Перед "0" не должно
+# быть цифры ("10%", "100 protsenti"), а буква допустима: get_text() склеивает соседние
+# теги, и "<span>Liising</span><b>0%</b>" превращается в "Liising0%".
+TOKEN_RE = re.compile(
+    r'(?=[ln\d])(?:'
+    r'(?P<leasing>l(?:ea|ii)sing)'
+    r'|(?P<zero>(?<!\d)0(?:\s*%| protsenti)|null(?:\s*%| protsenti))'
+    r'|(?P<months>\d+)\s*(?:мес|kuu)'
+    r')'
+)
+
+# Более длинные тексты (например, целая страница) не кэшируются
+MEMO_MAX_TEXT_LENGTH = 4096
+
+
+class LeasingMatcher:
+    """
+    Классификатор текстов: есть ли лизинг, есть ли 0% и на сколько месяцев.
+
+    Результат classify() - словарь с ключами has_leasing, has_zero, months (int или None)
+    и leasing_period (строка вида "48 месяцев" или None). Срок 48 месяцев имеет
+    приоритет над остальными сроками. Результаты для коротких текстов кэшируются (LRU),
+    поэтому повторяющиеся блоки карточек товаров разбираются один раз.
+    """
+
+    def __init__(self, memo_size: int = 4096):
+        self._classify_cached = lru_cache(maxsize=memo_size)(self._classify)
+
+    def _classify(self, text: str) -> tuple:
+        has_leasing = False
+        has_zero = False
+        first_months = None
+        months_48 = False
+
+        for match in TOKEN_RE.finditer(text.lower()):
+            kind = match.lastgroup
+            if kind == 'leasing':
+                has_leasing = True
+            elif kind == 'zero':
+                has_zero = True
+            elif not months_48:
+                digits = match.group('months')
+                if int(digits) == 48:
+                    months_48 = True
+                elif first_months is None:
+                    first_months = digits
+
+        if months_48:
+            first_months = '48'
+        return has_leasing, has_zero, first_months
+
+    def classify(self, text: str) -> Dict:
+        """Классифицирует один текст"""
+        if len(text) <= MEMO_MAX_TEXT_LENGTH:
+            has_leasing, has_zero, months = self._classify_cached(text)
+        else:
+            has_leasing, has_zero, months = self._classify(text)
+        return {
+            'has_leasing': has_leasing,
+            'has_zero': has_zero,
+            'months': int(months) if months is not None else None,
+            'leasing_period': f"{months} месяцев" if months is not None else None,
+        }
+
+    def classify_many(self, texts: Iterable[str]) -> List[Dict]:
+        """Классифицирует несколько текстов (например, все карточки страницы)"""
+        return [self.classify(text) for text in texts]
+
+    def has_zero_leasing(self, text: str) -> bool:
+        """Есть ли в тексте и лизинг, и 0%"""
+        result = self.classify(text)
+        return result['has_leasing'] and result['has_zero']
+
+    def leasing_period(self, text: str) -> Optional[str]:
+        """Срок лизинга в виде "N месяцев" или None"""
+        return self.classify(text)['leasing_period']
+
+
+# Общий экземпляр для всех парсеров
+MATCHER = LeasingMatcher()
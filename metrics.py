@@ -0,0 +1,187 @@
+"""
+Метрики производительности в формате Prometheus
+
+Гистограммы длительности этапов парсинга (загрузка, разбор HTML, извлечение
+товаров) по сайтам, фаз HTTP-запроса (соединение, ожидание ответа, загрузка
+тела), записи в базу и обработки запросов веб-приложения. Отдаются в /api/metrics
+в текстовом формате Prometheus. При METRICS_ENABLED=0 таймеры не замеряют
+время и не берут блокировок: остается один вызов функции на замер.
+"""
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List, Optional, Sequence, Tuple
+
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1').lower() not in ('0', 'false', 'no')
+
+# Границы корзин гистограмм (секунды): от быстрых запросов к кэшу до парсинга сайта целиком
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_NULL_TIMER = nullcontext()
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Histogram:
+    """Гистограмма с метками: для каждого набора значений меток - корзины, сумма и число замеров"""
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        """Учитывает замер value (секунды) с метками label_values"""
+        key = tuple(str(label) for label in label_values)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            counts = series[0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def _time(self, label_values):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *label_values)
+
+    def time(self, *label_values: str):
+        """Контекстный менеджер, замеряющий длительность блока (без замера при METRICS_ENABLED=0)"""
+        if not METRICS_ENABLED:
+            return _NULL_TIMER
+        return self._time(label_values)
+
+    def timed(self, *label_values: str):
+        """Декоратор, замеряющий длительность вызовов функции (при METRICS_ENABLED=0 функция не меняется)"""
+        def decorator(func):
+            if not METRICS_ENABLED:
+                return func
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self._time(label_values):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+        for key, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _labels(self.label_names, key, ('le', _format_value(bound)))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            lines.append(f'{self.name}_bucket{_labels(self.label_names, key, ("le", "+Inf"))} {count}')
+            lines.append(f'{self.name}_sum{_labels(self.label_names, key)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_labels(self.label_names, key)} {count}')
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+
+class Registry:
+    """Набор метрик процесса"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str, documentation: str, label_names: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        """Регистрирует гистограмму (или возвращает уже зарегистрированную с тем же именем)"""
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Histogram(name, documentation, label_names, buckets)
+            return self._metrics[name]
+
+    def render(self) -> str:
+        """Все метрики в текстовом формате Prometheus"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(line for metric in metrics for line in metric.render()) + '\n'
+
+    def clear(self):
+        """Сбрасывает накопленные замеры (для тестов)"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.clear()
+
+
+REGISTRY = Registry()
+
+# Этапы парсинга сайта: fetch (HTTP-запрос целиком), parse (BeautifulSoup), extract (поиск товаров)
+CRAWL_STAGE_SECONDS = REGISTRY.histogram(
+    'leasing_crawl_stage_seconds', 'Длительность этапов парсинга по сайтам', ('site', 'stage'))
+# Фазы HTTP-запроса: connect (DNS, TCP и TLS нового соединения), wait (до заголовков ответа), download (тело)
+HTTP_PHASE_SECONDS = REGISTRY.histogram(
+    'leasing_http_phase_seconds', 'Длительность фаз HTTP-запросов парсеров по хостам', ('host', 'phase'))
+# Запись результатов в базу: add_products, record_crawl
+DB_WRITE_SECONDS = REGISTRY.histogram(
+    'leasing_db_write_seconds', 'Длительность записи товаров в базу', ('operation',))
+# Обработка запросов веб-приложения по шаблонам маршрутов
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    'leasing_http_request_duration_seconds', 'Время обработки запросов веб-приложения',
+    ('method', 'route', 'status'))
+
+
+def time_stage(site_name: str, stage: str):
+    """Замер этапа парсинга сайта"""
+    return CRAWL_STAGE_SECONDS.time(site_name, stage)
+
+
+def instrument_app(app):
+    """Замеряет время обработки всех маршрутов Flask-приложения"""
+    if not METRICS_ENABLED:
+        return
+    from flask import g, request
+
+    @app.before_request
+    def start_request_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def observe_request(response):
+        started = g.pop('metrics_started', None)
+        if started is not None:
+            # Шаблон маршрута, а не путь: число рядов метрики не зависит от параметров
+            route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, request.method, route,
+                                         str(response.status_code))
+        return response
@@ -0,0 +1,188 @@
+"""
+Версионированные миграции схемы базы данных
+
+Текущая версия схемы хранится в PRAGMA user_version файла SQLite. Каждая миграция
+применяется один раз, в своей транзакции, и написана так, чтобы ее можно было
+безопасно выполнить и на базе, созданной сразу в актуальной схеме (create_all).
+"""
+import logging
+
+from sqlalchemy import inspect, text
+
+from prices import parse_price
+
+logger = logging.getLogger(__name__)
+
+
+def _columns(conn, table: str):
+    return {column['name'] for column in inspect(conn).get_columns(table)}
+
+
+def _add_column(conn, table: str, column: str, ddl_type: str):
+    if column not in _columns(conn, table):
+        conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {ddl_type}'))
+
+
+def add_leasing_period(conn):
+    """Поле со сроком лизинга"""
+    _add_column(conn, 'leasing_products', 'leasing_period', 'VARCHAR(50)')
+
+
+def add_unique_product_index(conn):
+    """Уникальный индекс (url, title) для пакетной вставки с ON CONFLICT"""
+    # Удаляем дубликаты, накопленные до появления уникального индекса
+    conn.execute(text(
+        'DELETE FROM leasing_products WHERE id NOT IN '
+        '(SELECT MIN(id) FROM leasing_products GROUP BY url, title)'
+    ))
+    conn.execute(text(
+        'CREATE UNIQUE INDEX IF NOT EXISTS uq_leasing_products_url_title '
+        'ON leasing_products (url, title)'
+    ))
+
+
+def add_leasing_months(conn):
+    """Числовой срок лизинга и индексы для выборок по сайту, дате и сроку"""
+    _add_column(conn, 'leasing_products', 'leasing_months', 'INTEGER')
+    # "48 месяцев" -> 48: CAST в SQLite берет числовой префикс строки
+    conn.execute(text(
+        'UPDATE leasing_products '
+        'SET leasing_months = NULLIF(CAST(leasing_period AS INTEGER), 0) '
+        'WHERE leasing_months IS NULL AND leasing_period IS NOT NULL'
+    ))
+    conn.execute(text(
+        'CREATE INDEX IF NOT EXISTS ix_leasing_products_site_found_at '
+        'ON leasing_products (site, found_at)'
+    ))
+    conn.execute(text(
+        'CREATE INDEX IF NOT EXISTS ix_leasing_products_found_at ON leasing_products (found_at)'
+    ))
+    conn.execute(text(
+        'CREATE INDEX IF NOT EXISTS ix_leasing_products_leasing_months '
+        'ON leasing_products (leasing_months, found_at)'
+    ))
+
+
+def add_price_cents(conn):
+    """Цена в центах и валюта, разобранные из текстовой цены"""
+    _add_column(conn, 'leasing_products', 'price_cents', 'INTEGER')
+    _add_column(conn, 'leasing_products', 'currency', 'VARCHAR(3)')
+    rows = conn.execute(text(
+        'SELECT id, price FROM leasing_products WHERE price IS NOT NULL AND price_cents IS NULL'
+    )).all()
+    updates = []
+    for row_id, price in rows:
+        parsed = parse_price(price)
+        if parsed:
+            updates.append({'id': row_id, 'price_cents': parsed[0], 'currency': parsed[1]})
+    if updates:
+        conn.execute(text(
+            'UPDATE leasing_products SET price_cents = :price_cents, currency = :currency WHERE id = :id'
+        ), updates)
+    conn.execute(text(
+        'CREATE INDEX IF NOT EXISTS ix_leasing_products_price_cents ON leasing_products (price_cents)'
+    ))
+
+
+def add_data_generation(conn):
+    """Счетчик поколений данных для кэша ответов"""
+    conn.execute(text(
+        'CREATE TABLE IF NOT EXISTS meta (key VARCHAR(50) NOT NULL PRIMARY KEY, value INTEGER NOT NULL)'
+    ))
+    conn.execute(text("INSERT OR IGNORE INTO meta (key, value) VALUES ('generation', 0)"))
+
+
+def add_site_summary(conn):
+    """Сводка по сайтам для главной страницы и индекс для выборки 48 месяцев по сайту"""
+    conn.execute(text(
+        'CREATE TABLE IF NOT EXISTS site_summary ('
+        'site VARCHAR(50) NOT NULL PRIMARY KEY, product_count INTEGER NOT NULL, '
+        'count_48 INTEGER NOT NULL, version INTEGER NOT NULL)'
+    ))
+    conn.execute(text(
+        'INSERT OR REPLACE INTO site_summary (site, product_count, count_48, version) '
+        'SELECT site, COUNT(*), COALESCE(SUM(leasing_months = 48), 0), 1 '
+        'FROM leasing_products GROUP BY site'
+    ))
+    conn.execute(text(
+        'CREATE INDEX IF NOT EXISTS ix_leasing_products_site_months '
+        'ON leasing_products (site, leasing_months, found_at)'
+    ))
+
+
+def add_product_lifecycle(conn):
+    """Жизненный цикл товаров (first_seen, last_seen, disappeared_at), запуски парсинга и хэши страниц"""
+    _add_column(conn, 'leasing_products', 'first_seen', 'DATETIME')
+    _add_column(conn, 'leasing_products', 'last_seen', 'DATETIME')
+    _add_column(conn, 'leasing_products', 'disappeared_at', 'DATETIME')
+    _add_column(conn, 'leasing_products', 'last_run_id', 'INTEGER')
+    # Для уже собранных товаров известна только дата находки
+    conn.execute(text(
+        'UPDATE leasing_products SET first_seen = COALESCE(found_at, created_at), '
+        'last_seen = COALESCE(found_at, created_at) WHERE first_seen IS NULL'
+    ))
+    conn.execute(text(
+        'CREATE TABLE IF NOT EXISTS crawl_runs ('
+        'id INTEGER NOT NULL PRIMARY KEY, started_at DATETIME NOT NULL, finished_at DATETIME, '
+        'sites TEXT, found INTEGER, added INTEGER, disappeared INTEGER)'
+    ))
+    conn.execute(text(
+        'CREATE TABLE IF NOT EXISTS crawl_pages ('
+        'url VARCHAR(500) NOT NULL PRIMARY KEY, site VARCHAR(50) NOT NULL, '
+        'content_hash VARCHAR(64) NOT NULL, changed_at DATETIME NOT NULL, crawled_at DATETIME NOT NULL)'
+    ))
+    # Частичные индексы покрывают только действующие предложения
+    conn.execute(text(
+        'CREATE INDEX IF NOT EXISTS ix_leasing_products_active_found_at '
+        'ON leasing_products (found_at) WHERE disappeared_at IS NULL'
+    ))
+    conn.execute(text(
+        'CREATE INDEX IF NOT EXISTS ix_leasing_products_active_site '
+        'ON leasing_products (site, found_at) WHERE disappeared_at IS NULL'
+    ))
+
+
+def add_crawl_locks(conn):
+    """Аренда блокировки парсинга между процессами"""
+    conn.execute(text(
+        'CREATE TABLE IF NOT EXISTS crawl_locks ('
+        'name VARCHAR(50) NOT NULL PRIMARY KEY, owner VARCHAR(100) NOT NULL, acquired_at DATETIME NOT NULL, '
+        'heartbeat_at DATETIME NOT NULL, expires_at DATETIME NOT NULL)'
+    ))
+
+
+# Порядок важен: номер версии схемы = индекс миграции + 1
+MIGRATIONS = [
+    add_leasing_period,
+    add_unique_product_index,
+    add_leasing_months,
+    add_price_cents,
+    add_data_generation,
+    add_site_summary,
+    add_product_lifecycle,
+    add_crawl_locks,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def get_schema_version(conn) -> int:
+    """Текущая версия схемы базы"""
+    return conn.execute(text('PRAGMA user_version')).scalar()
+
+
+def migrate(engine) -> int:
+    """Применяет недостающие миграции. Возвращает итоговую версию схемы."""
+    with engine.connect() as conn:
+        version = get_schema_version(conn)
+
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        with engine.begin() as conn:
+            # Другой процесс мог успеть применить миграцию
+            if get_schema_version(conn) >= number:
+                continue
+            logger.info(f"Миграция схемы до версии {number}: {migration.__doc__}")
+            migration(conn)
+            conn.execute(text(f'PRAGMA user_version = {number}'))
+
+    return max(version, SCHEMA_VERSION)
@@ -0,0 +1,180 @@
+"""
+Запись и воспроизведение страниц магазинов для офлайн-тестов и бенчмарков
+
+RecordingTransport оборачивает транспорт парсеров и сохраняет каждую успешно
+загруженную страницу в каталог фикстур (тело в gzip и запись в index.json).
+ReplayTransport отдает сохраненные страницы без сети: парсеры работают с ним
+так же, как с живыми сайтами. scale_page размножает товары страницы, чтобы
+на больших страницах была видна нелинейная сложность извлечения.
+
+Запись живых страниц:
+    python page_fixtures.py record                 # главные страницы всех сайтов
+    python page_fixtures.py record --pages 20 RDE  # каталог RDE, до 20 страниц
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from transport import REQUEST_TIMEOUT, Response, Transport
+
+# Каталог записанных страниц
+FIXTURES_DIR = os.environ.get(
+    'PARSER_FIXTURES_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'recorded')
+)
+INDEX_FILE = 'index.json'
+# Заголовки ответа, которые сохраняются вместе со страницей
+RECORDED_HEADERS = ('Content-Type', 'Last-Modified', 'ETag')
+
+HREF_RE = re.compile(r'href="([^"#]*)"')
+
+
+def fixture_name(url: str) -> str:
+    """Имя файла страницы: хэш адреса, чтобы любые URL были допустимыми именами"""
+    return hashlib.sha1(url.encode('utf-8')).hexdigest()[:16] + '.html.gz'
+
+
+def load_index(directory: str = FIXTURES_DIR) -> Dict[str, Dict]:
+    """Записанные страницы: адрес -> {'file', 'status', 'headers'} (пусто, если записей нет)"""
+    try:
+        with open(os.path.join(directory, INDEX_FILE), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+class RecordingTransport(Transport):
+    """
+    Транспорт, сохраняющий ответы inner в каталог фикстур.
+
+    Записываются ответы без ошибок (статус меньше 400); повторная загрузка
+    того же адреса перезаписывает страницу. Потоковые ответы (карты сайта)
+    не записываются.
+    """
+
+    def __init__(self, inner: Transport, directory: str = FIXTURES_DIR):
+        super().__init__(inner.per_host_limit, inner.max_workers)
+        self.inner = inner
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.index = load_index(directory)
+        self._index_lock = threading.Lock()
+
+    def get(self, url: str, timeout: float = REQUEST_TIMEOUT,
+            headers: Optional[Dict[str, str]] = None) -> Response:
+        response = self.inner.get(url, timeout=timeout, headers=headers)
+        if response.status_code < 400:
+            self.record(url, response)
+        return response
+
+    def record(self, url: str, response: Response):
+        """Сохраняет страницу и обновляет index.json"""
+        name = fixture_name(url)
+        with gzip.open(os.path.join(self.directory, name), 'wb') as f:
+            f.write(response.content)
+        with self._index_lock:
+            self.index[url] = {
+                'file': name,
+                'status': response.status_code,
+                'headers': {key: response.headers[key] for key in RECORDED_HEADERS if key in response.headers},
+            }
+            path = os.path.join(self.directory, INDEX_FILE)
+            with open(path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(self.index, f, ensure_ascii=False, indent=1, sort_keys=True)
+            os.replace(path + '.tmp', path)
+
+    @contextmanager
+    def stream(self, url: str, timeout: float = REQUEST_TIMEOUT,
+               headers: Optional[Dict[str, str]] = None):
+        with self.inner.stream(url, timeout=timeout, headers=headers) as body:
+            yield body
+
+    def close(self):
+        super().close()
+        self.inner.close()
+
+
+class ReplayTransport(Transport):
+    """
+    Транспорт, отдающий записанные страницы без сети.
+
+    pages (адрес -> тело) дополняет или заменяет записи каталога directory;
+    на адреса, которых нет ни там, ни там, отвечает 404.
+    """
+
+    def __init__(self, directory: Optional[str] = FIXTURES_DIR, pages: Optional[Dict[str, bytes]] = None):
+        super().__init__()
+        self.directory = directory
+        self.index = load_index(directory) if directory else {}
+        self.pages = dict(pages or {})
+        self.requests = 0
+
+    def get(self, url: str, timeout: float = REQUEST_TIMEOUT,
+            headers: Optional[Dict[str, str]] = None) -> Response:
+        self.requests += 1
+        if url in self.pages:
+            return Response(url, 200, {'Content-Type': 'text/html; charset=utf-8'}, self.pages[url])
+        entry = self.index.get(url)
+        if entry is None:
+            return Response(url, 404, {}, b'')
+        with gzip.open(os.path.join(self.directory, entry['file']), 'rb') as f:
+            return Response(url, entry['status'], entry['headers'], f.read())
+
+
+def scale_page(content: bytes, factor: int) -> bytes:
+    """
+    Синтетическая страница с телом исходной, повторенным factor раз.
+
+    В каждой копии к ссылкам добавляется параметр copy, поэтому товары копий
+    не схлопываются при дедупликации и страница содержит в factor раз больше товаров.
+    """
+    html = content.decode('utf-8')
+    start = html.find('>', html.lower().find('<body')) + 1
+    end = html.lower().rfind('</body>')
+    if start <= 0 or end < start:
+        raise ValueError("На странице нет тега body")
+    body = html[start:end]
+
+    def copy(number: int) -> str:
+        if number == 0:
+            return body
+        return HREF_RE.sub(
+            lambda match: f'href="{match.group(1)}{"&amp;" if "?" in match.group(1) else "?"}copy={number}"', body
+        )
+
+    return (html[:start] + ''.join(copy(number) for number in range(factor)) + html[end:]).encode('utf-8')
+
+
+def record(site_names=(), directory: str = FIXTURES_DIR, max_pages: int = 1) -> Dict[str, int]:
+    """Загружает страницы сайтов через RecordingTransport. Возвращает сайт -> число товаров."""
+    from parser import build_parsers
+    from transport import get_transport
+
+    transport = RecordingTransport(get_transport(), directory)
+    found = {}
+    for parser in build_parsers():
+        if site_names and parser.site_name not in site_names:
+            continue
+        parser.transport = transport
+        parser.max_pages = max_pages
+        found[parser.site_name] = len(parser.parse())
+    return found
+
+
+if __name__ == '__main__':
+    arguments = argparse.ArgumentParser(description='Запись страниц магазинов в фикстуры')
+    commands = arguments.add_subparsers(dest='command', required=True)
+    record_command = commands.add_parser('record', help='загрузить и сохранить страницы сайтов')
+    record_command.add_argument('sites', nargs='*', help='имена сайтов из sites.json (по умолчанию все)')
+    record_command.add_argument('--dir', default=FIXTURES_DIR, help='каталог фикстур')
+    record_command.add_argument('--pages', type=int, default=1, help='сколько страниц каталога загрузить')
+    args = arguments.parse_args()
+
+    for site_name, count in record(args.sites, args.dir, args.pages).items():
+        print(f"{site_name}: найдено {count} товаров")
+    print(f"Страницы сохранены в {args.dir}")
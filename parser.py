@@ -1,332 +1,932 @@
 """
 Парсер для проверки лизинга с 0% на сайтах продажи электроники в Эстонии
 """
-import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, CData, NavigableString, Tag
+from bisect import bisect_right
+import hashlib
 import re
+import os
+import time
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import Callable, Iterator, List, Dict, Optional, Set, Tuple
+from urllib.parse import urlsplit
 import logging
+from crawler import CRAWL_WORKERS, MAX_DEPTH, MAX_PAGES, RATE_LIMITER, crawl
+from matcher import MATCHER
+from metrics import time_stage
+from resilience import (BREAKERS, RETRIES, RETRY_MAX_DELAY, RETRYABLE_STATUSES, backoff_delay,
+                        is_retryable_error, retry_after)
+from site_specs import SITE_SPECS_PATH, SiteSpec, get_spec, load_specs
+from sitemap import SITEMAP_MAX_FILES, SITEMAP_MAX_URLS, SITEMAPS_ENABLED, iter_sitemap, read_robots
+from transport import REQUEST_TIMEOUT, Response, Transport, get_transport
+from urls import DedupIndex, canonicalize_url
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Количество сайтов, которые парсятся одновременно
+MAX_WORKERS = int(os.environ.get('PARSER_MAX_WORKERS', '3'))
+# Жесткий лимит времени на парсинг одного сайта (секунды)
+SITE_TIMEOUT = float(os.environ.get('PARSER_SITE_TIMEOUT', '60'))
+# Бэкенд разбора HTML: auto, lxml или html.parser
+HTML_BACKEND = os.environ.get('PARSER_HTML_BACKEND', 'auto')
+
+# Версия логики извлечения товаров. Входит в хэш страницы: после ее увеличения
+# страницы, не изменившиеся с прошлого запуска, все равно разбираются заново
+EXTRACTION_VERSION = 1
+
+# Бэкенды BeautifulSoup в порядке предпочтения для режима auto: модуль, который
+# нужен бэкенду, или None для встроенного. Порядок соответствует замерам
+# benchmark_backends() на страницах магазинов: lxml (C) в разы быстрее html.parser.
+HTML_BACKENDS = {
+    'lxml': 'lxml',
+    'html.parser': None,
+}
+
+
+def available_backends() -> List[str]:
+    """Возвращает установленные бэкенды разбора HTML в порядке предпочтения"""
+    available = []
+    for name, module in HTML_BACKENDS.items():
+        if module is not None:
+            try:
+                __import__(module)
+            except ImportError:
+                continue
+        available.append(name)
+    return available
+
+
+def select_backend(name: str = 'auto') -> str:
+    """
+    Выбирает бэкенд разбора HTML.
+
+    'auto' - самый быстрый из установленных. Если запрошенный бэкенд
+    не установлен, используется html.parser.
+    """
+    available = available_backends()
+    if name == 'auto':
+        return available[0]
+    if name not in HTML_BACKENDS:
+        raise ValueError(f"Неизвестный бэкенд HTML: {name}. Доступны: {', '.join(HTML_BACKENDS)}")
+    if name not in available:
+        logger.warning(f"Бэкенд {name} не установлен, используется html.parser")
+        return 'html.parser'
+    return name
+
+
+def benchmark_backends(content: bytes, repeat: int = 3) -> Dict[str, float]:
+    """Замеряет среднее время разбора content (секунды) каждым установленным бэкендом"""
+    timings = {}
+    for name in available_backends():
+        started = time.perf_counter()
+        for _ in range(repeat):
+            BeautifulSoup(content, name)
+        timings[name] = (time.perf_counter() - started) / repeat
+    return timings
+
+
+# Текстовые узлы, которые могут упоминать лизинг с 0%
+LEASING_TEXT_RE = re.compile(r'leasing|liising|0\s*%', re.I)
+# Классы элементов с ценой
+PRICE_CLASS_RE = re.compile(r'price|hind', re.I)
+# Типы строк, которые учитывает get_text() (без комментариев, script и style)
+TEXT_STRING_TYPES = (NavigableString, CData)
+
+
+class PageIndex:
+    """
+    Индекс страницы, построенный за один обход DOM.
+
+    Теги нумеруются в порядке обхода (pre-order), поэтому потомки тега с
+    номером pos - это теги с номерами от pos + 1 до конца его поддерева.
+    Первая ссылка, заголовок или цена внутри контейнера находятся бинарным
+    поиском по отсортированным спискам номеров, а текст контейнера - срез
+    общего списка текстовых фрагментов. Повторных обходов поддеревьев нет.
+    """
+
+    def __init__(self, soup: BeautifulSoup, container_tags, title_tags, text_re=LEASING_TEXT_RE):
+        self.elements: List[Tag] = []
+        # Текстовые фрагменты в порядке документа (как их видит get_text())
+        self.fragments: List[str] = []
+        # Номера тегов <a href>, тегов-заголовков и элементов с ценой
+        self.links: List[int] = []
+        self.titles: List[int] = []
+        self.prices: List[int] = []
+        # Номер тега -> (конец поддерева в elements, начало и конец текста в fragments)
+        self.spans: Dict[int, tuple] = {}
+        # Номера контейнеров с упоминанием лизинга в порядке первого упоминания
+        self.candidates: List[int] = []
+
+        candidate_set = set()
+        containers = []
+        stack = [(soup, -1, False)]
+        while stack:
+            node, pos, leaving = stack.pop()
+            if leaving:
+                self.spans[pos] = (len(self.elements), self.spans[pos][1], len(self.fragments))
+                if containers and containers[-1] == pos:
+                    containers.pop()
+                continue
+
+            if isinstance(node, NavigableString):
+                if type(node) in TEXT_STRING_TYPES:
+                    self.fragments.append(str(node))
+                if containers and containers[-1] not in candidate_set and text_re.search(node):
+                    candidate_set.add(containers[-1])
+                    self.candidates.append(containers[-1])
+                continue
+
+            if node is not soup:
+                pos = len(self.elements)
+                self.elements.append(node)
+                self.spans[pos] = (None, len(self.fragments), None)
+                name = node.name
+                if name == 'a' and node.get('href') is not None:
+                    self.links.append(pos)
+                if name in title_tags:
+                    self.titles.append(pos)
+                if name in ('span', 'div') and self._has_price_class(node):
+                    self.prices.append(pos)
+                if name in container_tags:
+                    containers.append(pos)
+                stack.append((node, pos, True))
+            for child in reversed(node.contents):
+                stack.append((child, -1, False))
+
+    @staticmethod
+    def _has_price_class(tag: Tag) -> bool:
+        classes = tag.get('class')
+        if not classes:
+            return False
+        if isinstance(classes, str):
+            return bool(PRICE_CLASS_RE.search(classes))
+        return any(PRICE_CLASS_RE.search(cls) for cls in classes)
+
+    def text(self) -> str:
+        """Текст всей страницы"""
+        return ''.join(self.fragments)
+
+    def element_text(self, pos: int, strip: bool = False) -> str:
+        """Текст тега, как get_text() или get_text(strip=True)"""
+        _, start, end = self.spans[pos]
+        if strip:
+            return ''.join(fragment.strip() for fragment in self.fragments[start:end])
+        return ''.join(self.fragments[start:end])
+
+    def first_descendant(self, positions: List[int], pos: int) -> Optional[int]:
+        """Первый тег из positions внутри поддерева pos (сам pos не учитывается)"""
+        index = bisect_right(positions, pos)
+        if index < len(positions) and positions[index] < self.spans[pos][0]:
+            return positions[index]
+        return None
+
 
 class LeasingParser:
     """Базовый класс для парсинга сайтов на наличие лизинга с 0%"""
-    
-    def __init__(self, site_name: str, base_url: str):
+
+    # Настройки извлечения, которые переопределяют подклассы:
+    # теги, ближайший из которых считается карточкой товара для упоминания лизинга
+    container_tags = ('div', 'article', 'section', 'li', 'a')
+    # теги, из которых берется название товара
+    title_tags = ('h1', 'h2', 'h3', 'h4')
+    # брать название из ссылки, если в карточке нет заголовка
+    title_from_link = True
+    # Ссылки, по которым идет обход каталога (при PARSER_MAX_PAGES > 1): шаблон для
+    # пути с параметрами и приоритет (меньше - раньше). Акции важнее пагинации,
+    # пагинация важнее категорий. Остальные ссылки не обходятся.
+    follow_links = (
+        (re.compile(r'leasing|liising|kampaania|campaign|soodus', re.I), 0),
+        (re.compile(r'[?&](?:page|p)=\d+|/page/\d+', re.I), 1),
+        (re.compile(r'categor|kategoori|catalog', re.I), 2),
+    )
+    # Адреса товаров в карте сайта (None - все адреса сайта из карты)
+    product_url_pattern = None
+    # Слова, которые на сайте означают лизинг, помимо "leasing"/"liising"
+    leasing_keywords = ()
+
+    def __init__(self, site_name: str, base_url: str, transport: Optional[Transport] = None,
+                 html_backend: Optional[str] = None):
         self.site_name = site_name
         self.base_url = base_url
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-        })
+        self.html_backend = select_backend(html_backend or HTML_BACKEND)
+        # Момент (time.monotonic), после которого запросы к сайту больше не делаются
+        self.deadline = None
+        # Транспорт общий для всех парсеров, чтобы переиспользовать соединения
+        self.transport = transport or get_transport()
+        # Индекс URL, общий для всех парсеров одного запуска (задается в run_parsers)
+        self.dedup: Optional[DedupIndex] = None
+        # Хэш главной страницы с прошлого запуска (задается в run_parsers) и текущий хэш
+        self.known_hash: Optional[str] = None
+        self.page_hash: Optional[str] = None
+        # True, если страница не изменилась и извлечение пропущено
+        self.unchanged = False
+        # Ошибка загрузки стартовой страницы: сайт не обработан, а не пуст
+        self.error: Optional[str] = None
+        # Причина неполного обхода каталога: товары найдены не на всех страницах
+        self.incomplete: Optional[str] = None
+        # Бюджет обхода каталога и общий ограничитель запросов к хостам
+        self.max_pages = MAX_PAGES
+        self.max_depth = MAX_DEPTH
+        self.crawl_workers = CRAWL_WORKERS
+        self.rate_limiter = RATE_LIMITER
+        # Повторы временных ошибок и предохранитель сайта, общий для всех запусков
+        self.retries = RETRIES
+        self.breaker = BREAKERS.get(site_name)
+        # Причина последней неудачной загрузки (для статуса сайта)
+        self.fetch_error: Optional[str] = None
+        # Поиск товаров по картам сайта; since - начало прошлого успешного запуска
+        # (задается в run_parsers): страницы, не менявшиеся с тех пор, не загружаются
+        self.use_sitemaps = SITEMAPS_ENABLED
+        self.since: Optional[datetime] = None
+        # Страницы товаров из карты сайта, которые в этом запуске не загружались
+        self.listed_urls: Set[str] = set()
+        self._sitemap_pages: Set[str] = set()
+
+    @property
+    def page_url(self) -> str:
+        """Адрес страницы, с которой собираются товары"""
+        return f"{self.base_url}/"
+
+    @property
+    def extraction_key(self) -> str:
+        """
+        Версия логики извлечения этого парсера: EXTRACTION_VERSION, класс, сайт и
+        хэш описания из sites.json. Меняется при любом изменении, от которого
+        зависят извлеченные товары.
+        """
+        spec = getattr(self, 'spec', None)
+        return f"{EXTRACTION_VERSION}:{type(self).__name__}:{self.site_name}:{spec.digest if spec else '-'}"
+
+    def content_hash(self, content: bytes) -> str:
+        """Хэш содержимого страницы с учетом версии логики извлечения"""
+        return hashlib.sha256(self.extraction_key.encode('utf-8') + b':' + content).hexdigest()
     
     def parse(self) -> List[Dict]:
-        """Основной метод парсинга. Возвращает список товаров с лизингом 0%"""
-        raise NotImplementedError("Метод parse должен быть реализован в подклассе")
-    
+        """
+        Основной метод парсинга. Возвращает список товаров с лизингом 0%.
+
+        Если хэш страницы совпал с known_hash (сохраненным в базе после прошлого
+        запуска), извлечение пропускается целиком: возвращается пустой список,
+        а unchanged становится True. Иначе, если страница не изменилась с прошлого
+        запроса по данным HTTP-кэша (ответ 304 или тот же хэш тела), результаты
+        берутся из кэша без разбора HTML. При max_pages > 1 вместо главной
+        страницы обходится каталог (см. parse_catalog).
+        """
+        if self.max_pages > 1:
+            return self.parse_catalog()
+
+        url = self.page_url
+        response = self.fetch(url)
+
+        if response is None:
+            self.error = self._start_page_error(url)
+            logger.warning(self.error)
+            return []
+
+        self.page_hash = self.content_hash(response.content)
+        if self.known_hash is not None and self.page_hash == self.known_hash:
+            self.unchanged = True
+            logger.info(f"{self.site_name}: страница не изменилась с прошлого запуска, извлечение пропущено")
+            return []
+
+        cache = getattr(self.transport, 'cache', None)
+        if cache is not None and response.body_hash:
+            cached = cache.cached_results(url, response.body_hash, self.extraction_key)
+            if cached is not None:
+                found_at = datetime.now().isoformat()
+                results = self._drop_seen([dict(result, found_at=found_at) for result in cached])
+                logger.info(f"{self.site_name}: страница не изменилась, {len(results)} товаров из кэша")
+                return results
+
+        results = self.extract(self._make_soup(response))
+        if cache is not None and response.body_hash:
+            cache.store_results(url, response.body_hash, results, self.extraction_key)
+
+        results = self._drop_seen(results)
+        logger.info(f"{self.site_name}: найдено {len(results)} товаров с лизингом 0%")
+        return results
+
+    def parse_catalog(self) -> List[Dict]:
+        """
+        Обходит каталог сайта от главной страницы по ссылкам follow_links.
+
+        Загружается не более max_pages страниц не глубже max_depth, по
+        crawl_workers одновременно; частоту запросов к хосту ограничивает
+        rate_limiter. Хэш страницы в этом режиме не считается: товары со всех
+        страниц сверяются с базой как обычно. Если обход неполный (страницы не
+        загрузились или не вошли в бюджет), причина записывается в incomplete.
+
+        Если включены карты сайта (use_sitemaps), в очередь сразу попадают
+        страницы товаров, изменившиеся после since. Остальные страницы из карты
+        запоминаются в listed_urls: их товары считаются по-прежнему действующими.
+        """
+        url = self.page_url
+        seeds = []
+        listed = set()
+        if self.use_sitemaps:
+            for link, lastmod in self.discover():
+                listed.add(link)
+                if self.since is None or lastmod is None or lastmod > self.since:
+                    seeds.append(link)
+            logger.info(f"{self.site_name}: в картах сайта {len(listed)} страниц, изменились {len(seeds)}")
+        self._sitemap_pages = set(seeds)
+
+        results, fetched, complete = crawl(self, url, self.max_pages, self.max_depth, self.crawl_workers, seeds)
+        if not fetched:
+            self.error = self._start_page_error(url)
+            logger.warning(self.error)
+            return []
+        self.listed_urls = listed - fetched
+        if not complete:
+            self.incomplete = f"каталог обойден не полностью: загружено {len(fetched)} страниц"
+            logger.warning(f"{self.site_name}: {self.incomplete}")
+
+        results = self._drop_seen(results)
+        logger.info(f"{self.site_name}: обойдено {len(fetched)} страниц, найдено {len(results)} товаров с лизингом 0%")
+        return results
+
+    def discover(self) -> Iterator[Tuple[str, Optional[datetime]]]:
+        """
+        Страницы товаров из карт сайта: (канонический URL, lastmod или None).
+
+        Карты перечислены в robots.txt (если их там нет - /sitemap.xml), индексы
+        карт обходятся вглубь. Читается не более SITEMAP_MAX_FILES файлов и
+        SITEMAP_MAX_URLS адресов; адреса других сайтов, запрещенные robots.txt
+        и не подходящие под product_url_pattern пропускаются.
+        """
+        response = self.fetch(f"{self.base_url}/robots.txt")
+        robots, sitemaps = read_robots(response.content.decode('utf-8', 'replace') if response is not None else '')
+        queue = deque(sitemaps or [f"{self.base_url}/sitemap.xml"])
+        seen_sitemaps = set(queue)
+        host = urlsplit(self.base_url).netloc
+        files = urls = 0
+
+        while queue and files < SITEMAP_MAX_FILES and urls < SITEMAP_MAX_URLS:
+            sitemap_url = queue.popleft()
+            files += 1
+            if not self.rate_limiter.acquire(sitemap_url, self.deadline):
+                break
+            timeout = self._request_timeout(sitemap_url)
+            if timeout is None:
+                break
+            try:
+                with self.transport.stream(sitemap_url, timeout=timeout) as body:
+                    for kind, loc, lastmod in iter_sitemap(body):
+                        if kind == 'sitemap':
+                            if loc not in seen_sitemaps:
+                                seen_sitemaps.add(loc)
+                                queue.append(loc)
+                            continue
+                        link = canonicalize_url(loc, self.page_url)
+                        if (link is None or urlsplit(link).netloc != host
+                                or not robots.can_fetch('*', link)
+                                or (self.product_url_pattern and not self.product_url_pattern.search(link))):
+                            continue
+                        yield link, lastmod
+                        urls += 1
+                        if urls >= SITEMAP_MAX_URLS:
+                            logger.warning(f"{self.site_name}: достигнут лимит {SITEMAP_MAX_URLS} адресов из карт сайта")
+                            break
+            except Exception as e:
+                logger.error(f"Ошибка при чтении карты сайта {sitemap_url}: {e}")
+
+    def parse_page(self, url: str) -> Optional[Tuple[List[Dict], List[Tuple[str, int]]]]:
+        """Загружает страницу каталога: (товары, [(ссылка, приоритет)]) или None"""
+        response = self.fetch(url)
+        if response is None:
+            return None
+        soup = self._make_soup(response)
+        with time_stage(self.site_name, 'extract'):
+            return self.extract_page(soup, url, product_page=url in self._sitemap_pages)
+
+    def link_priority(self, url: str) -> Optional[int]:
+        """Приоритет обхода ссылки или None, если по ней не нужно переходить"""
+        parts = urlsplit(url)
+        if parts.netloc != urlsplit(self.base_url).netloc:
+            return None
+        target = f"{parts.path}?{parts.query}" if parts.query else parts.path
+        for pattern, priority in self.follow_links:
+            if pattern.search(target):
+                return priority
+        return None
+
+    def _start_page_error(self, url: str) -> str:
+        if self.fetch_error:
+            return f"Не удалось загрузить главную страницу {url}: {self.fetch_error}"
+        return f"Не удалось загрузить главную страницу {url}"
+
+    def _drop_seen(self, results: List[Dict]) -> List[Dict]:
+        """Убирает товары, уже найденные в этом запуске другими парсерами"""
+        if self.dedup is None:
+            return results
+        return [result for result in results if self.dedup.add(result['url'])]
+
+    def extract(self, soup: BeautifulSoup, page_url: Optional[str] = None) -> List[Dict]:
+        """
+        Извлекает товары с лизингом 0% из разобранной страницы.
+
+        Для каждого текста с упоминанием лизинга берется ближайший контейнер
+        (container_tags), из него - ссылка, название, цена и срок лизинга.
+        """
+        with time_stage(self.site_name, 'extract'):
+            return self.extract_page(soup, page_url)[0]
+
+    def extract_page(self, soup: BeautifulSoup, page_url: Optional[str] = None,
+                     product_page: bool = False) -> Tuple[List[Dict], List[Tuple[str, int]]]:
+        """
+        Товары страницы (см. extract) и ссылки для обхода каталога.
+
+        Оба результата берутся из одного индекса страницы. Ссылки - канонические
+        URL того же сайта с приоритетом из follow_links; при max_pages <= 1
+        ссылки не собираются. На странице товара (product_page) упоминание
+        лизинга без ссылки относится к самой странице, а название берется из
+        первого заголовка страницы.
+        """
+        page_url = page_url or self.page_url
+        page = PageIndex(soup, self.container_tags, self.title_tags, self.leasing_text_re)
+        links = self.collect_links((page.elements[pos].get('href') for pos in page.links), page_url)
+
+        results = []
+        if not self.search_leasing_keywords(page.text()):
+            return results, links
+        category = urlsplit(page_url).path or '/'
+
+        seen_urls = DedupIndex()
+        for container in page.candidates:
+            element = page.elements[container]
+            if element.name == 'a':
+                link_pos = container
+            else:
+                link_pos = page.first_descendant(page.links, container)
+            if link_pos is not None:
+                # Пропускаем невалидные ссылки и приводим URL к каноническому виду
+                href = canonicalize_url(page.elements[link_pos].get('href'), page_url)
+            elif product_page:
+                href = page_url
+            else:
+                continue
+            if href is None:
+                continue
+
+            title_pos = page.first_descendant(page.titles, container)
+            if title_pos is None and self.title_from_link:
+                title_pos = link_pos
+            if title_pos is None and product_page and page.titles:
+                title_pos = page.titles[0]
+            title = page.element_text(title_pos, strip=True) if title_pos is not None else "Товар с лизингом 0%"
+
+            # Если название слишком короткое, берем текст ссылки
+            if len(title) < 10 and link_pos is not None:
+                title = page.element_text(link_pos, strip=True) or title
+
+            price_pos = page.first_descendant(page.prices, container)
+            price = page.element_text(price_pos, strip=True) if price_pos is not None else "Цена не указана"
+
+            # Извлекаем срок лизинга
+            leasing_period = self.extract_leasing_period(page.element_text(container))
+
+            # Проверяем, что это новый товар
+            if seen_urls.add(href):
+                results.append(self.make_result(title, price, href, category, leasing_period))
+
+        return results, links
+
+    def make_result(self, title: str, price: str, url: str, category: str,
+                    leasing_period: Optional[str]) -> Dict:
+        """Запись о найденном товаре"""
+        return {
+            'site': self.site_name,
+            'title': title[:500],  # Ограничиваем длину
+            'price': price,
+            'url': url,
+            'category': category,
+            'leasing_period': leasing_period,
+            'found_at': datetime.now().isoformat()
+        }
+
+    def collect_links(self, hrefs, page_url: str) -> List[Tuple[str, int]]:
+        """Ссылки для обхода каталога с приоритетами (при max_pages <= 1 - пусто)"""
+        links = []
+        if self.max_pages > 1:
+            for href in hrefs:
+                link = canonicalize_url(href, page_url)
+                priority = self.link_priority(link) if link is not None else None
+                if priority is not None:
+                    links.append((link, priority))
+        return links
+
+    @property
+    def leasing_text_re(self):
+        """Текстовые узлы, которые могут упоминать лизинг (с учетом leasing_keywords)"""
+        if not self.leasing_keywords:
+            return LEASING_TEXT_RE
+        keywords = '|'.join(re.escape(keyword) for keyword in self.leasing_keywords)
+        return re.compile(f"{LEASING_TEXT_RE.pattern}|{keywords}", re.I)
+
     def search_leasing_keywords(self, text: str) -> bool:
         """Проверяет наличие ключевых слов о лизинге с 0%"""
+        if MATCHER.has_zero_leasing(text):
+            return True
+        if not self.leasing_keywords:
+            return False
         text_lower = text.lower()
-        
-        # Ищем упоминание лизинга
-        has_leasing = any(keyword in text_lower for keyword in ['leasing', 'liising'])
-        
-        # Ищем 0% процент
-        has_zero_percent = any([
-            '0%' in text,
-            '0 protsenti' in text_lower,
-            'null protsenti' in text_lower,
-            re.search(r'\b0\s*%', text),
-            re.search(r'null\s*%', text_lower)
-        ])
-        
-        return has_leasing and has_zero_percent
+        return any(keyword in text_lower for keyword in self.leasing_keywords) and MATCHER.classify(text)['has_zero']
     
     def extract_leasing_period(self, text: str) -> Optional[str]:
         """Извлекает срок лизинга из текста. Особое внимание к 48 месяцам."""
-        text_lower = text.lower()
-        
-        # Паттерны для поиска срока лизинга
-        patterns = [
-            # 48 месяцев (приоритет)
-            (r'48\s*(месяц|kuud?|мес|месяцев|kuud)', '48 месяцев'),
-            (r'48\s*(мес\.|kuud\.)', '48 месяцев'),
-            # Другие сроки
-            (r'(\d+)\s*(месяц|kuud?|мес|месяцев|kuud)', None),  # Любое количество месяцев
-            (r'(\d+)\s*(мес\.|kuud\.)', None),
-        ]
-        
-        # Сначала проверяем на 48 месяцев (приоритет)
-        for pattern, period in patterns:
-            match = re.search(pattern, text_lower, re.IGNORECASE)
-            if match:
-                if period:
-                    return period
-                else:
-                    # Извлекаем число из паттерна
-                    numbers = re.findall(r'\d+', match.group(0))
-                    if numbers:
-                        months = numbers[0]
-                        return f"{months} месяцев"
-        
-        return None
+        return MATCHER.leasing_period(text)
     
+    def _request_timeout(self, url: str) -> Optional[float]:
+        """Таймаут запроса с учетом дедлайна сайта. None - время вышло."""
+        timeout = REQUEST_TIMEOUT
+        if self.deadline is not None:
+            remaining = self.deadline - time.monotonic()
+            if remaining <= 0:
+                logger.warning(f"Лимит времени для {self.site_name} исчерпан, пропускаем {url}")
+                return None
+            timeout = min(timeout, remaining)
+        return timeout
+
+    def _make_soup(self, response: Response) -> BeautifulSoup:
+        # lxml используется, только если установлен (см. select_backend)
+        with time_stage(self.site_name, 'parse'):
+            return BeautifulSoup(response.content, self.html_backend)
+
+    def _attempt_failed(self, url: str, attempt: int, response: Optional[Response] = None,
+                        error: Optional[Exception] = None) -> Optional[float]:
+        """
+        Учитывает неудачную попытку запроса.
+
+        Возвращает задержку перед повтором или None, если повторять не нужно:
+        ошибка постоянная (например, 404), попытки кончились или задержка
+        не укладывается в дедлайн сайта.
+        """
+        if response is not None:
+            message = f"HTTP {response.status_code}"
+            retryable = response.status_code in RETRYABLE_STATUSES
+            delay = retry_after(response.headers)
+        else:
+            message = str(error) or type(error).__name__
+            retryable = is_retryable_error(error)
+            delay = None
+        self.fetch_error = message
+
+        if not retryable:
+            # Сайт ответил (404 и т.п.) - он доступен; некорректный URL о сайте ничего не говорит
+            if response is not None:
+                self.breaker.record_success()
+            else:
+                self.breaker.release()
+            logger.error(f"Ошибка при получении страницы {url}: {message}")
+            return None
+
+        self.breaker.record_failure(message)
+        if attempt >= self.retries:
+            logger.error(f"Ошибка при получении страницы {url}: {message} (попыток: {attempt + 1})")
+            return None
+        if delay is None:
+            delay = backoff_delay(attempt)
+        if delay > RETRY_MAX_DELAY or (self.deadline is not None and time.monotonic() + delay >= self.deadline):
+            logger.error(f"Ошибка при получении страницы {url}: {message}, повтор через {delay:.1f} с "
+                         f"не укладывается в лимит времени")
+            return None
+        logger.warning(f"Ошибка при получении страницы {url}: {message}, повтор через {delay:.1f} с")
+        return delay
+
+    def _breaker_allows(self, url: str) -> bool:
+        if self.breaker.allow():
+            return True
+        self.fetch_error = "запросы к сайту приостановлены после серии ошибок"
+        logger.warning(f"{self.site_name}: предохранитель разомкнут, пропускаем {url}")
+        return False
+
+    def fetch(self, url: str) -> Optional[Response]:
+        """
+        Загружает страницу без разбора HTML.
+
+        Временные ошибки (соединение, таймаут, 429, 5xx) повторяются до retries
+        раз с задержкой из Retry-After или backoff_delay, пока хватает времени
+        до дедлайна сайта. Если предохранитель сайта разомкнут, запрос не выполняется.
+        """
+        for attempt in range(self.retries + 1):
+            # Ждем своей очереди к хосту, но не дольше дедлайна сайта
+            if not self.rate_limiter.acquire(url, self.deadline):
+                logger.warning(f"Лимит времени для {self.site_name} исчерпан, пропускаем {url}")
+                return None
+            timeout = self._request_timeout(url)
+            if timeout is None or not self._breaker_allows(url):
+                return None
+            try:
+                with time_stage(self.site_name, 'fetch'):
+                    response = self.transport.get(url, timeout=timeout)
+            except Exception as e:
+                delay = self._attempt_failed(url, attempt, error=e)
+            else:
+                if response.status_code < 400:
+                    self.breaker.record_success()
+                    return response
+                delay = self._attempt_failed(url, attempt, response=response)
+            if delay is None:
+                return None
+            time.sleep(delay)
+        return None
+
     def get_page(self, url: str) -> Optional[BeautifulSoup]:
         """Получает и парсит страницу"""
-        try:
-            response = self.session.get(url, timeout=10)
-            response.raise_for_status()
-            # Используем html.parser вместо lxml (не требует компиляции)
-            return BeautifulSoup(response.content, 'html.parser')
-        except Exception as e:
-            logger.error(f"Ошибка при получении страницы {url}: {e}")
-            return None
+        response = self.fetch(url)
+        return self._make_soup(response) if response is not None else None
 
+    async def get_page_async(self, url: str) -> Optional[BeautifulSoup]:
+        """Асинхронный вариант get_page (с теми же повторами и ограничением частоты, что и fetch)"""
+        for attempt in range(self.retries + 1):
+            # Ожидание очереди к хосту блокирует поток, поэтому выполняется вне цикла событий
+            if not await asyncio.to_thread(self.rate_limiter.acquire, url, self.deadline):
+                logger.warning(f"Лимит времени для {self.site_name} исчерпан, пропускаем {url}")
+                return None
+            timeout = self._request_timeout(url)
+            if timeout is None or not self._breaker_allows(url):
+                return None
+            try:
+                with time_stage(self.site_name, 'fetch'):
+                    response = await self.transport.aget(url, timeout=timeout)
+            except Exception as e:
+                delay = self._attempt_failed(url, attempt, error=e)
+            else:
+                if response.status_code < 400:
+                    self.breaker.record_success()
+                    return self._make_soup(response)
+                delay = self._attempt_failed(url, attempt, response=response)
+            if delay is None:
+                return None
+            await asyncio.sleep(delay)
+        return None
+
+    def get_pages(self, urls: List[str]) -> Dict[str, Optional[BeautifulSoup]]:
+        """Загружает несколько страниц одновременно. Возвращает {url: soup или None}"""
+        async def fetch_all():
+            return await asyncio.gather(*(self.get_page_async(url) for url in urls))
+
+        return dict(zip(urls, asyncio.run(fetch_all())))
+
+
+class SpecParser(LeasingParser):
+    """
+    Парсер сайта по описанию из sites.json (см. site_specs.py).
+
+    Настройки из описания заменяют значения LeasingParser по умолчанию. Если в
+    описании задан селектор container, товары ищутся CSS-селекторами: карточки
+    выбираются одним запросом, а поля - внутри каждой карточки.
+    """
+
+    # Имя сайта в sites.json у подклассов с собственным классом
+    spec_name: Optional[str] = None
+
+    def __init__(self, spec: SiteSpec, transport: Optional[Transport] = None,
+                 html_backend: Optional[str] = None):
+        super().__init__(spec.name, spec.base_url, transport, html_backend)
+        self.spec = spec
+        for field in ('container_tags', 'title_tags', 'title_from_link', 'product_url_pattern'):
+            value = getattr(spec, field)
+            if value is not None:
+                setattr(self, field, value)
+        self.follow_links = LeasingParser.follow_links + spec.follow_links
+        self.leasing_keywords = spec.leasing_keywords
+
+    def extract_page(self, soup: BeautifulSoup, page_url: Optional[str] = None,
+                     product_page: bool = False) -> Tuple[List[Dict], List[Tuple[str, int]]]:
+        if 'container' not in self.spec.selectors:
+            return super().extract_page(soup, page_url, product_page)
+
+        page_url = page_url or self.page_url
+        links = self.collect_links(
+            (tag.get('href') for tag in self.spec.selector('link').select(soup)) if self.max_pages > 1 else (),
+            page_url,
+        )
+        category = urlsplit(page_url).path or '/'
+        title_selector = self.spec.selector('title')
+        price_selector = self.spec.selector('price')
+        period_selector = self.spec.selector('period')
 
-class RDEParser(LeasingParser):
-    """Парсер для rde.ee"""
-    
-    def __init__(self):
-        super().__init__("RDE", "https://www.rde.ee")
-    
-    def parse(self) -> List[Dict]:
-        """Парсит rde.ee на наличие лизинга с 0%"""
         results = []
-        
-        # Парсим главную страницу
-        url = f"{self.base_url}/"
-        soup = self.get_page(url)
-        
-        if not soup:
-            logger.warning(f"Не удалось загрузить главную страницу {self.base_url}")
-            return results
-        
-        # Ищем все ссылки на странице, которые могут вести к товарам
-        all_links = soup.find_all('a', href=True)
-        product_links = []
-        
-        for link in all_links:
-            href = link.get('href', '')
-            link_text = link.get_text(strip=True).lower()
-            
-            # Ищем ссылки, которые могут быть товарами
-            if any(keyword in link_text for keyword in ['leasing', 'liising', '0%', '0 protsenti']):
-                if href.startswith('/') or self.base_url in href:
-                    if not href.startswith('http'):
-                        href = self.base_url + href
-                    product_links.append((href, link_text))
-        
-        # Также ищем упоминания лизинга в тексте страницы
-        page_text = soup.get_text()
-        if self.search_leasing_keywords(page_text):
-            # Ищем ближайшие ссылки к тексту о лизинге
-            leasing_elements = soup.find_all(string=re.compile(r'leasing|liising|0\s*%', re.I))
-            
-            for elem in leasing_elements:
-                # Ищем родительский элемент с ссылкой
-                parent = elem.find_parent(['div', 'article', 'section', 'li'])
-                if parent:
-                    link_elem = parent.find('a', href=True)
-                    if link_elem:
-                        href = link_elem.get('href', '').strip()
-                        
-                        # Пропускаем невалидные ссылки
-                        if not href or href == '#' or href.startswith('javascript:') or href.startswith('mailto:'):
-                            continue
-                        
-                        # Нормализуем URL
-                        if href.startswith('/'):
-                            href = self.base_url + href
-                        elif not href.startswith('http'):
-                            href = self.base_url + '/' + href.lstrip('/')
-                        
-                        # Извлекаем информацию о товаре
-                        title_elem = parent.find(['h1', 'h2', 'h3', 'h4', 'a'])
-                        title = title_elem.get_text(strip=True) if title_elem else "Товар с лизингом 0%"
-                        
-                        # Если название слишком короткое, берем текст ссылки
-                        if len(title) < 10:
-                            title = link_elem.get_text(strip=True) or title
-                        
-                        price_elem = parent.find(['span', 'div'], class_=re.compile(r'price|hind', re.I))
-                        price = price_elem.get_text(strip=True) if price_elem else "Цена не указана"
-                        
-                        # Извлекаем срок лизинга
-                        parent_text = parent.get_text()
-                        leasing_period = self.extract_leasing_period(parent_text)
-                        
-                        # Проверяем, что это новый товар
-                        if not any(r['url'] == href for r in results):
-                            results.append({
-                                'site': self.site_name,
-                                'title': title[:500],  # Ограничиваем длину
-                                'price': price,
-                                'url': href,
-                                'category': '/',
-                                'leasing_period': leasing_period,
-                                'found_at': datetime.now().isoformat()
-                            })
-        
-        logger.info(f"RDE: найдено {len(results)} товаров с лизингом 0%")
-        return results
+        seen_urls = DedupIndex()
+        for container in self.spec.selector('container').select(soup):
+            text = container.get_text()
+            if not self.search_leasing_keywords(text):
+                continue
+
+            if container.name == 'a' and container.get('href') is not None:
+                link = container
+            else:
+                link = self.spec.selector('link').select_one(container)
+            if link is not None:
+                href = canonicalize_url(link.get('href'), page_url)
+            elif product_page:
+                href = page_url
+            else:
+                continue
+            if href is None:
+                continue
+
+            title_tag = title_selector.select_one(container)
+            if title_tag is None and product_page:
+                title_tag = title_selector.select_one(soup)
+            title = title_tag.get_text(strip=True) if title_tag is not None else ''
+            if len(title) < 10 and link is not None and self.title_from_link:
+                title = link.get_text(strip=True) or title
+            title = title or "Товар с лизингом 0%"
+
+            price_tag = price_selector.select_one(container)
+            price = price_tag.get_text(strip=True) if price_tag is not None else "Цена не указана"
+
+            period_tag = period_selector.select_one(container) if period_selector else None
+            leasing_period = self.extract_leasing_period(period_tag.get_text() if period_tag is not None else text)
+
+            if seen_urls.add(href):
+                results.append(self.make_result(title, price, href, category, leasing_period))
 
+        return results, links
 
-class KlickParser(LeasingParser):
+
+class RDEParser(SpecParser):
+    """Парсер для rde.ee"""
+
+    spec_name = "RDE"
+
+    def __init__(self, transport: Optional[Transport] = None, html_backend: Optional[str] = None,
+                 spec: Optional[SiteSpec] = None):
+        super().__init__(spec or get_spec(self.spec_name), transport, html_backend)
+
+
+class KlickParser(SpecParser):
     """Парсер для klick.ee"""
-    
-    def __init__(self):
-        super().__init__("Klick", "https://www.klick.ee")
-    
-    def parse(self) -> List[Dict]:
-        """Парсит klick.ee на наличие лизинга с 0%"""
-        results = []
-        
-        # Парсим главную страницу
-        url = f"{self.base_url}/"
-        soup = self.get_page(url)
-        
-        if not soup:
-            logger.warning(f"Не удалось загрузить главную страницу {self.base_url}")
-            return results
-        
-        # Ищем упоминания лизинга в тексте страницы
-        page_text = soup.get_text()
-        if self.search_leasing_keywords(page_text):
-            # Ищем элементы с упоминанием лизинга
-            leasing_elements = soup.find_all(string=re.compile(r'leasing|liising|0\s*%', re.I))
-            
-            for elem in leasing_elements:
-                parent = elem.find_parent(['div', 'article', 'section', 'li', 'a'])
-                if parent:
-                    link_elem = parent.find('a', href=True) if parent.name != 'a' else parent
-                    if link_elem and link_elem.get('href'):
-                        href = link_elem.get('href', '').strip()
-                        
-                        # Пропускаем невалидные ссылки
-                        if not href or href == '#' or href.startswith('javascript:') or href.startswith('mailto:'):
-                            continue
-                        
-                        # Нормализуем URL
-                        if href.startswith('/'):
-                            href = self.base_url + href
-                        elif not href.startswith('http'):
-                            href = self.base_url + '/' + href.lstrip('/')
-                        
-                        title_elem = parent.find(['h1', 'h2', 'h3', 'h4']) or link_elem
-                        title = title_elem.get_text(strip=True) if title_elem else "Товар с лизингом 0%"
-                        
-                        if len(title) < 10:
-                            title = link_elem.get_text(strip=True) or title
-                        
-                        price_elem = parent.find(['span', 'div'], class_=re.compile(r'price|hind', re.I))
-                        price = price_elem.get_text(strip=True) if price_elem else "Цена не указана"
-                        
-                        parent_text = parent.get_text()
-                        leasing_period = self.extract_leasing_period(parent_text)
-                        
-                        if not any(r['url'] == href for r in results):
-                            results.append({
-                                'site': self.site_name,
-                                'title': title[:500],
-                                'price': price,
-                                'url': href,
-                                'category': '/',
-                                'leasing_period': leasing_period,
-                                'found_at': datetime.now().isoformat()
-                            })
-        
-        logger.info(f"Klick: найдено {len(results)} товаров с лизингом 0%")
-        return results
+
+    spec_name = "Klick"
+
+    def __init__(self, transport: Optional[Transport] = None, html_backend: Optional[str] = None,
+                 spec: Optional[SiteSpec] = None):
+        super().__init__(spec or get_spec(self.spec_name), transport, html_backend)
 
 
-class ArvutitarkParser(LeasingParser):
+class ArvutitarkParser(SpecParser):
     """Парсер для arvutitark.ee"""
-    
-    def __init__(self):
-        super().__init__("Arvutitark", "https://www.arvutitark.ee")
-    
-    def parse(self) -> List[Dict]:
-        """Парсит arvutitark.ee на наличие лизинга с 0%"""
-        results = []
-        
-        # Парсим главную страницу
-        url = f"{self.base_url}/"
-        soup = self.get_page(url)
-        
-        if not soup:
-            logger.warning(f"Не удалось загрузить главную страницу {self.base_url}")
-            return results
-        
-        # Ищем упоминания лизинга в тексте страницы
-        page_text = soup.get_text()
-        if self.search_leasing_keywords(page_text):
-            # Ищем элементы с упоминанием лизинга
-            leasing_elements = soup.find_all(string=re.compile(r'leasing|liising|0\s*%', re.I))
-            
-            for elem in leasing_elements:
-                parent = elem.find_parent(['div', 'article', 'section', 'li', 'a'])
-                if parent:
-                    link_elem = parent.find('a', href=True) if parent.name != 'a' else parent
-                    if link_elem and link_elem.get('href'):
-                        href = link_elem.get('href', '').strip()
-                        
-                        # Пропускаем невалидные ссылки
-                        if not href or href == '#' or href.startswith('javascript:') or href.startswith('mailto:'):
-                            continue
-                        
-                        # Нормализуем URL
-                        if href.startswith('/'):
-                            href = self.base_url + href
-                        elif not href.startswith('http'):
-                            href = self.base_url + '/' + href.lstrip('/')
-                        
-                        title_elem = parent.find(['h1', 'h2', 'h3', 'h4']) or link_elem
-                        title = title_elem.get_text(strip=True) if title_elem else "Товар с лизингом 0%"
-                        
-                        if len(title) < 10:
-                            title = link_elem.get_text(strip=True) or title
-                        
-                        price_elem = parent.find(['span', 'div'], class_=re.compile(r'price|hind', re.I))
-                        price = price_elem.get_text(strip=True) if price_elem else "Цена не указана"
-                        
-                        parent_text = parent.get_text()
-                        leasing_period = self.extract_leasing_period(parent_text)
-                        
-                        if not any(r['url'] == href for r in results):
-                            results.append({
-                                'site': self.site_name,
-                                'title': title[:500],
-                                'price': price,
-                                'url': href,
-                                'category': '/',
-                                'leasing_period': leasing_period,
-                                'found_at': datetime.now().isoformat()
-                            })
-        
-        logger.info(f"Arvutitark: найдено {len(results)} товаров с лизингом 0%")
-        return results
 
+    spec_name = "Arvutitark"
 
-def run_all_parsers() -> List[Dict]:
-    """Запускает все парсеры и возвращает объединенные результаты"""
-    parsers = [
-        RDEParser(),
-        KlickParser(),
-        ArvutitarkParser()
-    ]
-    
+    def __init__(self, transport: Optional[Transport] = None, html_backend: Optional[str] = None,
+                 spec: Optional[SiteSpec] = None):
+        super().__init__(spec or get_spec(self.spec_name), transport, html_backend)
+
+
+PARSER_CLASSES = [RDEParser, KlickParser, ArvutitarkParser]
+
+
+def build_parsers(path: str = SITE_SPECS_PATH) -> List[LeasingParser]:
+    """
+    Парсеры всех сайтов из sites.json (path) в порядке файла.
+
+    Для сайтов с собственным классом (PARSER_CLASSES) создается он, для
+    остальных - SpecParser. Оба получают описание именно из этого файла.
+    """
+    classes = {parser_class.spec_name: parser_class for parser_class in PARSER_CLASSES}
+    return [classes[spec.name](spec=spec) if spec.name in classes else SpecParser(spec) for spec in load_specs(path)]
+
+
+def _run_parser(parser: LeasingParser, site_timeout: float, started: Dict,
+                progress: Optional[Callable[[str, Dict], None]] = None) -> List[Dict]:
+    """Запускает один парсер с учетом лимита времени на сайт"""
+    started[parser.site_name] = time.monotonic()
+    parser.deadline = started[parser.site_name] + site_timeout
+    if progress is not None:
+        progress(parser.site_name, {'status': 'running', 'count': 0, 'duration': None, 'error': None})
+    return parser.parse()
+
+
+def run_parsers(max_workers: Optional[int] = None,
+                site_timeout: Optional[float] = None,
+                page_hashes: Optional[Dict[str, str]] = None,
+                crawled_since: Optional[Dict[str, datetime]] = None,
+                progress: Optional[Callable[[str, Dict], None]] = None) -> Dict:
+    """
+    Запускает все парсеры параллельно и возвращает результаты вместе со статусом сайтов.
+
+    Каждому сайту отводится не более site_timeout секунд с момента старта его парсера.
+    Сайт, не уложившийся в лимит, получает статус 'timeout', а результаты остальных
+    сайтов возвращаются как обычно. page_hashes (адрес страницы -> хэш с прошлого
+    запуска, см. Database.get_page_hashes) позволяет пропустить извлечение на
+    неизменившихся страницах: такие сайты получают статус 'unchanged'. crawled_since
+    (сайт -> начало прошлого успешного запуска, см. Database.get_last_crawl_times)
+    позволяет при обходе по картам сайта загружать только изменившиеся страницы.
+    progress(site_name, site) вызывается при старте каждого сайта (статус
+    'pending', затем 'running') и при его завершении (итоговый статус).
+    Сайт, каталог которого обойден не полностью (см. parse_catalog), получает
+    статус 'partial': его товары сохраняются, но пропавшими не считаются.
+    Формат ответа:
+    {'results': [...], 'sites': {site_name: {'status', 'count', 'duration', 'error'}},
+     'pages': {site_name: {'url', 'hash'}}, 'listed': {site_name: [url, ...]}}
+    """
+    max_workers = max_workers or MAX_WORKERS
+    site_timeout = site_timeout or SITE_TIMEOUT
+    page_hashes = page_hashes or {}
+    crawled_since = crawled_since or {}
+
+    parsers = build_parsers()
+    parsers_by_name = {parser.site_name: parser for parser in parsers}
+    # Один индекс на весь запуск: товар попадает в результаты один раз
+    dedup = DedupIndex()
+    for parser in parsers:
+        parser.dedup = dedup
+        parser.known_hash = page_hashes.get(parser.page_url)
+        parser.since = crawled_since.get(parser.site_name)
+    started = {}
+    sites = {}
+
+    def finish_site(site_name: str, site: Dict):
+        sites[site_name] = site
+        if progress is not None:
+            progress(site_name, site)
+
+    if progress is not None:
+        for parser in parsers:
+            progress(parser.site_name, {'status': 'pending', 'count': 0, 'duration': None, 'error': None})
+    results_by_site = {}
+
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='parser')
+    futures = {
+        executor.submit(_run_parser, parser, site_timeout, started, progress): parser.site_name
+        for parser in parsers
+    }
+    pending = set(futures)
+
+    try:
+        while pending:
+            # Ждем до ближайшего дедлайна среди уже запущенных парсеров
+            now = time.monotonic()
+            deadlines = [started[futures[f]] + site_timeout for f in pending if futures[f] in started]
+            timeout = max(0.0, min(deadlines) - now) if deadlines else 0.1
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+            now = time.monotonic()
+            for future in done:
+                site_name = futures[future]
+                duration = round(now - started.get(site_name, now), 3)
+                try:
+                    results_by_site[site_name] = future.result()
+                    parser = parsers_by_name[site_name]
+                    if parser.error:
+                        # Страница не загрузилась: сайт не пуст, а не проверен
+                        finish_site(site_name, {'status': 'error', 'count': 0,
+                                                'duration': duration, 'error': parser.error})
+                        continue
+                    status = 'unchanged' if parser.unchanged else 'partial' if parser.incomplete else 'ok'
+                    finish_site(site_name, {'status': status, 'count': len(results_by_site[site_name]),
+                                            'duration': duration, 'error': parser.incomplete})
+                except Exception as e:
+                    logger.error(f"Ошибка при парсинге {site_name}: {e}")
+                    finish_site(site_name, {'status': 'error', 'count': 0,
+                                            'duration': duration, 'error': str(e)})
+
+            for future in list(pending):
+                site_name = futures[future]
+                if site_name in started and now - started[site_name] >= site_timeout:
+                    logger.error(f"Парсинг {site_name} превысил лимит {site_timeout} с")
+                    pending.discard(future)
+                    finish_site(site_name, {'status': 'timeout', 'count': 0,
+                                            'duration': round(now - started[site_name], 3),
+                                            'error': f'Превышен лимит времени {site_timeout} с'})
+    finally:
+        # Не ждем зависшие потоки: их запросы ограничены дедлайном парсера
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    # Сохраняем порядок сайтов независимо от порядка завершения
     all_results = []
     for parser in parsers:
-        try:
-            results = parser.parse()
-            all_results.extend(results)
-        except Exception as e:
-            logger.error(f"Ошибка при парсинге {parser.site_name}: {e}")
-    
-    return all_results
+        all_results.extend(results_by_site.get(parser.site_name, []))
+
+    return {
+        'results': all_results,
+        'sites': {parser.site_name: sites[parser.site_name] for parser in parsers},
+        # Хэши загруженных страниц успешно обработанных сайтов (для следующего запуска)
+        'pages': {
+            parser.site_name: {'url': parser.page_url, 'hash': parser.page_hash}
+            for parser in parsers
+            if parser.page_hash and sites[parser.site_name]['status'] in ('ok', 'unchanged')
+        },
+        # Страницы товаров из карт сайта, не загружавшиеся в этом запуске (см. parse_catalog)
+        'listed': {
+            parser.site_name: sorted(parser.listed_urls)
+            for parser in parsers
+            if parser.listed_urls and sites[parser.site_name]['status'] in ('ok', 'partial')
+        },
+    }
+
+
+def run_all_parsers() -> List[Dict]:
+    """Запускает все парсеры и возвращает объединенные результаты"""
+    return run_parsers()['results']
 
 
 if __name__ == "__main__":
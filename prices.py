@@ -0,0 +1,70 @@
+"""
+Разбор цен из текста карточек товаров ("1 299,00 €", "€1,299.00", "899,-")
+"""
+import re
+from typing import Optional, Tuple
+
+# Число с разделителями разрядов (пробел, неразрывный пробел, точка, запятая, апостроф)
+# и дробной частью из 1-2 цифр. После первой группы разрядов идут только группы из
+# трех цифр, поэтому соседние числа ("Tootekood 4719512345678 1299 €") не склеиваются.
+NUMBER_RE = re.compile(
+    r"\d{1,3}(?:[\s  .,']\d{3})+(?!\d)(?:[.,]\d{1,2}(?!\d))?"
+    r"|\d+(?:[.,]\d{1,2}(?!\d))?"
+)
+# Верхняя граница цены (евро): большие числа - коды товаров, а не цены, и центы
+# должны помещаться в целое SQLite. Та же граница у фильтров цены API.
+MAX_PRICE_EUR = 1_000_000_000
+CURRENCIES = (
+    ('EUR', ('€', 'eur')),
+    ('USD', ('$', 'usd')),
+    ('GBP', ('£', 'gbp')),
+)
+# В Эстонии цены указываются в евро
+DEFAULT_CURRENCY = 'EUR'
+
+
+def _to_cents(number: str) -> Optional[int]:
+    """Переводит число в формате ЕС или США в центы"""
+    number = re.sub(r"[\s  ']", '', number)
+    last_comma = number.rfind(',')
+    last_dot = number.rfind('.')
+    decimal_pos = max(last_comma, last_dot)
+
+    if decimal_pos != -1:
+        separator = number[decimal_pos]
+        fraction = number[decimal_pos + 1:]
+        # "1.299" или "1,299" - разделитель разрядов, а не десятичная часть
+        is_decimal = len(fraction) in (1, 2) and (
+            (last_comma != -1 and last_dot != -1) or number.count(separator) == 1
+        )
+        if is_decimal:
+            whole = re.sub(r'[.,]', '', number[:decimal_pos])
+            return int(whole or '0') * 100 + int(fraction.ljust(2, '0'))
+
+    digits = re.sub(r'[.,]', '', number)
+    return int(digits) * 100 if digits else None
+
+
+def parse_price(text: Optional[str]) -> Optional[Tuple[int, str]]:
+    """
+    Разбирает цену: "1 299,00 €" -> (129900, 'EUR').
+
+    Берется первое число в тексте не больше MAX_PRICE_EUR; валюта определяется
+    по символу или коду, по умолчанию EUR. Возвращает None, если в тексте нет цены.
+    """
+    if not text:
+        return None
+    for match in NUMBER_RE.finditer(text):
+        cents = _to_cents(match.group(0))
+        if cents is not None and cents <= MAX_PRICE_EUR * 100:
+            break
+    else:
+        return None
+
+    text_lower = text.lower()
+    currency = DEFAULT_CURRENCY
+    for code, markers in CURRENCIES:
+        if any(marker in text_lower for marker in markers):
+            currency = code
+            break
+    return cents, currency
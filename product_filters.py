@@ -0,0 +1,116 @@
+"""
+Разбор параметров фильтрации и постраничной выдачи товаров из query string API
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from typing import Dict, Optional, Tuple
+
+from prices import MAX_PRICE_EUR
+
+SORT_OPTIONS = ('found_at', 'price')
+# Размер страницы по умолчанию и максимальный размер страницы
+DEFAULT_PAGE_LIMIT = 100
+MAX_PAGE_LIMIT = 500
+# Верхняя граница фильтра цены (евро), та же, что у разобранных цен
+MAX_PRICE_ARG = Decimal(MAX_PRICE_EUR)
+
+
+def parse_price_arg(value: Optional[str], name: str) -> Optional[int]:
+    """Цена в евро ("199.99" или "199,99") -> центы"""
+    if value is None or value == '':
+        return None
+    try:
+        amount = Decimal(value.replace(',', '.'))
+    except InvalidOperation:
+        raise ValueError(f"Параметр {name} должен быть числом, получено: {value}")
+    # NaN и Infinity Decimal разбирает, но сравнить или перевести в центы их нельзя
+    if not amount.is_finite():
+        raise ValueError(f"Параметр {name} должен быть числом, получено: {value}")
+    if amount < 0:
+        raise ValueError(f"Параметр {name} не может быть отрицательным")
+    if amount > MAX_PRICE_ARG:
+        raise ValueError(f"Параметр {name} не может быть больше {MAX_PRICE_ARG}")
+    return int(amount * 100)
+
+
+def parse_product_filters(args) -> Dict:
+    """
+    Разбирает min_price, max_price (в евро) и sort из request.args.
+
+    Выбрасывает ValueError с понятным сообщением при неверных значениях.
+    """
+    sort = args.get('sort') or 'found_at'
+    if sort not in SORT_OPTIONS:
+        raise ValueError(f"Параметр sort должен быть одним из: {', '.join(SORT_OPTIONS)}")
+    return {
+        'min_price': parse_price_arg(args.get('min_price'), 'min_price'),
+        'max_price': parse_price_arg(args.get('max_price'), 'max_price'),
+        'sort': sort,
+    }
+
+
+def encode_cursor(sort: str, key, row_id: int) -> str:
+    """
+    Курсор следующей страницы: значение ключа сортировки и id последнего товара.
+
+    Непрозрачная для клиента строка (base64 от JSON).
+    """
+    if isinstance(key, datetime):
+        key = key.isoformat()
+    payload = json.dumps({'sort': sort, 'key': key, 'id': row_id}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token: str, sort: str) -> Tuple:
+    """Курсор -> (значение ключа сортировки, id). ValueError для чужого или испорченного курсора."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        key, row_id = payload['key'], int(payload['id'])
+        if payload['sort'] != sort:
+            raise ValueError
+        if sort == 'found_at':
+            key = datetime.fromisoformat(key)
+        else:
+            key = int(key)
+    except (ValueError, TypeError, KeyError, UnicodeError, binascii.Error):
+        raise ValueError("Неверный параметр cursor")
+    return key, row_id
+
+
+def parse_page_args(args) -> Dict:
+    """
+    Разбирает параметры постраничной выдачи: фильтры цены и sort (см. parse_product_filters),
+    limit, cursor, site, since (дата в ISO 8601), months и active=1 (только действующие).
+    """
+    page = parse_product_filters(args)
+
+    limit = args.get('limit') or DEFAULT_PAGE_LIMIT
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        raise ValueError(f"Параметр limit должен быть целым числом, получено: {limit}")
+    if not 1 <= limit <= MAX_PAGE_LIMIT:
+        raise ValueError(f"Параметр limit должен быть от 1 до {MAX_PAGE_LIMIT}")
+    page['limit'] = limit
+
+    since = args.get('since')
+    try:
+        page['since'] = datetime.fromisoformat(since) if since else None
+    except ValueError:
+        raise ValueError(f"Параметр since должен быть датой в формате ISO 8601, получено: {since}")
+
+    months = args.get('months')
+    try:
+        page['months'] = int(months) if months else None
+    except ValueError:
+        raise ValueError(f"Параметр months должен быть целым числом, получено: {months}")
+
+    page['site'] = args.get('site') or None
+    page['active'] = args.get('active') in ('1', 'true')
+    cursor = args.get('cursor')
+    page['cursor'] = decode_cursor(cursor, page['sort']) if cursor else None
+    return page
@@ -0,0 +1,154 @@
+"""
+Повторные запросы и защита от недоступных сайтов
+
+Временные ошибки (обрыв соединения, таймаут, 429, 5xx) повторяются с
+экспоненциальной задержкой со случайным разбросом; заголовок Retry-After
+имеет приоритет. Для каждого сайта ведется предохранитель (circuit breaker):
+после нескольких неудач подряд запросы к сайту не выполняются, пока не
+пройдет пауза, поэтому недоступный магазин не тратит таймаут на каждую страницу.
+"""
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+# Сколько раз повторяется запрос после временной ошибки
+RETRIES = int(os.environ.get('PARSER_RETRIES', '2'))
+# Базовая и максимальная задержка перед повтором (секунды)
+RETRY_BACKOFF = float(os.environ.get('PARSER_RETRY_BACKOFF', '0.5'))
+RETRY_MAX_DELAY = float(os.environ.get('PARSER_RETRY_MAX_DELAY', '30'))
+# Сколько неудач подряд размыкают предохранитель сайта и на сколько секунд
+BREAKER_THRESHOLD = int(os.environ.get('PARSER_BREAKER_THRESHOLD', '5'))
+BREAKER_COOLDOWN = float(os.environ.get('PARSER_BREAKER_COOLDOWN', '300'))
+
+# Ответы, после которых запрос имеет смысл повторить
+RETRYABLE_STATUSES = frozenset({408, 425, 429, 500, 502, 503, 504})
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """
+    Временная ли ошибка запроса.
+
+    Ошибки соединения и таймауты requests - подклассы OSError; некорректный
+    URL (MissingSchema, InvalidURL) - еще и ValueError, его повторять бесполезно.
+    """
+    return isinstance(error, OSError) and not isinstance(error, ValueError)
+
+
+def retry_after(headers) -> Optional[float]:
+    """Задержка из заголовка Retry-After (секунды или HTTP-дата) или None"""
+    value = (headers or {}).get('Retry-After')
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        moment = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return max(0.0, (moment - datetime.now(timezone.utc)).total_seconds())
+
+
+def backoff_delay(attempt: int, base: float = RETRY_BACKOFF, max_delay: float = RETRY_MAX_DELAY) -> float:
+    """Задержка перед повтором номер attempt (с 0): случайная от 0 до base * 2^attempt"""
+    return random.uniform(0, min(max_delay, base * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """
+    Предохранитель одного сайта.
+
+    closed - запросы идут; после threshold неудач подряд - open: запросы не
+    выполняются cooldown секунд. Затем half_open: пропускается один пробный
+    запрос, его успех замыкает предохранитель, неудача снова размыкает.
+    Потокобезопасен.
+    """
+
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, cooldown: float = BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._probe = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at < self.cooldown:
+            return 'open'
+        return 'half_open'
+
+    def allow(self) -> bool:
+        """Можно ли выполнить запрос сейчас"""
+        if self.threshold <= 0:
+            return True
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self._probe:
+                self._probe = True
+                return True
+            return False
+
+    def release(self):
+        """Пробный запрос не выполнен или ничего не говорит о доступности сайта"""
+        with self._lock:
+            self._probe = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probe = False
+
+    def record_failure(self, error: Optional[str] = None):
+        with self._lock:
+            self.failures += 1
+            self.last_error = error
+            if self._probe or (self.threshold > 0 and self.failures >= self.threshold):
+                self.opened_at = time.monotonic()
+            self._probe = False
+
+    def to_dict(self) -> Dict:
+        state = self.state
+        retry_in = None
+        if state == 'open':
+            retry_in = round(self.cooldown - (time.monotonic() - self.opened_at), 1)
+        return {'state': state, 'failures': self.failures, 'retry_in': retry_in, 'last_error': self.last_error}
+
+
+class BreakerRegistry:
+    """Предохранители по сайтам; живут весь процесс, между запусками парсинга"""
+
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, cooldown: float = BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, site_name: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(site_name)
+            if breaker is None:
+                breaker = self._breakers[site_name] = CircuitBreaker(self.threshold, self.cooldown)
+            return breaker
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Состояние всех предохранителей (для /api/health)"""
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {site_name: breaker.to_dict() for site_name, breaker in sorted(breakers.items())}
+
+
+# Общие предохранители всех парсеров
+BREAKERS = BreakerRegistry()
@@ -0,0 +1,185 @@
+"""
+Кэш ответов Flask, привязанный к поколению данных в базе
+
+Данные меняются только при добавлении товаров (Database.add_products увеличивает
+счетчик поколений), поэтому между запусками парсинга ответы на чтение можно
+отдавать из памяти. Каждый ответ получает сильный ETag, а повторный запрос
+с If-None-Match получает 304 без тела.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Callable, Optional
+
+from flask import Response, make_response, request
+
+logger = logging.getLogger(__name__)
+
+# Ограничение памяти под закэшированные ответы; 0 отключает кэш
+RESPONSE_CACHE_MAX_SIZE = int(float(os.environ.get('RESPONSE_CACHE_MAX_MB', '16')) * 1024 * 1024)
+# Сколько отрисованных фрагментов шаблонов хранится в памяти
+FRAGMENT_CACHE_MAX_ENTRIES = int(os.environ.get('FRAGMENT_CACHE_MAX_ENTRIES', '64'))
+
+
+class CachedResponse:
+    """Тело ответа с заголовками, нужными для повторной отдачи"""
+
+    __slots__ = ('body', 'mimetype', 'etag', 'created_at')
+
+    def __init__(self, body: bytes, mimetype: str, etag: str):
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = etag
+        self.created_at = time.monotonic()
+
+
+class ResponseCache:
+    """
+    LRU-кэш ответов с ограничением по суммарному размеру тел.
+
+    Кэш хранит ответы одного поколения данных: при появлении нового
+    поколения все старые записи удаляются.
+    """
+
+    def __init__(self, max_size: int = RESPONSE_CACHE_MAX_SIZE):
+        self.max_size = max_size
+        self.generation = None
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _sync_generation(self, generation: int):
+        if generation != self.generation:
+            self._entries.clear()
+            self.size = 0
+            self.generation = generation
+
+    def get(self, key, generation: int, ttl: Optional[float] = None) -> Optional[CachedResponse]:
+        with self._lock:
+            self._sync_generation(generation)
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if ttl is not None and time.monotonic() - entry.created_at > ttl:
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, generation: int, entry: CachedResponse):
+        size = len(entry.body)
+        if size > self.max_size:
+            return
+        with self._lock:
+            self._sync_generation(generation)
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self.size += size
+            # Вытесняем давно не запрашивавшиеся ответы
+            while self.size > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        self.size -= len(self._entries.pop(key).body)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+            self.generation = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class FragmentCache:
+    """
+    LRU-кэш отрисованных фрагментов шаблонов.
+
+    Ключ должен включать версию данных фрагмента, тогда устаревшие фрагменты
+    не выдаются и со временем вытесняются.
+    """
+
+    def __init__(self, max_entries: int = FRAGMENT_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key) -> Optional[str]:
+        with self._lock:
+            fragment = self._entries.get(key)
+            if fragment is not None:
+                self._entries.move_to_end(key)
+            return fragment
+
+    def put(self, key, fragment: str):
+        if not self.max_entries:
+            return
+        with self._lock:
+            self._entries[key] = fragment
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Общие кэши приложения
+RESPONSE_CACHE = ResponseCache()
+FRAGMENT_CACHE = FragmentCache()
+
+
+def _conditional(entry: CachedResponse) -> Response:
+    """Ответ из кэша или 304, если у клиента уже есть эта версия"""
+    if request.if_none_match.contains(entry.etag):
+        response = Response(status=304)
+    else:
+        response = Response(entry.body, mimetype=entry.mimetype)
+    response.set_etag(entry.etag)
+    # Клиент может хранить ответ, но обязан перепроверять его по ETag
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def cached_response(get_generation: Callable[[], int], ttl: Optional[float] = None,
+                    cache: ResponseCache = RESPONSE_CACHE):
+    """
+    Декоратор view-функции: кэширует успешные ответы до смены поколения данных.
+
+    Ключ кэша - путь и параметры запроса. ttl (в секундах) ограничивает время жизни
+    ответов, которые устаревают и без изменения данных (например, "за последние
+    24 часа"). Если поколение получить не удалось, запрос обрабатывается без кэша.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not cache.max_size:
+                return view(*args, **kwargs)
+            try:
+                generation = get_generation()
+            except Exception as e:
+                logger.warning(f"Кэш ответов недоступен: {e}")
+                return view(*args, **kwargs)
+
+            key = (request.path, tuple(sorted(request.args.items(multi=True))))
+            entry = cache.get(key, generation, ttl)
+            if entry is None:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.is_streamed:
+                    return response
+                body = response.get_data()
+                entry = CachedResponse(body, response.mimetype, hashlib.sha256(body).hexdigest()[:32])
+                cache.put(key, generation, entry)
+            return _conditional(entry)
+        return wrapper
+    return decorator
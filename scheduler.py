@@ -4,27 +4,57 @@
 import schedule
 import time
 import threading
-from parser import run_all_parsers
 from database import Database
+from jobs import CRAWL_JOBS, run_crawl
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+# База и ее движок создаются один раз на процесс: запуски по расписанию берут
+# соединения из общего пула, а не открывают новый движок при каждом парсинге
+_db = None
+_db_lock = threading.Lock()
+
+
+def get_db():
+    """Получает общий экземпляр базы данных планировщика"""
+    global _db
+    if _db is None:
+        with _db_lock:
+            if _db is None:
+                _db = Database()
+    return _db
+
+
 def run_parsing_job():
     """Задача парсинга, которая выполняется по расписанию"""
     logger.info("Запуск запланированного парсинга...")
-    db = Database()
+    db = get_db()
     
     try:
-        results = run_all_parsers()
-        added = db.add_products(results)
-        logger.info(f"Парсинг завершен. Найдено: {len(results)}, Добавлено новых: {added}")
+        # Через общую очередь: если парсинг уже запущен вручную, ждем его, а не запускаем второй
+        job, created = CRAWL_JOBS.submit(lambda progress: run_crawl(db, progress), trigger='schedule')
+        if not created:
+            logger.info(f"Парсинг уже выполняется (задача {job.id}), ожидаем его завершения")
+        job.wait()
+        if job.status == 'error':
+            logger.error(f"Ошибка при выполнении парсинга: {job.error}")
+            return
+        crawl = job.result
+        if crawl.get('skipped'):
+            logger.info(crawl['message'])
+            return
+        logger.info(f"Парсинг завершен. Найдено: {crawl['found']}, Добавлено новых: {crawl['added']}, "
+                    f"Пропало с сайтов: {crawl['disappeared']}")
+        for site_name, site in crawl['sites'].items():
+            if site['status'] not in ('ok', 'unchanged'):
+                logger.warning(f"{site_name}: {site['status']} ({site['error']})")
     except Exception as e:
         logger.error(f"Ошибка при выполнении парсинга: {e}")
     finally:
-        db.close()
+        db.remove_session()
 
 
 def start_scheduler():
@@ -0,0 +1,107 @@
+"""
+Описания сайтов для парсера (sites.json)
+
+Каждый магазин описывается записью в sites.json: адрес, настройки извлечения и,
+при желании, CSS-селекторы карточки товара и ее полей. Файл читается один раз,
+регулярные выражения и селекторы компилируются при загрузке, поэтому новый
+магазин добавляется без изменения кода. Формат записи:
+
+    name, base_url          - обязательные поля
+    container_tags          - теги карточки товара (поиск по упоминаниям лизинга)
+    title_tags              - теги названия товара
+    title_from_link         - брать название из ссылки, если нет заголовка
+    follow_links            - [[регулярное выражение, приоритет], ...] в дополнение
+                              к общим правилам обхода каталога
+    product_url_pattern     - регулярное выражение адресов товаров в карте сайта
+    leasing_keywords        - слова, которые на сайте означают лизинг ("järelmaks")
+    selectors               - CSS-селекторы: container (обязателен), title, price,
+                              link, period
+"""
+import hashlib
+import json
+import os
+import re
+from functools import lru_cache
+from typing import Dict, List
+
+import soupsieve
+
+SITE_SPECS_PATH = os.environ.get(
+    'PARSER_SITE_SPECS', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sites.json')
+)
+
+SPEC_FIELDS = ('name', 'base_url', 'container_tags', 'title_tags', 'title_from_link', 'follow_links',
+               'product_url_pattern', 'leasing_keywords', 'selectors')
+SELECTOR_FIELDS = ('container', 'title', 'price', 'link', 'period')
+# Селекторы полей карточки, если в описании сайта они не заданы
+DEFAULT_SELECTORS = {
+    'title': soupsieve.compile('h1, h2, h3, h4'),
+    'price': soupsieve.compile('span[class*=price], div[class*=price], span[class*=hind], div[class*=hind]'),
+    'link': soupsieve.compile('a[href]'),
+}
+
+
+class SiteSpec:
+    """
+    Проверенное и скомпилированное описание сайта.
+
+    Необязательные поля, не заданные в описании, равны None: парсер берет
+    для них значения по умолчанию из LeasingParser.
+    """
+
+    def __init__(self, data: Dict):
+        unknown = set(data) - set(SPEC_FIELDS)
+        if unknown:
+            raise ValueError(f"Неизвестные поля в описании сайта: {', '.join(sorted(unknown))}")
+        for field in ('name', 'base_url'):
+            if not data.get(field):
+                raise ValueError(f"В описании сайта не задано поле {field}")
+
+        self.name = data['name']
+        # Хэш описания: входит в версию логики извлечения парсера сайта
+        raw = json.dumps(data, sort_keys=True, ensure_ascii=False).encode('utf-8')
+        self.digest = hashlib.sha256(raw).hexdigest()[:16]
+        self.base_url = data['base_url'].rstrip('/')
+        self.container_tags = tuple(data['container_tags']) if 'container_tags' in data else None
+        self.title_tags = tuple(data['title_tags']) if 'title_tags' in data else None
+        self.title_from_link = data.get('title_from_link')
+        self.follow_links = tuple((re.compile(pattern), int(priority))
+                                  for pattern, priority in data.get('follow_links', ()))
+        pattern = data.get('product_url_pattern')
+        self.product_url_pattern = re.compile(pattern) if pattern else None
+        self.leasing_keywords = tuple(keyword.lower() for keyword in data.get('leasing_keywords', ()))
+
+        selectors = data.get('selectors', {})
+        unknown = set(selectors) - set(SELECTOR_FIELDS)
+        if unknown:
+            raise ValueError(f"{self.name}: неизвестные селекторы {', '.join(sorted(unknown))}")
+        if selectors and 'container' not in selectors:
+            raise ValueError(f"{self.name}: без селектора container остальные селекторы не применяются")
+        try:
+            self.selectors = {field: soupsieve.compile(css) for field, css in selectors.items()}
+        except soupsieve.SelectorSyntaxError as e:
+            raise ValueError(f"{self.name}: некорректный CSS-селектор: {e}") from e
+
+    def selector(self, field: str):
+        """Скомпилированный селектор поля карточки (из описания или по умолчанию)"""
+        return self.selectors.get(field) or DEFAULT_SELECTORS.get(field)
+
+
+@lru_cache(maxsize=None)
+def load_specs(path: str = SITE_SPECS_PATH) -> List[SiteSpec]:
+    """Описания всех сайтов в порядке файла (читаются один раз)"""
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    specs = [SiteSpec(site) for site in data['sites']]
+    names = [spec.name for spec in specs]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Повторяющиеся имена сайтов в {path}")
+    return specs
+
+
+def get_spec(name: str, path: str = SITE_SPECS_PATH) -> SiteSpec:
+    """Описание сайта по имени"""
+    for spec in load_specs(path):
+        if spec.name == name:
+            return spec
+    raise ValueError(f"Сайт {name} не описан в {path}")
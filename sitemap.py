@@ -0,0 +1,88 @@
+"""
+Поиск страниц товаров по robots.txt и картам сайта (sitemap)
+
+Карты сайта магазинов содержат десятки тысяч адресов и часто сжаты gzip, поэтому
+они разбираются потоково (iterparse): в памяти держится только текущая запись
+<url> или <sitemap>, а сжатие снимается по мере чтения.
+"""
+import gzip
+import io
+import os
+from datetime import datetime
+from typing import Iterator, List, Optional, Tuple
+from urllib.robotparser import RobotFileParser
+from xml.etree.ElementTree import iterparse
+
+# Включает поиск товаров по картам сайта при обходе каталога (PARSER_MAX_PAGES > 1)
+SITEMAPS_ENABLED = os.environ.get('PARSER_SITEMAPS', '0').lower() in ('1', 'true')
+# Ограничения на один сайт: сколько файлов карт читается и сколько адресов берется
+SITEMAP_MAX_FILES = int(os.environ.get('PARSER_SITEMAP_MAX_FILES', '100'))
+SITEMAP_MAX_URLS = int(os.environ.get('PARSER_SITEMAP_MAX_URLS', '50000'))
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+def parse_lastmod(text: Optional[str]) -> Optional[datetime]:
+    """
+    Разбирает lastmod в формате W3C ("2024-05-01", "2024-05-01T10:00:00+03:00").
+
+    Время с часовым поясом переводится в локальное без пояса, как даты в базе.
+    Возвращает None для пустого или некорректного значения.
+    """
+    if not text:
+        return None
+    try:
+        value = datetime.fromisoformat(text.strip())
+    except ValueError:
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return value
+
+
+def read_robots(text: str) -> Tuple[RobotFileParser, List[str]]:
+    """Правила robots.txt и перечисленные в нем карты сайта"""
+    robots = RobotFileParser()
+    robots.parse(text.splitlines())
+    return robots, robots.site_maps() or []
+
+
+def _local_name(tag: str) -> str:
+    # "{http://www.sitemaps.org/schemas/sitemap/0.9}loc" -> "loc"
+    return tag.rpartition('}')[2]
+
+
+def iter_sitemap(stream) -> Iterator[Tuple[str, str, Optional[datetime]]]:
+    """
+    Потоково разбирает карту сайта или индекс карт (в том числе сжатые gzip).
+
+    Возвращает записи (вид, адрес, lastmod): вид 'url' - страница,
+    'sitemap' - вложенная карта из индекса. Записи без <loc> пропускаются.
+    """
+    if not hasattr(stream, 'peek'):
+        stream = io.BufferedReader(stream)
+    if stream.peek(2)[:2] == GZIP_MAGIC:
+        stream = gzip.GzipFile(fileobj=stream)
+
+    root = None
+    depth = 0
+    loc = lastmod = None
+    for event, element in iterparse(stream, events=('start', 'end')):
+        if event == 'start':
+            depth += 1
+            if root is None:
+                root = element
+            continue
+        depth -= 1
+        name = _local_name(element.tag)
+        # Берем только поля самой записи: у вложенных <image:image> тоже есть <loc>
+        if depth == 2 and name == 'loc':
+            loc = (element.text or '').strip()
+        elif depth == 2 and name == 'lastmod':
+            lastmod = element.text
+        elif depth == 1 and name in ('url', 'sitemap'):
+            if loc:
+                yield name, loc, parse_lastmod(lastmod)
+            loc = lastmod = None
+            # Разобранные записи больше не нужны: память не растет с размером карты
+            root.clear()
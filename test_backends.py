@@ -0,0 +1,55 @@
+"""
+Проверка, что парсеры сайтов извлекают одинаковые товары на всех бэкендах разбора HTML
+"""
+import os
+
+import pytest
+from bs4 import BeautifulSoup
+
+from parser import ArvutitarkParser, KlickParser, RDEParser, available_backends, select_backend
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# Сохраненные страницы и товары, которые на них должны находиться
+SITE_FIXTURES = [
+    (RDEParser, 'rde.html', [
+        'https://www.rde.ee/et/p/lenovo-ideapad-5-14',
+        'https://www.rde.ee/et/p/apple-macbook-air-13-m2',
+        'https://www.rde.ee/et/p/sony-wh-1000xm5',
+    ]),
+    (KlickParser, 'klick.html', [
+        'https://www.klick.ee/kampaaniad/liising-0',
+        'https://www.klick.ee/samsung-galaxy-a55?color=blue',
+        'https://www.klick.ee/xiaomi-redmi-note-13',
+    ]),
+    (ArvutitarkParser, 'arvutitark.html', [
+        'https://www.arvutitark.ee/asus-rog-strix-g16',
+        'https://www.arvutitark.ee/dell-xps-13',
+        'https://www.arvutitark.ee/hp-pavilion-15',
+    ]),
+]
+
+
+def extract_products(parser_class, fixture: str, backend: str):
+    """Запускает извлечение на сохраненной странице, без меток времени"""
+    with open(os.path.join(FIXTURES_DIR, fixture), 'rb') as f:
+        content = f.read()
+    parser = parser_class(html_backend=backend)
+    results = parser.extract(BeautifulSoup(content, parser.html_backend))
+    return [{key: value for key, value in result.items() if key != 'found_at'} for result in results]
+
+
+@pytest.mark.parametrize('parser_class,fixture,expected_urls', SITE_FIXTURES)
+def test_same_products_on_every_backend(parser_class, fixture, expected_urls):
+    reference = extract_products(parser_class, fixture, 'html.parser')
+    assert [product['url'] for product in reference] == expected_urls
+
+    for backend in available_backends():
+        assert extract_products(parser_class, fixture, backend) == reference, backend
+
+
+def test_select_backend():
+    assert select_backend('auto') == available_backends()[0]
+    assert select_backend('html.parser') == 'html.parser'
+    with pytest.raises(ValueError):
+        select_backend('selectolax')
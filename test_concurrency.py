@@ -0,0 +1,83 @@
+"""
+Нагрузочный тест: запросы к API во время записи результатов парсинга
+"""
+import threading
+
+import parser
+import scheduler
+
+ROUNDS = 3
+PRODUCTS_PER_ROUND = 2000
+READERS = 6
+ENDPOINTS = ('/', '/api/products?limit=50', '/api/products/RDE', '/api/recent',
+             '/api/products/48months', '/api/export?format=csv')
+
+
+def fake_report(round_number):
+    results = [{
+        'site': ('RDE', 'Klick', 'Arvutitark')[i % 3],
+        'title': f'Товар {round_number}-{i}',
+        'url': f'https://example.ee/p/{round_number}/{i}',
+        'price': f'{i},00 €',
+        'leasing_period': '48 месяцев' if i % 4 == 0 else '24 месяцев',
+    } for i in range(PRODUCTS_PER_ROUND)]
+    sites = {name: {'status': 'ok'} for name in ('RDE', 'Klick', 'Arvutitark')}
+    return {'results': results, 'sites': sites, 'pages': {}}
+
+
+def test_api_serves_while_parsing_job_writes(web, monkeypatch):
+    rounds = iter(range(ROUNDS))
+    monkeypatch.setattr(parser, 'run_parsers', lambda **kwargs: fake_report(next(rounds)))
+    monkeypatch.setattr(scheduler, '_db', None)
+
+    writer_done = threading.Event()
+    failures = []
+    served = []
+
+    def writer():
+        try:
+            for _ in range(ROUNDS):
+                scheduler.run_parsing_job()
+        finally:
+            writer_done.set()
+
+    def reader():
+        client = web.app.test_client()
+        count = 0
+        while not writer_done.is_set() or count < len(ENDPOINTS):
+            path = ENDPOINTS[count % len(ENDPOINTS)]
+            try:
+                response = client.get(path)
+                if response.status_code != 200:
+                    failures.append((path, response.status_code, response.get_data(as_text=True)[:200]))
+            except Exception as e:
+                failures.append((path, repr(e)))
+            count += 1
+        served.append(count)
+
+    threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader) for _ in range(READERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=120)
+
+    assert not failures
+    assert len(served) == READERS
+    assert web.db.get_site_summary() and sum(
+        site['product_count'] for site in web.db.get_site_summary()
+    ) == ROUNDS * PRODUCTS_PER_ROUND
+    page = web.app.test_client().get('/api/products?limit=1').get_json()
+    assert page['products'][0]['title'].startswith(f'Товар {ROUNDS - 1}-')
+
+
+def test_parsing_jobs_share_one_database(web, monkeypatch):
+    monkeypatch.setattr(parser, 'run_parsers', lambda **kwargs: fake_report(0))
+    monkeypatch.setattr(scheduler, '_db', None)
+    created = []
+    monkeypatch.setattr(scheduler, 'Database', lambda: created.append(web.db) or web.db)
+
+    for _ in range(3):
+        scheduler.run_parsing_job()
+    # Движок базы создается один раз, а не при каждом запуске по расписанию
+    assert len(created) == 1
+    assert sum(site['product_count'] for site in web.db.get_site_summary()) == PRODUCTS_PER_ROUND
@@ -0,0 +1,126 @@
+"""
+Тесты блокировки парсинга между процессами
+"""
+import threading
+import time
+
+import pytest
+
+import parser
+import jobs
+from crawl_lock import CrawlLock, CrawlLockLost
+from database import Database
+from jobs import run_crawl
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'products.db')
+
+
+def fake_report(**kwargs):
+    return {'results': [], 'sites': {'RDE': {'status': 'ok', 'count': 0, 'duration': 0.1, 'error': None}},
+            'pages': {}}
+
+
+def test_second_process_is_skipped_until_release(db_path):
+    # Два экземпляра Database с одним файлом - как два процесса
+    first, second = CrawlLock(Database(db_path)), CrawlLock(Database(db_path))
+
+    assert first.acquire(mode='skip')
+    with first:
+        assert not second.acquire(mode='skip')
+        assert second.holder()['owner'] == first.owner
+    assert first.holder() is None
+    assert second.acquire(mode='skip')
+    second.release()
+
+
+def test_expired_lease_is_taken_over(db_path):
+    stale = CrawlLock(Database(db_path), ttl=0.2, heartbeat=0.1)
+    db = Database(db_path)
+    # Владелец "упал": аренда взята, но не продлевается
+    assert db.acquire_lock(stale.name, stale.owner, stale.ttl)
+
+    lock = CrawlLock(Database(db_path))
+    assert not lock.acquire(mode='skip')
+    time.sleep(0.3)
+    assert lock.acquire(mode='skip')
+    assert not db.renew_lock(stale.name, stale.owner, stale.ttl)
+    lock.release()
+
+
+def test_heartbeat_keeps_lease_alive(db_path):
+    lock = CrawlLock(Database(db_path), ttl=0.3, heartbeat=0.05)
+    other = CrawlLock(Database(db_path))
+    assert lock.acquire()
+    with lock:
+        time.sleep(0.6)
+        assert not other.acquire(mode='skip')
+        assert not lock.lost
+
+
+def test_wait_mode_gets_lock_after_release(db_path):
+    holder = CrawlLock(Database(db_path))
+    waiter = CrawlLock(Database(db_path))
+    assert holder.acquire()
+    threading.Timer(0.2, holder.release).start()
+
+    started = time.monotonic()
+    assert waiter.acquire(mode='wait', timeout=5, poll=0.05)
+    assert time.monotonic() - started >= 0.15
+    waiter.release()
+
+
+def test_invalid_settings(db_path):
+    with pytest.raises(ValueError, match='режим'):
+        CrawlLock(Database(db_path)).acquire(mode='queue')
+    with pytest.raises(ValueError, match='меньше'):
+        CrawlLock(Database(db_path), ttl=10, heartbeat=10)
+
+
+def test_run_crawl_skips_while_other_process_crawls(db_path, monkeypatch):
+    monkeypatch.setattr(parser, 'run_parsers', fake_report)
+    other = CrawlLock(Database(db_path))
+    assert other.acquire()
+
+    db = Database(db_path)
+    result = run_crawl(db)
+    assert result['skipped'] and result['run_id'] is None
+    assert result['lock']['owner'] == other.owner
+    assert db.get_crawl_runs() == []
+
+    other.release()
+    result = run_crawl(db)
+    assert not result.get('skipped')
+    assert result['sites']['RDE']['status'] == 'ok'
+    assert db.get_lock('crawl') is None
+
+
+def test_lost_lease_skips_the_write(db_path, monkeypatch):
+    db = Database(db_path)
+    locks = []
+
+    def short_lock(database):
+        lock = CrawlLock(database, ttl=1, heartbeat=0.05)
+        locks.append(lock)
+        return lock
+
+    def slow_report(**kwargs):
+        # Продление не удалось: аренду забрал другой процесс
+        deadline = time.monotonic() + 5
+        while not locks[0].lost and time.monotonic() < deadline:
+            time.sleep(0.01)
+        report = fake_report()
+        report['results'] = [{'site': 'RDE', 'title': 'Товар', 'url': 'https://www.rde.ee/p/1', 'price': '1 €'}]
+        return report
+
+    monkeypatch.setattr(jobs, 'CrawlLock', short_lock)
+    monkeypatch.setattr(parser, 'run_parsers', slow_report)
+    monkeypatch.setattr(db, 'renew_lock', lambda *args: False)
+
+    with pytest.raises(CrawlLockLost):
+        run_crawl(db)
+    assert locks[0].lost
+    assert db.get_crawl_runs() == []
+    assert db.get_all_products() == []
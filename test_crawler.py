@@ -0,0 +1,167 @@
+"""
+Тесты обхода каталога: очередь страниц, ограничение частоты запросов и обход сайта парсером
+"""
+import time
+
+from crawler import Frontier, HostRateLimiter, TokenBucket
+from parser import KlickParser
+from transport import Response, Transport
+
+PAGES = {
+    'https://www.klick.ee/': (
+        '<a href="/kampaaniad/liising">Liising</a>'
+        '<a href="/kategooria/telefonid">Telefonid</a>'
+        '<a href="/kontakt">Kontakt</a>'
+        '<a href="https://www.facebook.com/kampaania">Facebook</a>'
+    ),
+    'https://www.klick.ee/kampaaniad/liising': (
+        '<div><a href="/galaxy-a55">Samsung Galaxy A55</a> <span class="price">399,00 €</span>'
+        ' liising 0% 48 kuud</div>'
+        '<a href="/kampaaniad/liising?page=2">2</a>'
+    ),
+    'https://www.klick.ee/kampaaniad/liising?page=2': (
+        '<div><a href="/redmi-note-13">Xiaomi Redmi Note 13</a> liising 0% 36 kuud</div>'
+        '<div><a href="/galaxy-a55?utm_source=x">Samsung Galaxy A55</a> liising 0%</div>'
+    ),
+    'https://www.klick.ee/kategooria/telefonid': (
+        '<a href="/kategooria/telefonid/android">Android</a>'
+    ),
+    'https://www.klick.ee/kategooria/telefonid/android': (
+        '<div><a href="/pixel-8">Google Pixel 8</a> liising 0%</div>'
+    ),
+}
+
+
+class SiteTransport(Transport):
+    """Отдает страницы из PAGES и запоминает порядок запросов"""
+
+    def __init__(self):
+        super().__init__()
+        self.requested = []
+
+    def get(self, url, timeout=None, headers=None):
+        self.requested.append(url)
+        if url not in PAGES:
+            return Response(url, 404, {}, b'')
+        return Response(url, 200, {}, f'<html><body>{PAGES[url]}</body></html>'.encode())
+
+
+def make_parser(max_pages, max_depth=2):
+    parser = KlickParser(transport=SiteTransport(), html_backend='html.parser')
+    parser.max_pages = max_pages
+    parser.max_depth = max_depth
+    parser.crawl_workers = 1
+    parser.rate_limiter = HostRateLimiter(rate=0, capacity=1)
+    return parser
+
+
+def test_frontier_priority_depth_and_budget():
+    frontier = Frontier(max_pages=3, max_depth=1)
+    assert frontier.push('/', 0, priority=0)
+    assert not frontier.push('/', 0)
+    assert not frontier.push('/deep', depth=2)
+    assert frontier.push('/category', 1, priority=2)
+    assert frontier.push('/campaign', 1, priority=0)
+    # Бюджет исчерпан: в очередь попало уже 3 страницы
+    assert not frontier.push('/page-2', 1, priority=1)
+
+    assert [frontier.pop() for _ in range(3)] == [('/', 0), ('/campaign', 1), ('/category', 1)]
+    assert frontier.pop() is None
+
+
+def test_token_bucket_limits_rate():
+    bucket = TokenBucket(rate=20, capacity=2)
+    started = time.monotonic()
+    for _ in range(4):
+        assert bucket.acquire()
+    # Два запроса сразу, еще два - по 1/20 с
+    assert time.monotonic() - started >= 0.09
+
+    # Токен не появится до дедлайна - запрос не делается
+    assert not bucket.acquire(deadline=time.monotonic())
+
+
+def test_crawl_follows_campaigns_pagination_and_categories():
+    parser = make_parser(max_pages=10)
+    results = parser.parse()
+
+    assert parser.error is None
+    assert [r['url'] for r in results] == [
+        'https://www.klick.ee/galaxy-a55',
+        'https://www.klick.ee/redmi-note-13',
+        'https://www.klick.ee/pixel-8',
+    ]
+    assert results[0]['category'] == '/kampaaniad/liising'
+    # Акции раньше категорий; чужие хосты и страницы без шаблона не загружаются
+    assert parser.transport.requested == [
+        'https://www.klick.ee/',
+        'https://www.klick.ee/kampaaniad/liising',
+        'https://www.klick.ee/kampaaniad/liising?page=2',
+        'https://www.klick.ee/kategooria/telefonid',
+        'https://www.klick.ee/kategooria/telefonid/android',
+    ]
+
+
+def test_crawl_respects_page_budget_and_depth():
+    parser = make_parser(max_pages=2)
+    assert [r['url'] for r in parser.parse()] == ['https://www.klick.ee/galaxy-a55']
+    assert len(parser.transport.requested) == 2
+
+    parser = make_parser(max_pages=10, max_depth=1)
+    parser.parse()
+    assert 'https://www.klick.ee/kategooria/telefonid/android' not in parser.transport.requested
+
+
+def test_incomplete_crawl_is_reported():
+    parser = make_parser(max_pages=10)
+    parser.parse()
+    assert parser.incomplete is None
+
+    # Бюджет не вместил все страницы каталога
+    parser = make_parser(max_pages=2)
+    parser.parse()
+    assert 'не полностью' in parser.incomplete
+
+    # Страница каталога не загрузилась
+    PAGES['https://www.klick.ee/'] += '<a href="/kategooria/puudub">Puudub</a>'
+    try:
+        parser = make_parser(max_pages=10)
+        parser.parse()
+        assert parser.incomplete
+    finally:
+        PAGES['https://www.klick.ee/'] = PAGES['https://www.klick.ee/'].replace(
+            '<a href="/kategooria/puudub">Puudub</a>', '')
+
+
+def test_zero_workers_still_crawls():
+    parser = make_parser(max_pages=10)
+    parser.crawl_workers = 0
+    assert len(parser.parse()) == 3
+
+
+def test_get_pages_respects_host_rate_limit():
+    parser = make_parser(max_pages=1)
+    parser.rate_limiter = HostRateLimiter(rate=20, capacity=1)
+    urls = ['https://www.klick.ee/', 'https://www.klick.ee/kampaaniad/liising',
+            'https://www.klick.ee/kategooria/telefonid', 'https://www.klick.ee/kategooria/telefonid/android']
+
+    started = time.monotonic()
+    pages = parser.get_pages(urls)
+    # Один запрос сразу, остальные три - с интервалом 1/20 с
+    assert time.monotonic() - started >= 0.14
+    assert all(pages[url] is not None for url in urls)
+
+    # Очередь к хосту не успевает до дедлайна сайта: страница не загружается
+    parser.rate_limiter = HostRateLimiter(rate=0.1, capacity=1)
+    parser.deadline = time.monotonic() + 1
+    requested = len(parser.transport.requested)
+    pages = parser.get_pages(urls[:2])
+    assert sum(page is None for page in pages.values()) == 1
+    assert len(parser.transport.requested) == requested + 1
+
+
+def test_failed_start_page_is_an_error():
+    parser = make_parser(max_pages=10)
+    parser.base_url = 'https://www.klick.ee/missing'
+    assert parser.parse() == []
+    assert parser.error
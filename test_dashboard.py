@@ -0,0 +1,68 @@
+"""
+Тесты главной страницы: сводка по сайтам и кэш блоков товаров
+"""
+import os
+
+import pytest
+from flask import Flask, render_template
+
+from dashboard import build_dashboard
+from response_cache import FragmentCache
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+
+
+def make_products(site, count, start=0):
+    return [{
+        'site': site,
+        'title': f'{site} {i}',
+        'url': f'https://{site.lower()}.ee/p/{i}',
+        'price': '499,00 €',
+        'found_at': f'2024-01-01T00:{i % 60:02d}:00',
+        'leasing_period': '48 месяцев' if i % 2 == 0 else '36 месяцев',
+    } for i in range(start, start + count)]
+
+
+@pytest.fixture
+def db(db):
+    """База из conftest.py с тестовыми товарами"""
+    db.add_products(make_products('RDE', 5) + make_products('Klick', 3))
+    return db
+
+
+def test_dashboard_counts_and_sections(db):
+    app = Flask(__name__, template_folder=TEMPLATES_DIR)
+    cache = FragmentCache()
+    with app.test_request_context('/'):
+        context = build_dashboard(db, cache)
+        html = render_template('index.html', **context)
+
+    assert context['total_count'] == 8
+    assert context['count_48_months'] == 5
+    assert context['site_counts'] == {'Klick': 3, 'RDE': 5}
+    assert len(context['sections']) == 2
+    assert len(context['sections_48']) == 2
+    assert 'RDE 4' in html and '0% на 48 мес' in html
+    assert len(cache) == 4
+
+
+def test_only_changed_site_is_rerendered(db, monkeypatch):
+    app = Flask(__name__, template_folder=TEMPLATES_DIR)
+    cache = FragmentCache()
+    with app.test_request_context('/'):
+        build_dashboard(db, cache)
+        db.add_products(make_products('Klick', 2, start=3))
+
+        requested = []
+        original = db.get_dashboard_products
+
+        def spy(sites, sites_48=(), **kwargs):
+            requested.append((list(sites), list(sites_48)))
+            return original(sites, sites_48, **kwargs)
+
+        monkeypatch.setattr(db, 'get_dashboard_products', spy)
+        context = build_dashboard(db, cache)
+
+    assert requested == [(['Klick'], ['Klick'])]
+    assert context['site_counts'] == {'Klick': 5, 'RDE': 5}
+    assert 'Klick 4' in context['sections'][0]
@@ -0,0 +1,69 @@
+"""
+Тесты пакетной записи товаров (Database.add_products)
+"""
+import pytest
+
+from database import INSERT_BATCH_SIZE, LeasingProduct
+
+
+def product(n, price='100,00 €', leasing_period='24 месяцев'):
+    return {'site': 'RDE', 'title': f'Товар {n}', 'url': f'https://www.rde.ee/p/{n}',
+            'price': price, 'leasing_period': leasing_period}
+
+
+def stored(db):
+    return {row.url: row for row in db.session.query(LeasingProduct).all()}
+
+
+@pytest.mark.parametrize('batch_size', [1, 2, 3, 4, 100])
+def test_duplicates_within_and_across_batches(db, batch_size):
+    # Дубликаты стоят рядом (один пакет) и далеко друг от друга (разные пакеты)
+    products = [product(1), product(1), product(2), product(3), product(1), product(2), product(4)]
+    assert db.add_products(products, batch_size=batch_size) == 4
+    assert len(stored(db)) == 4
+
+    # Повторная запись ничего не добавляет
+    assert db.add_products(products, batch_size=batch_size) == 0
+    assert db.add_products([product(4), product(5)], batch_size=batch_size) == 1
+    assert len(stored(db)) == 5
+
+
+@pytest.mark.parametrize('count', [0, 1, INSERT_BATCH_SIZE - 1, INSERT_BATCH_SIZE, INSERT_BATCH_SIZE + 1,
+                                   2 * INSERT_BATCH_SIZE])
+def test_batch_size_boundaries(db, count):
+    # Размер пакета по умолчанию берется из DB_INSERT_BATCH_SIZE
+    assert db.add_products([product(n) for n in range(count)]) == count
+    assert len(stored(db)) == count
+    # Половина уже записана: добавляются только новые, в том числе на границе пакетов
+    assert db.add_products([product(n) for n in range(count // 2, count + 3)]) == 3
+    assert len(stored(db)) == count + 3
+
+
+def test_same_url_with_other_title_is_a_new_product(db):
+    renamed = dict(product(1), title='Товар 1 (uus)')
+    assert db.add_products([product(1), renamed], batch_size=1) == 2
+
+
+@pytest.mark.parametrize('batch_size', [1, 2, 100])
+def test_update_existing(db, batch_size):
+    assert db.add_products([product(1), product(2)], batch_size=batch_size) == 2
+    first_seen = stored(db)['https://www.rde.ee/p/1'].first_seen
+
+    products = [
+        product(1, price='90,00 €', leasing_period='48 месяцев'),
+        product(3),
+        product(3, price='80,00 €'),
+        product(2),
+    ]
+    assert db.add_products(products, batch_size=batch_size, update_existing=True) == 1
+
+    rows = stored(db)
+    assert len(rows) == 3
+    updated = rows['https://www.rde.ee/p/1']
+    assert (updated.price, updated.price_cents) == ('90,00 €', 9000)
+    assert (updated.leasing_period, updated.leasing_months) == ('48 месяцев', 48)
+    assert updated.first_seen == first_seen
+    # Из дубликатов нового товара остается последний
+    assert rows['https://www.rde.ee/p/3'].price_cents == 8000
+
+    assert db.add_products(products, batch_size=batch_size, update_existing=True) == 0
@@ -0,0 +1,66 @@
+"""
+Тесты потоковой выгрузки товаров
+"""
+import csv
+import gzip
+import io
+import json
+
+import pytest
+
+from export import EXPORT_FIELDS, export_stream, main
+
+
+@pytest.fixture
+def db(db):
+    """База из conftest.py с тестовыми товарами"""
+    db.add_products([{
+        'site': 'RDE',
+        'title': f'Ноутбук "{i}", 15"',
+        'url': f'https://www.rde.ee/p/{i}',
+        'price': '1 299,00 €',
+        'leasing_period': '48 месяцев',
+    } for i in range(25)])
+    return db
+
+
+def test_ndjson_in_chunks(db):
+    chunks = list(export_stream(db, 'ndjson', chunk_size=10))
+    assert len(chunks) == 3
+    rows = [json.loads(line) for line in b''.join(chunks).decode('utf-8').splitlines()]
+    assert [row['id'] for row in rows] == list(range(1, 26))
+    assert rows[0]['title'] == 'Ноутбук "0", 15"'
+    assert rows[0]['price_cents'] == 129900
+    assert rows[0]['first_seen'] == rows[0]['last_seen'] == rows[0]['found_at']
+    assert rows[0]['disappeared_at'] is None
+
+
+def test_gzipped_csv(db):
+    data = gzip.decompress(b''.join(export_stream(db, 'csv', compress=True, chunk_size=7)))
+    rows = list(csv.DictReader(io.StringIO(data.decode('utf-8'))))
+    assert len(rows) == 25
+    assert tuple(rows[0]) == EXPORT_FIELDS
+    assert rows[24]['title'] == 'Ноутбук "24", 15"'
+
+
+def test_disappeared_products_are_exported(db):
+    db.record_crawl({'results': [{'site': 'RDE', 'title': f'Ноутбук "{i}", 15"', 'url': f'https://www.rde.ee/p/{i}',
+                                  'price': '1 299,00 €'} for i in range(20)],
+                     'sites': {'RDE': {'status': 'ok'}}})
+    data = b''.join(export_stream(db, 'csv')).decode('utf-8')
+    rows = list(csv.DictReader(io.StringIO(data)))
+    assert len(rows) == 25
+    assert all(row['disappeared_at'] == '' for row in rows[:20])
+    assert all(row['disappeared_at'] and row['last_seen'] < row['disappeared_at'] for row in rows[20:])
+    assert all(row['first_seen'] and row['last_seen'] for row in rows)
+
+
+def test_unknown_format(db):
+    with pytest.raises(ValueError):
+        export_stream(db, 'xml')
+
+
+def test_cli(db, tmp_path):
+    output = tmp_path / 'products.ndjson'
+    main(['--db', db.db_path, '--format', 'ndjson', '-o', str(output)])
+    assert len(output.read_text(encoding='utf-8').splitlines()) == 25
@@ -0,0 +1,85 @@
+"""
+Тесты фоновых задач парсинга и объединения повторных запусков
+"""
+import threading
+
+import parser
+from jobs import CRAWL_JOBS, JobRunner
+
+SITES = ('RDE', 'Klick', 'Arvutitark')
+
+
+def fake_report(progress=None, **kwargs):
+    for site_name in SITES:
+        if progress is not None:
+            progress(site_name, {'status': 'ok', 'count': 1, 'duration': 0.1, 'error': None})
+    results = [{'site': site_name, 'title': f'Товар {site_name}', 'url': f'https://example.ee/{site_name}',
+                'price': '100,00 €', 'leasing_period': '48 месяцев'} for site_name in SITES]
+    sites = {site_name: {'status': 'ok', 'count': 1, 'duration': 0.1, 'error': None} for site_name in SITES}
+    return {'results': results, 'sites': sites, 'pages': {}}
+
+
+def test_duplicate_submissions_are_coalesced():
+    runner = JobRunner()
+    release = threading.Event()
+    runs = []
+
+    def target(progress):
+        runs.append(1)
+        progress('RDE', {'status': 'running'})
+        release.wait(5)
+        return {'found': 1}
+
+    job, created = runner.submit(target)
+    duplicates = [runner.submit(target, trigger='schedule') for _ in range(5)]
+    assert created
+    assert all(other is job and not other_created for other, other_created in duplicates)
+
+    release.set()
+    assert job.wait(5)
+    assert runs == [1]
+    assert job.to_dict()['status'] == 'done'
+    assert job.result == {'found': 1}
+    assert job.sites == {'RDE': {'status': 'running'}}
+
+    # Следующий запуск после завершения - новая задача
+    next_job, created = runner.submit(lambda progress: {})
+    assert created and next_job is not job
+    assert next_job.wait(5)
+
+
+def test_failed_job_and_history():
+    runner = JobRunner(history=2)
+
+    def fail(progress):
+        raise RuntimeError('сайт недоступен')
+
+    jobs = []
+    for _ in range(3):
+        job, _ = runner.submit(fail)
+        assert job.wait(5)
+        jobs.append(job)
+
+    assert jobs[-1].status == 'error'
+    assert jobs[-1].error == 'сайт недоступен'
+    assert runner.get(jobs[0].id) is None
+    assert runner.get(jobs[-1].id) is jobs[-1]
+
+
+def test_refresh_returns_job_and_status_reports_sites(web, monkeypatch):
+    monkeypatch.setattr(parser, 'run_parsers', fake_report)
+    client = web.app.test_client()
+
+    response = client.post('/api/refresh')
+    assert response.status_code == 202
+    data = response.get_json()
+    assert data['success'] and data['status_url'] == f"/api/jobs/{data['job_id']}"
+
+    assert CRAWL_JOBS.get(data['job_id']).wait(10)
+    job = client.get(data['status_url']).get_json()
+    assert job['status'] == 'done'
+    assert set(job['sites']) == set(SITES)
+    assert job['result']['found'] == 3
+    assert job['result']['added'] == 3
+
+    assert client.get('/api/jobs/unknown').status_code == 404
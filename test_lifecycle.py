@@ -0,0 +1,83 @@
+"""
+Тесты жизненного цикла товаров между запусками парсинга и пропуска неизменившихся страниц
+"""
+import os
+
+from parser import RDEParser
+from transport import Response, Transport
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+class FixtureTransport(Transport):
+    """Отдает сохраненную страницу на любой запрос"""
+
+    def __init__(self, content: bytes):
+        super().__init__()
+        self.content = content
+
+    def get(self, url, timeout=None, headers=None):
+        return Response(url, 200, {}, self.content)
+
+
+def product(site, number):
+    return {'site': site, 'title': f'{site} {number}', 'url': f'https://{site.lower()}.ee/p/{number}',
+            'price': '299,00 €'}
+
+
+def report(results, statuses, pages=None):
+    return {'results': results, 'sites': {site: {'status': status} for site, status in statuses.items()},
+            'pages': pages or {}}
+
+
+def test_first_seen_last_seen_and_disappeared(db):
+    first = db.record_crawl(report([product('RDE', i) for i in range(4)] + [product('Klick', 1)],
+                                   {'RDE': 'ok', 'Klick': 'ok'}))
+    assert first == {'run_id': 1, 'found': 5, 'added': 5, 'disappeared': 0}
+
+    # RDE 0 и 1 пропали, появился RDE 4; Klick не ответил - его товары не трогаем
+    second = db.record_crawl(report([product('RDE', i) for i in range(2, 5)], {'RDE': 'ok', 'Klick': 'error'}))
+    assert second == {'run_id': 2, 'found': 3, 'added': 1, 'disappeared': 2}
+    assert sorted(p['title'] for p in db.get_active_products()) == ['Klick 1', 'RDE 2', 'RDE 3', 'RDE 4']
+
+    # RDE 0 вернулся: снова действующий, first_seen прежний
+    db.record_crawl(report([product('RDE', 0)], {'RDE': 'ok'}))
+    active = {p['title']: p for p in db.get_active_products(site='RDE')}
+    assert list(active) == ['RDE 0']
+    assert active['RDE 0']['first_seen'] < active['RDE 0']['last_seen']
+    assert db.get_crawl_runs(limit=1)[0]['sites'] == {'RDE': {'status': 'ok'}}
+
+
+def test_unchanged_site_keeps_products_active(db):
+    db.record_crawl(report([product('RDE', 1)], {'RDE': 'ok'},
+                           {'RDE': {'url': 'https://www.rde.ee/', 'hash': 'abc'}}))
+    assert db.get_page_hashes() == {'https://www.rde.ee/': 'abc'}
+    before = db.get_active_products()[0]['last_seen']
+
+    crawl = db.record_crawl(report([], {'RDE': 'unchanged'}, {'RDE': {'url': 'https://www.rde.ee/', 'hash': 'abc'}}))
+    assert crawl['disappeared'] == 0
+    assert db.get_active_products()[0]['last_seen'] > before
+
+
+def test_parser_skips_unchanged_page():
+    with open(os.path.join(FIXTURES_DIR, 'rde.html'), 'rb') as f:
+        content = f.read()
+
+    parser = RDEParser(transport=FixtureTransport(content))
+    assert len(parser.parse()) == 3
+    assert not parser.unchanged
+
+    again = RDEParser(transport=FixtureTransport(content))
+    again.known_hash = parser.page_hash
+    assert again.parse() == []
+    assert again.unchanged
+
+
+def test_partial_crawl_does_not_expire_unfetched_products(db):
+    db.record_crawl(report([product('RDE', i) for i in range(3)], {'RDE': 'ok'}))
+
+    # Обойдена часть каталога: найденные товары сохраняются, остальные не пропадают
+    crawl = db.record_crawl(report([product('RDE', 0), product('RDE', 5)], {'RDE': 'partial'}))
+    assert crawl['disappeared'] == 0
+    assert crawl['added'] == 1
+    assert sorted(p['title'] for p in db.get_active_products()) == ['RDE 0', 'RDE 1', 'RDE 2', 'RDE 5']
@@ -0,0 +1,78 @@
+"""
+Тесты поиска признаков лизинга 0% и срока лизинга
+"""
+import pytest
+from bs4 import BeautifulSoup
+
+from matcher import MEMO_MAX_TEXT_LENGTH, LeasingMatcher
+from page_fixtures import ReplayTransport
+from parser import KlickParser
+
+
+@pytest.fixture
+def matcher():
+    return LeasingMatcher()
+
+
+@pytest.mark.parametrize('text', [
+    'Järelmaks ja liising 0%',
+    'Leasing 0 % intressiga',
+    'Liising 0 protsenti',
+    'Liising null protsenti',
+    'LEASING NULL%',
+    # Соседние теги, склеенные get_text()
+    'liising0%',
+    'Liising0 protsenti',
+])
+def test_zero_leasing(matcher, text):
+    assert matcher.has_zero_leasing(text)
+
+
+@pytest.mark.parametrize('text', [
+    'Liising 10%',
+    'Liising 100 protsenti',
+    'Liising alates 20 %',
+    'Soodustus 0%',
+])
+def test_not_zero_leasing(matcher, text):
+    assert not matcher.has_zero_leasing(text)
+
+
+@pytest.mark.parametrize('text, months', [
+    ('Liising 0% 48 kuud', 48),
+    ('Liising 0% 48 мес.', 48),
+    ('Liising 0% 24 kuud', 24),
+    ('Liising 12 kuud või 48 kuud', 48),
+    ('Liising 12 kuud, 148 мес', 12),
+    ('Liising 148 kuud', 148),
+    ('Liising 2048 kuud', 2048),
+    ('Liising 0%', None),
+])
+def test_leasing_period(matcher, text, months):
+    result = matcher.classify(text)
+    assert result['months'] == months
+    assert result['leasing_period'] == (f"{months} месяцев" if months is not None else None)
+
+
+def test_classify_many_matches_classify(matcher):
+    texts = ['Liising 0% 48 kuud', 'Liising 10% 148 kuud', 'Hind 299 €', 'Liising 0% 48 kuud']
+    assert matcher.classify_many(texts) == [matcher.classify(text) for text in texts]
+    assert matcher.classify_many([]) == []
+
+
+def test_long_text_is_not_memoized(matcher):
+    text = 'x' * MEMO_MAX_TEXT_LENGTH + ' liising 0% 148 kuud 36 kuud'
+    result = matcher.classify(text)
+    assert result['has_leasing'] and result['has_zero']
+    assert result['months'] == 148
+    assert matcher._classify_cached.cache_info().currsize == 0
+
+
+def test_card_with_zero_in_adjacent_tag():
+    html = ('<div><a href="/galaxy-a55">Samsung Galaxy A55</a>'
+            '<span>Liising</span><b>0%</b><span>36 kuud</span></div>')
+    parser = KlickParser(transport=ReplayTransport(directory=None), html_backend='html.parser')
+    results = parser.extract(BeautifulSoup(html, 'html.parser'))
+    assert [(result['url'], result['leasing_period']) for result in results] == [
+        ('https://www.klick.ee/galaxy-a55', '36 месяцев'),
+    ]
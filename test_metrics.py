@@ -0,0 +1,86 @@
+"""
+Тесты метрик производительности и /api/metrics
+"""
+import os
+
+import pytest
+
+import metrics
+from crawler import HostRateLimiter
+from metrics import CRAWL_STAGE_SECONDS, REGISTRY, Histogram
+from page_fixtures import ReplayTransport
+from parser import KlickParser
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+requires_metrics = pytest.mark.skipif(not metrics.METRICS_ENABLED, reason='метрики отключены (METRICS_ENABLED=0)')
+
+
+def series(text, name):
+    """Строки метрики name из текстового формата Prometheus"""
+    return [line for line in text.splitlines() if line.startswith(name)]
+
+
+def test_histogram_text_format():
+    histogram = Histogram('test_seconds', 'Тест', ('site',), buckets=(0.1, 1))
+    histogram.observe(0.05, 'RDE')
+    histogram.observe(0.5, 'RDE')
+    histogram.observe(5, 'Kli"ck')
+
+    assert histogram.render() == [
+        '# HELP test_seconds Тест',
+        '# TYPE test_seconds histogram',
+        'test_seconds_bucket{site="Kli\\"ck",le="0.1"} 0',
+        'test_seconds_bucket{site="Kli\\"ck",le="1"} 0',
+        'test_seconds_bucket{site="Kli\\"ck",le="+Inf"} 1',
+        'test_seconds_sum{site="Kli\\"ck"} 5',
+        'test_seconds_count{site="Kli\\"ck"} 1',
+        'test_seconds_bucket{site="RDE",le="0.1"} 1',
+        'test_seconds_bucket{site="RDE",le="1"} 2',
+        'test_seconds_bucket{site="RDE",le="+Inf"} 2',
+        'test_seconds_sum{site="RDE"} 0.55',
+        'test_seconds_count{site="RDE"} 2',
+    ]
+
+
+@requires_metrics
+def test_crawl_stages_are_timed():
+    REGISTRY.clear()
+    with open(os.path.join(FIXTURES_DIR, 'klick.html'), 'rb') as f:
+        transport = ReplayTransport(directory=None, pages={'https://www.klick.ee/': f.read()})
+    parser = KlickParser(transport=transport)
+    parser.rate_limiter = HostRateLimiter(rate=0)
+    assert parser.parse()
+
+    text = REGISTRY.render()
+    for stage in ('fetch', 'parse', 'extract'):
+        assert f'leasing_crawl_stage_seconds_count{{site="Klick",stage="{stage}"}} 1' in text
+
+
+def test_disabled_metrics_do_not_record(monkeypatch):
+    monkeypatch.setattr(metrics, 'METRICS_ENABLED', False)
+    REGISTRY.clear()
+    with CRAWL_STAGE_SECONDS.time('RDE', 'fetch'):
+        pass
+    assert CRAWL_STAGE_SECONDS.timed('RDE')(len) is len
+    assert series(REGISTRY.render(), 'leasing_crawl_stage_seconds_count') == []
+
+
+@requires_metrics
+def test_metrics_endpoint(web):
+    REGISTRY.clear()
+    web.db.add_products([{'site': 'RDE', 'title': 'Товар', 'url': 'https://www.rde.ee/p/1',
+                          'price': '100,00 €', 'leasing_period': '48 месяцев'}])
+    client = web.app.test_client()
+    assert client.get('/api/products?limit=5').status_code == 200
+    assert client.get('/api/products/RDE').status_code == 200
+
+    response = client.get('/api/metrics')
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain; version=0.0.4')
+    text = response.get_data(as_text=True)
+    assert 'leasing_db_write_seconds_count{operation="add_products"} 1' in text
+    # Маршруты учитываются по шаблону, а не по пути запроса
+    assert 'leasing_http_request_duration_seconds_count{method="GET",route="/api/products",status="200"} 1' in text
+    assert ('leasing_http_request_duration_seconds_count'
+            '{method="GET",route="/api/products/<site>",status="200"} 1') in text
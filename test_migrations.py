@@ -0,0 +1,108 @@
+"""
+Обновление базы в исходной схеме через все миграции
+"""
+import sqlite3
+
+import pytest
+from sqlalchemy import inspect
+
+from database import Database
+import migrations
+from migrations import MIGRATIONS, SCHEMA_VERSION
+
+# Схема базы до появления миграций (первая версия database.py)
+BASELINE_SCHEMA = '''
+CREATE TABLE leasing_products (
+    id INTEGER NOT NULL PRIMARY KEY,
+    site VARCHAR(50) NOT NULL,
+    title VARCHAR(500) NOT NULL,
+    price VARCHAR(100),
+    url TEXT NOT NULL,
+    category VARCHAR(200),
+    leasing_period VARCHAR(50),
+    found_at DATETIME,
+    created_at DATETIME
+)
+'''
+
+BASELINE_ROWS = [
+    ('RDE', 'Ноутбук', '1 299,00 €', 'https://www.rde.ee/p/1', '48 месяцев', '2024-01-01 10:00:00.000000'),
+    # Дубликат (url, title), накопленный без уникального индекса
+    ('RDE', 'Ноутбук', '1 299,00 €', 'https://www.rde.ee/p/1', '48 месяцев', '2024-01-02 10:00:00.000000'),
+    ('RDE', 'Телефон', '€19.90', 'https://www.rde.ee/p/2', '24 kuud', '2024-01-03 10:00:00.000000'),
+    ('Klick', 'Наушники', 'Hind puudub', 'https://www.klick.ee/p/3', None, '2024-01-04 10:00:00.000000'),
+    ('Klick', 'Планшет', '499,-', 'https://www.klick.ee/p/4', 'срок не указан', '2024-01-05 10:00:00.000000'),
+]
+
+
+@pytest.fixture
+def baseline_path(tmp_path):
+    path = str(tmp_path / 'baseline.db')
+    conn = sqlite3.connect(path)
+    conn.execute(BASELINE_SCHEMA)
+    conn.executemany(
+        'INSERT INTO leasing_products (site, title, price, url, leasing_period, found_at, created_at) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?)',
+        [row + (row[-1],) for row in BASELINE_ROWS]
+    )
+    conn.commit()
+    conn.close()
+    return path
+
+
+def schema(engine):
+    inspector = inspect(engine)
+    return {
+        table: (
+            {column['name'] for column in inspector.get_columns(table)},
+            {index['name'] for index in inspector.get_indexes(table)},
+        )
+        for table in inspector.get_table_names()
+    }
+
+
+def test_baseline_database_is_upgraded(baseline_path, tmp_path, monkeypatch):
+    db = Database(baseline_path)
+    try:
+        assert db.schema_version == SCHEMA_VERSION == len(MIGRATIONS)
+        with db.engine.connect() as conn:
+            assert conn.exec_driver_sql('PRAGMA user_version').scalar() == SCHEMA_VERSION
+
+        # Колонки, таблицы и индексы те же, что у базы, созданной сразу в актуальной схеме
+        fresh = Database(str(tmp_path / 'fresh.db'))
+        try:
+            assert schema(db.engine) == schema(fresh.engine)
+        finally:
+            fresh.close()
+
+        rows = {(row['url'], row['title']): row for row in db.get_all_products(limit=100)}
+        assert len(rows) == 4
+        assert rows['https://www.rde.ee/p/1', 'Ноутбук']['leasing_months'] == 48
+        assert rows['https://www.rde.ee/p/2', 'Телефон']['leasing_months'] == 24
+        assert rows['https://www.klick.ee/p/3', 'Наушники']['leasing_months'] is None
+        assert rows['https://www.klick.ee/p/4', 'Планшет']['leasing_months'] is None
+        assert rows['https://www.rde.ee/p/1', 'Ноутбук']['price_cents'] == 129900
+        assert rows['https://www.rde.ee/p/2', 'Телефон']['currency'] == 'EUR'
+        assert rows['https://www.klick.ee/p/3', 'Наушники']['price_cents'] is None
+        # Остается первая запись дубликата, first_seen и last_seen берутся из found_at
+        assert rows['https://www.rde.ee/p/1', 'Ноутбук']['first_seen'].startswith('2024-01-01')
+        assert rows['https://www.rde.ee/p/1', 'Ноутбук']['last_seen'].startswith('2024-01-01')
+
+        # Сводка по сайтам заполнена, база пригодна для записи
+        summary = {site['site']: (site['product_count'], site['count_48']) for site in db.get_site_summary()}
+        assert summary == {'Klick': (2, 0), 'RDE': (2, 1)}
+        assert db.add_products([{'site': 'RDE', 'title': 'Ноутбук', 'url': 'https://www.rde.ee/p/1'}]) == 0
+    finally:
+        db.close()
+
+    # Повторное открытие не применяет миграции заново
+    def applied_twice(conn):
+        raise AssertionError("Миграция применена повторно")
+
+    monkeypatch.setattr(migrations, 'MIGRATIONS', [applied_twice] * len(MIGRATIONS))
+    again = Database(baseline_path)
+    try:
+        assert again.schema_version == SCHEMA_VERSION
+        assert len(again.get_all_products(limit=100)) == 4
+    finally:
+        again.close()
@@ -0,0 +1,75 @@
+"""
+Тесты записи и воспроизведения страниц и проверки бенчмарка парсеров
+"""
+import gzip
+import os
+
+from bs4 import BeautifulSoup
+
+from benchmark import compare_with_baseline
+from page_fixtures import RecordingTransport, ReplayTransport, load_index, scale_page
+from parser import KlickParser
+from transport import Response, Transport
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), 'rb') as f:
+        return f.read()
+
+
+class PagesTransport(Transport):
+    """Отвечает заданными страницами, остальные адреса - 404"""
+
+    def __init__(self, pages):
+        super().__init__()
+        self.pages = pages
+
+    def get(self, url, timeout=None, headers=None):
+        if url in self.pages:
+            return Response(url, 200, {'Content-Type': 'text/html', 'Set-Cookie': 'id=1'}, self.pages[url])
+        return Response(url, 404, {}, b'')
+
+
+def test_recorded_pages_replay_offline(tmp_path):
+    content = read_fixture('klick.html')
+    recorder = RecordingTransport(PagesTransport({'https://www.klick.ee/': content}), str(tmp_path))
+    live = KlickParser(transport=recorder).parse()
+    assert recorder.get('https://www.klick.ee/missing').status_code == 404
+
+    index = load_index(str(tmp_path))
+    assert list(index) == ['https://www.klick.ee/']
+    entry = index['https://www.klick.ee/']
+    assert entry['headers'] == {'Content-Type': 'text/html'}
+    with gzip.open(tmp_path / entry['file'], 'rb') as f:
+        assert f.read() == content
+
+    replay = ReplayTransport(str(tmp_path))
+    replayed = KlickParser(transport=replay).parse()
+    assert [r['url'] for r in replayed] == [r['url'] for r in live]
+    assert replay.get('https://www.klick.ee/missing').status_code == 404
+
+
+def test_scaled_page_multiplies_products():
+    parser = KlickParser(transport=ReplayTransport(directory=None), html_backend='html.parser')
+    content = read_fixture('klick.html')
+    single = parser.extract(BeautifulSoup(content, parser.html_backend))
+    scaled = parser.extract(BeautifulSoup(scale_page(content, 10), parser.html_backend))
+    assert len(scaled) >= 10 * len(single) - 1
+    assert len({r['url'] for r in scaled}) == len(scaled)
+
+
+def test_baseline_check_reports_regressions():
+    def result(products, ms):
+        return {'products': products, 'ms_per_page': ms, 'pages_per_sec': 1000 / ms, 'peak_kb': 1}
+
+    baseline = {'Klick': {'1': result(3, 2.0), '10': result(30, 10.0), '100': result(300, 100.0)}}
+    assert compare_with_baseline(baseline, baseline) == []
+
+    # Товаров стало меньше, а время растет квадратично от их числа
+    slow = {'Klick': {'1': result(2, 2.0), '10': result(30, 10.0), '100': result(300, 1000.0)}}
+    problems = compare_with_baseline(slow, baseline)
+    assert any('найдено 2 товаров' in problem for problem in problems)
+    assert any('x100: 1000.0 мс' in problem for problem in problems)
+    assert any('n^2.00' in problem for problem in problems)
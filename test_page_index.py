@@ -0,0 +1,146 @@
+"""
+Сверка извлечения через PageIndex с прежним поиском find_all/find_parent
+и проверка, что время извлечения растет линейно с размером страницы
+"""
+import os
+import random
+import time
+
+import pytest
+from bs4 import BeautifulSoup
+
+from page_fixtures import ReplayTransport, scale_page
+from parser import PRICE_CLASS_RE, ArvutitarkParser, KlickParser, RDEParser
+from urls import DedupIndex, canonicalize_url
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+SITE_FIXTURES = [(RDEParser, 'rde.html'), (KlickParser, 'klick.html'), (ArvutitarkParser, 'arvutitark.html')]
+BACKEND = 'html.parser'
+
+
+def make_parser(parser_class):
+    return parser_class(transport=ReplayTransport(directory=None), html_backend=BACKEND)
+
+
+def reference_extract(parser, soup, page_url):
+    """Извлечение товаров прежним способом: find_parent и find по поддереву для каждого упоминания"""
+    results = []
+    if not parser.search_leasing_keywords(soup.get_text()):
+        return results
+    seen_urls = DedupIndex()
+    for string in soup.find_all(string=parser.leasing_text_re):
+        container = string.find_parent(parser.container_tags)
+        if container is None:
+            continue
+        link = container if container.name == 'a' and container.get('href') is not None else \
+            container.find('a', href=True)
+        if link is None:
+            continue
+        href = canonicalize_url(link.get('href'), page_url)
+        if href is None:
+            continue
+
+        title_elem = container.find(list(parser.title_tags))
+        if title_elem is None and parser.title_from_link:
+            title_elem = link
+        title = title_elem.get_text(strip=True) if title_elem is not None else "Товар с лизингом 0%"
+        if len(title) < 10:
+            title = link.get_text(strip=True) or title
+
+        price_elem = container.find(['span', 'div'], class_=PRICE_CLASS_RE)
+        price = price_elem.get_text(strip=True) if price_elem is not None else "Цена не указана"
+
+        if seen_urls.add(href):
+            results.append({
+                'site': parser.site_name,
+                'title': title[:500],
+                'price': price,
+                'url': href,
+                'category': '/',
+                'leasing_period': parser.extract_leasing_period(container.get_text()),
+            })
+    return results
+
+
+def without_time(results):
+    return [{key: value for key, value in result.items() if key != 'found_at'} for result in results]
+
+
+def synthetic_page(seed: int, cards: int = 40) -> str:
+    """Случайная страница: вложенные карточки, ссылки, заголовки, цены, комментарии и скрипты"""
+    rng = random.Random(seed)
+    texts = ['Liising 0%', 'järelmaks 0 % 48 kuud', 'liising 10% 36 kuud', 'Leasing 0 protsenti 24 kuud',
+             'Uus toode', 'Hind', 'lisa ostukorvi', '0% intress']
+
+    def node(depth: int) -> str:
+        parts = []
+        for _ in range(rng.randint(1, 4)):
+            choice = rng.random()
+            if depth < 4 and choice < 0.35:
+                tag = rng.choice(['div', 'article', 'section', 'li', 'span', 'p', 'ul'])
+                attrs = ' class="product-price"' if tag in ('span', 'div') and rng.random() < 0.2 else ''
+                parts.append(f'<{tag}{attrs}>{node(depth + 1)}</{tag}>')
+            elif choice < 0.5:
+                href = rng.choice(['/p/{}', '/kategooria/{}', '#', 'javascript:void(0)', 'https://muu.ee/{}',
+                                   '/p/{}?utm_source=x'])
+                parts.append(f'<a href="{href.format(rng.randint(1, 30))}">{rng.choice(texts)}</a>')
+            elif choice < 0.6:
+                parts.append(f'<a>{rng.choice(texts)}</a>')
+            elif choice < 0.7:
+                tag = rng.choice(['h2', 'h3', 'h4'])
+                parts.append(f'<{tag}>Toode {rng.randint(1, 99)} {rng.choice(texts)}</{tag}>')
+            elif choice < 0.75:
+                parts.append(f'<!-- {rng.choice(texts)} -->')
+            elif choice < 0.8:
+                parts.append(f'<script>var t = "{rng.choice(texts)}";</script>')
+            elif choice < 0.85:
+                parts.append(f'<span class="hind">{rng.randint(10, 2000)},00 €</span>')
+            else:
+                parts.append(f' {rng.choice(texts)} ')
+        return ''.join(parts)
+
+    cards_html = ''.join(f'<div class="card">{node(0)}</div>' for _ in range(cards))
+    return f'<html><body><main>{cards_html}</main></body></html>'
+
+
+@pytest.mark.parametrize('parser_class, fixture', SITE_FIXTURES)
+def test_page_index_matches_reference_on_fixtures(parser_class, fixture):
+    parser = make_parser(parser_class)
+    with open(os.path.join(FIXTURES_DIR, fixture), 'rb') as f:
+        content = f.read()
+    for factor in (1, 3):
+        soup = BeautifulSoup(scale_page(content, factor), BACKEND)
+        expected = reference_extract(parser, soup, parser.page_url)
+        assert expected
+        assert without_time(parser.extract(soup)) == expected
+
+
+@pytest.mark.parametrize('parser_class', [RDEParser, KlickParser, ArvutitarkParser])
+@pytest.mark.parametrize('seed', range(15))
+def test_page_index_matches_reference_on_synthetic_pages(parser_class, seed):
+    parser = make_parser(parser_class)
+    soup = BeautifulSoup(synthetic_page(seed), BACKEND)
+    assert without_time(parser.extract(soup)) == reference_extract(parser, soup, parser.page_url)
+
+
+def best_time(func, repeat: int = 3) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def test_extraction_scales_linearly():
+    parser = make_parser(RDEParser)
+    with open(os.path.join(FIXTURES_DIR, 'rde.html'), 'rb') as f:
+        content = f.read()
+    small = BeautifulSoup(scale_page(content, 20), BACKEND)
+    large = BeautifulSoup(scale_page(content, 160), BACKEND)
+    assert len(parser.extract(large)) > 7 * len(parser.extract(small))
+
+    # Страница в 8 раз больше: при линейной сложности время растет примерно в 8 раз,
+    # при квадратичной - в 64. Запас на шум таймера - втрое.
+    ratio = best_time(lambda: parser.extract(large)) / best_time(lambda: parser.extract(small))
+    assert ratio < 24
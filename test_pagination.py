@@ -0,0 +1,60 @@
+"""
+Тесты постраничной выдачи товаров по курсору
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from product_filters import parse_page_args
+
+
+@pytest.fixture
+def db(db):
+    """База из conftest.py с тестовыми товарами"""
+    start = datetime(2024, 1, 1)
+    db.add_products([{
+        'site': 'rde' if i % 2 else 'klick',
+        'title': f'Товар {i}',
+        'url': f'https://example.ee/p/{i}',
+        # Несколько товаров с одинаковым found_at: порядок добивается id
+        'found_at': (start + timedelta(minutes=i // 3)).isoformat(),
+        'price': f'{100 + i % 7 * 50},00 €',
+        'leasing_period': '48 месяцев' if i % 4 == 0 else '24 месяцев',
+    } for i in range(60)])
+    return db
+
+
+def collect_pages(db, args):
+    products, cursor, pages = [], None, 0
+    while True:
+        page_args = dict(args, cursor=cursor) if cursor else args
+        page = db.get_products_page(**parse_page_args(page_args))
+        products.extend(page['products'])
+        pages += 1
+        cursor = page['next_cursor']
+        if not cursor:
+            return products, pages
+
+
+def test_pages_cover_all_products_once(db):
+    products, pages = collect_pages(db, {'limit': '7'})
+    assert pages == 9
+    assert len({p['id'] for p in products}) == 60
+    keys = [(p['found_at'], p['id']) for p in products]
+    assert keys == sorted(keys, reverse=True)
+
+
+def test_filters_and_price_sort(db):
+    products, _ = collect_pages(db, {'limit': '4', 'site': 'klick', 'months': '48',
+                                     'min_price': '150', 'sort': 'price'})
+    assert products
+    assert all(p['site'] == 'klick' and p['leasing_months'] == 48 for p in products)
+    assert all(p['price_cents'] >= 15000 for p in products)
+    prices = [p['price_cents'] for p in products]
+    assert prices == sorted(prices)
+
+
+def test_invalid_page_args():
+    for args in ({'limit': '0'}, {'limit': '501'}, {'cursor': 'garbage'}, {'since': 'вчера'}):
+        with pytest.raises(ValueError):
+            parse_page_args(args)
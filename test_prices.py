@@ -0,0 +1,67 @@
+"""
+Тесты разбора цен и параметров фильтрации по цене
+"""
+import pytest
+
+from prices import MAX_PRICE_EUR, parse_price
+from product_filters import parse_product_filters
+
+
+def test_eu_and_us_formats():
+    assert parse_price('1 299,00 €') == (129900, 'EUR')
+    assert parse_price('1\xa0299,99\xa0€') == (129999, 'EUR')
+    assert parse_price('€1,299.00') == (129900, 'EUR')
+    assert parse_price('1.299 €') == (129900, 'EUR')
+    assert parse_price('899,-') == (89900, 'EUR')
+    assert parse_price('$19.9') == (1990, 'USD')
+
+
+def test_adjacent_numbers_are_not_joined():
+    # Код товара перед ценой - отдельное число, а не разряды цены
+    assert parse_price('Tootekood 4719512345678 1299 €') == (129900, 'EUR')
+    assert parse_price('EAN 4719512345678, hind 1 299,00 €') == (129900, 'EUR')
+    assert parse_price('1.299.000,50 €') == (129900050, 'EUR')
+
+
+def test_price_above_bound_is_ignored():
+    assert parse_price('12345678901234567890 €') is None
+    assert parse_price(f'{MAX_PRICE_EUR + 1} €') is None
+    assert parse_price(f'{MAX_PRICE_EUR} €') == (MAX_PRICE_EUR * 100, 'EUR')
+
+
+def test_huge_price_does_not_break_crawl_write(db):
+    crawl = db.record_crawl({'results': [
+        {'site': 'RDE', 'title': 'Ноутбук', 'url': 'https://www.rde.ee/p/1', 'price': '12345678901234567890 €'},
+        {'site': 'RDE', 'title': 'Телефон', 'url': 'https://www.rde.ee/p/2', 'price': 'Tootekood 4719512345678 199 €'},
+    ], 'sites': {'RDE': {'status': 'ok'}}})
+    assert crawl['added'] == 2
+    prices = {row['title']: row['price_cents'] for row in db.get_all_products()}
+    assert prices == {'Ноутбук': None, 'Телефон': 19900}
+
+
+def test_no_price():
+    for text in (None, '', 'Hind puudub'):
+        assert parse_price(text) is None
+
+
+def test_product_filters():
+    assert parse_product_filters({}) == {'min_price': None, 'max_price': None, 'sort': 'found_at'}
+    assert parse_product_filters({'min_price': '199,5', 'max_price': '1000', 'sort': 'price'}) == {
+        'min_price': 19950, 'max_price': 100000, 'sort': 'price',
+    }
+    for args in ({'min_price': 'abc'}, {'max_price': '-1'}, {'sort': 'title'}):
+        with pytest.raises(ValueError):
+            parse_product_filters(args)
+
+
+@pytest.mark.parametrize('value', ['NaN', 'nan', 'sNaN', 'Infinity', '-Infinity', 'inf', '1e400', '10000000000'])
+def test_price_filter_rejects_non_finite_and_huge_values(value):
+    with pytest.raises(ValueError):
+        parse_product_filters({'min_price': value})
+    with pytest.raises(ValueError):
+        parse_product_filters({'max_price': value})
+
+
+def test_price_filter_upper_bound_is_inclusive():
+    assert parse_product_filters({'max_price': '1000000000'})['max_price'] == 100000000000
+    assert parse_product_filters({'max_price': '1e3'})['max_price'] == 100000
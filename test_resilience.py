@@ -0,0 +1,124 @@
+"""
+Тесты повторных запросов и предохранителя сайта
+"""
+import time
+from email.utils import formatdate
+
+import requests
+
+from crawler import HostRateLimiter
+from parser import KlickParser
+from resilience import BREAKERS, CircuitBreaker, backoff_delay, is_retryable_error, retry_after
+from transport import Response, Transport
+
+
+class ScriptedTransport(Transport):
+    """Отвечает по очереди заданными ответами; исключения выбрасывает"""
+
+    def __init__(self, *outcomes):
+        super().__init__()
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def get(self, url, timeout=None, headers=None):
+        self.calls += 1
+        outcome = self.outcomes.pop(0) if len(self.outcomes) > 1 else self.outcomes[0]
+        if isinstance(outcome, Exception):
+            raise outcome
+        status, headers = outcome
+        return Response(url, status, headers, b'<html><body></body></html>')
+
+
+def make_parser(*outcomes, retries=2, breaker=None):
+    parser = KlickParser(transport=ScriptedTransport(*outcomes), html_backend='html.parser')
+    parser.retries = retries
+    parser.rate_limiter = HostRateLimiter(rate=0, capacity=1)
+    parser.breaker = breaker or CircuitBreaker(threshold=10, cooldown=60)
+    return parser
+
+
+def test_retry_after_and_backoff():
+    assert retry_after({'Retry-After': '3'}) == 3.0
+    assert 0 < retry_after({'Retry-After': formatdate(time.time() + 60, usegmt=True)}) <= 60
+    assert retry_after({'Retry-After': 'скоро'}) is None
+    assert retry_after({}) is None
+    assert all(0 <= backoff_delay(3, base=0.5, max_delay=2) <= 2 for _ in range(100))
+
+
+def test_retryable_errors():
+    assert is_retryable_error(requests.ConnectionError('reset'))
+    assert is_retryable_error(requests.ReadTimeout('timeout'))
+    assert not is_retryable_error(requests.exceptions.MissingSchema('no schema'))
+    assert not is_retryable_error(KeyError('bug'))
+
+
+def test_transient_errors_are_retried():
+    parser = make_parser((503, {'Retry-After': '0'}), requests.ConnectionError('reset'), (200, {}))
+    started = time.monotonic()
+    assert parser.fetch('https://www.klick.ee/') is not None
+    assert parser.transport.calls == 3
+    # Вторая задержка - случайная, не больше base * 2
+    assert time.monotonic() - started < 2
+    assert parser.breaker.failures == 0
+
+
+def test_permanent_errors_are_not_retried():
+    parser = make_parser((404, {}))
+    assert parser.fetch('https://www.klick.ee/missing') is None
+    assert parser.transport.calls == 1
+    assert parser.fetch_error == 'HTTP 404'
+
+
+def test_retry_after_beyond_deadline_gives_up():
+    parser = make_parser((429, {'Retry-After': '120'}), (200, {}))
+    parser.deadline = time.monotonic() + 5
+    assert parser.fetch('https://www.klick.ee/') is None
+    assert parser.transport.calls == 1
+
+
+def test_breaker_opens_short_circuits_and_recovers():
+    breaker = CircuitBreaker(threshold=3, cooldown=0.2)
+    parser = make_parser((503, {'Retry-After': '0'}), retries=1, breaker=breaker)
+
+    assert parser.fetch('https://www.klick.ee/a') is None
+    assert parser.fetch('https://www.klick.ee/b') is None
+    assert breaker.state == 'open'
+    calls = parser.transport.calls
+    assert calls == 3
+
+    # Пока предохранитель разомкнут, запросы не выполняются
+    assert parser.fetch('https://www.klick.ee/c') is None
+    assert parser.transport.calls == calls
+    assert breaker.to_dict()['state'] == 'open'
+
+    # После паузы проходит один пробный запрос; успех замыкает предохранитель
+    time.sleep(0.25)
+    assert breaker.state == 'half_open'
+    parser.transport.outcomes = [(200, {})]
+    assert parser.fetch('https://www.klick.ee/d') is not None
+    assert breaker.state == 'closed'
+
+
+def test_half_open_allows_single_probe():
+    breaker = CircuitBreaker(threshold=1, cooldown=0)
+    breaker.record_failure('HTTP 503')
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_failure('HTTP 503')
+    assert breaker.last_error == 'HTTP 503'
+
+
+def test_open_breaker_reports_site_error():
+    breaker = CircuitBreaker(threshold=1, cooldown=60)
+    breaker.record_failure('timeout')
+    parser = make_parser((200, {}), breaker=breaker)
+    assert parser.parse() == []
+    assert 'приостановлены' in parser.error
+    assert parser.transport.calls == 0
+
+
+def test_health_shows_breakers(web):
+    BREAKERS.get('Klick')
+    data = web.app.test_client().get('/api/health').get_json()
+    assert data['status'] == 'ok'
+    assert data['breakers']['Klick']['state'] in ('closed', 'open', 'half_open')
@@ -0,0 +1,54 @@
+"""
+Тесты кэша ответов: поколения данных, ETag/304 и вытеснение LRU
+"""
+from flask import Flask, jsonify
+
+from response_cache import CachedResponse, ResponseCache, cached_response
+
+
+def make_app(state):
+    app = Flask(__name__)
+    cache = ResponseCache(max_size=1024 * 1024)
+
+    @app.route('/items')
+    @cached_response(lambda: state['generation'], cache=cache)
+    def items():
+        state['calls'] += 1
+        return jsonify(state['items'])
+
+    return app
+
+
+def test_etag_304_and_generation_change():
+    state = {'generation': 1, 'calls': 0, 'items': [1, 2]}
+    client = make_app(state).test_client()
+
+    first = client.get('/items')
+    etag = first.headers['ETag']
+    assert first.json == [1, 2]
+    assert client.get('/items').headers['ETag'] == etag
+    assert client.get('/items', headers={'If-None-Match': etag}).status_code == 304
+    assert state['calls'] == 1
+
+    # Новое поколение данных: ответ строится заново, старый ETag больше не подходит
+    state['generation'] = 2
+    state['items'] = [1, 2, 3]
+    changed = client.get('/items', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.json == [1, 2, 3]
+    assert state['calls'] == 2
+
+
+def test_lru_eviction_by_size():
+    cache = ResponseCache(max_size=10)
+    cache.put('a', 1, CachedResponse(b'aaaa', 'text/plain', 'a'))
+    cache.put('b', 1, CachedResponse(b'bbbb', 'text/plain', 'b'))
+    assert cache.get('a', 1) is not None
+    cache.put('c', 1, CachedResponse(b'cccc', 'text/plain', 'c'))
+    # 'b' использовался давнее всех
+    assert cache.get('b', 1) is None
+    assert cache.get('a', 1) is not None
+    assert cache.size == 8
+    # Другое поколение сбрасывает кэш
+    assert cache.get('a', 2) is None
+    assert len(cache) == 0
@@ -0,0 +1,94 @@
+"""
+Тесты параллельного запуска парсеров с лимитом времени на сайт
+"""
+import os
+import threading
+import time
+from urllib.parse import urlparse
+
+import pytest
+
+import parser
+from crawler import HostRateLimiter
+from page_fixtures import ReplayTransport
+from transport import REQUEST_TIMEOUT, set_transport
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+PAGES = {
+    'https://www.rde.ee/': 'rde.html',
+    'https://www.klick.ee/': 'klick.html',
+    'https://www.arvutitark.ee/': 'arvutitark.html',
+}
+SITE_TIMEOUT = 1.0
+# Время ответа быстрых сайтов: вместе с медленным сайтом последовательно дольше SITE_TIMEOUT
+FAST_DELAY = 0.6
+
+
+class SlowTransport(ReplayTransport):
+    """
+    Отдает сохраненные страницы с задержкой FAST_DELAY.
+
+    Хост hanging зависает до release, не соблюдая таймаут запроса (как сервер,
+    отдающий ответ по байту): ограничить его может только лимит времени сайта.
+    """
+
+    def __init__(self, hanging: str):
+        pages = {}
+        for url, name in PAGES.items():
+            with open(os.path.join(FIXTURES_DIR, name), 'rb') as f:
+                pages[url] = f.read()
+        super().__init__(directory=None, pages=pages)
+        self.hanging = hanging
+        self.release = threading.Event()
+
+    def get(self, url, timeout=REQUEST_TIMEOUT, headers=None):
+        if urlparse(url).hostname == self.hanging:
+            self.release.wait(30)
+        else:
+            time.sleep(FAST_DELAY)
+        return super().get(url, timeout=timeout, headers=headers)
+
+
+@pytest.fixture
+def slow_transport(monkeypatch):
+    transport = SlowTransport('www.arvutitark.ee')
+    monkeypatch.setattr(parser, 'RATE_LIMITER', HostRateLimiter(rate=0))
+    previous = set_transport(transport)
+    yield transport
+    transport.release.set()
+    set_transport(previous)
+
+
+def test_slow_site_times_out_and_others_are_saved(slow_transport, db):
+    progress = []
+    started = time.monotonic()
+    report = parser.run_parsers(max_workers=3, site_timeout=SITE_TIMEOUT,
+                                progress=lambda site_name, site: progress.append((site_name, site['status'])))
+    elapsed = time.monotonic() - started
+
+    sites = report['sites']
+    assert sites['Arvutitark']['status'] == 'timeout'
+    assert sites['Arvutitark']['count'] == 0
+    assert sites['RDE']['status'] == sites['Klick']['status'] == 'ok'
+    assert sites['RDE']['count'] > 0 and sites['Klick']['count'] > 0
+    assert {result['site'] for result in report['results']} == {'RDE', 'Klick'}
+    assert ('Arvutitark', 'timeout') in progress
+
+    # Сайты обходятся параллельно: время запуска - время самого медленного сайта, а не сумма
+    assert SITE_TIMEOUT <= elapsed < SITE_TIMEOUT + FAST_DELAY
+
+    crawl = db.record_crawl(report)
+    assert crawl['found'] == crawl['added'] == sites['RDE']['count'] + sites['Klick']['count']
+    assert {product['site'] for product in db.get_active_products()} == {'RDE', 'Klick'}
+
+
+def test_late_response_does_not_change_report(slow_transport):
+    report = parser.run_parsers(max_workers=3, site_timeout=SITE_TIMEOUT)
+    results = list(report['results'])
+
+    # Медленный сайт ответил после дедлайна: его товары в отчет не попадают
+    slow_transport.release.set()
+    time.sleep(0.2)
+    assert report['results'] == results
+    assert report['sites']['Arvutitark']['status'] == 'timeout'
+    assert 'Arvutitark' not in report['pages']
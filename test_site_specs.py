@@ -0,0 +1,91 @@
+"""
+Тесты описаний сайтов (sites.json) и извлечения товаров по CSS-селекторам
+"""
+import json
+import os
+
+import pytest
+from bs4 import BeautifulSoup
+
+from parser import ArvutitarkParser, KlickParser, SpecParser, build_parsers
+from site_specs import SiteSpec, load_specs
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+ARVUTITARK_SPEC = {
+    'name': 'Arvutitark',
+    'base_url': 'https://www.arvutitark.ee/',
+    'selectors': {
+        'container': 'article.product-item',
+        'title': 'h2, h3',
+        'price': '.price-current, .price',
+        'period': '.finance, em',
+    },
+}
+
+
+def extract(spec, html, product_page=False, page_url=None):
+    parser = SpecParser(SiteSpec(spec), html_backend='html.parser')
+    soup = BeautifulSoup(html, parser.html_backend)
+    return parser.extract_page(soup, page_url, product_page)[0]
+
+
+def test_selectors_extract_products():
+    with open(os.path.join(FIXTURES_DIR, 'arvutitark.html'), 'rb') as f:
+        results = extract(ARVUTITARK_SPEC, f.read())
+
+    assert [(r['url'], r['title'], r['price'], r['leasing_period']) for r in results] == [
+        ('https://www.arvutitark.ee/asus-rog-strix-g16', 'ASUS ROG Strix G16 mänguri sülearvuti', '1 549,00 €',
+         '48 месяцев'),
+        ('https://www.arvutitark.ee/dell-xps-13', 'Dell XPS 13 9340', '1 299,00 €', '36 месяцев'),
+        ('https://www.arvutitark.ee/hp-pavilion-15', 'HP Pavilion 15', 'Цена не указана', '48 месяцев'),
+    ]
+
+
+def test_selectors_on_product_page():
+    html = '<h2>Dell XPS 13 9340</h2><article class="product-item"><em>Liising 0% 24 kuud</em></article>'
+    results = extract(ARVUTITARK_SPEC, html, product_page=True, page_url='https://www.arvutitark.ee/dell-xps-13')
+    assert [(r['url'], r['title']) for r in results] == [('https://www.arvutitark.ee/dell-xps-13', 'Dell XPS 13 9340')]
+
+
+def test_leasing_keywords_override():
+    html = '<ul><li><a href="/tv">Samsung QLED televiisor</a> järelmaks 0% 12 kuud</li></ul>'
+    spec = {'name': 'Pood', 'base_url': 'https://pood.ee'}
+    assert extract(spec, html) == []
+
+    spec['leasing_keywords'] = ['järelmaks']
+    assert [r['url'] for r in extract(spec, html)] == ['https://pood.ee/tv']
+    spec['selectors'] = {'container': 'li'}
+    assert [r['leasing_period'] for r in extract(spec, html)] == ['12 месяцев']
+
+
+@pytest.mark.parametrize('spec,message', [
+    ({'base_url': 'https://pood.ee'}, 'name'),
+    ({'name': 'Pood', 'base_url': 'https://pood.ee', 'selector': {}}, 'selector'),
+    ({'name': 'Pood', 'base_url': 'https://pood.ee', 'selectors': {'title': 'h2'}}, 'container'),
+    ({'name': 'Pood', 'base_url': 'https://pood.ee', 'selectors': {'container': 'div['}}, 'CSS'),
+])
+def test_invalid_specs(spec, message):
+    with pytest.raises(ValueError, match=message):
+        SiteSpec(spec)
+
+
+def test_new_shop_is_configuration_only(tmp_path):
+    path = tmp_path / 'sites.json'
+    path.write_text(json.dumps({'sites': [{'name': 'Klick', 'base_url': 'https://www.klick.ee'}, ARVUTITARK_SPEC,
+                                          {'name': 'Pood', 'base_url': 'https://pood.ee'}]}))
+    parsers = build_parsers(str(path))
+
+    assert [type(parser) for parser in parsers] == [KlickParser, ArvutitarkParser, SpecParser]
+    assert 'container' in parsers[1].spec.selectors
+    assert parsers[2].page_url == 'https://pood.ee/'
+    assert [spec.name for spec in load_specs()] == ['RDE', 'Klick', 'Arvutitark']
+
+
+def test_spec_change_changes_extraction_key():
+    parser = SpecParser(SiteSpec(ARVUTITARK_SPEC), html_backend='html.parser')
+    changed = SpecParser(SiteSpec(dict(ARVUTITARK_SPEC, selectors={'container': 'li.product'})),
+                         html_backend='html.parser')
+    assert parser.extraction_key == SpecParser(SiteSpec(ARVUTITARK_SPEC), html_backend='html.parser').extraction_key
+    assert parser.extraction_key != changed.extraction_key
+    assert parser.content_hash(b'<html></html>') != changed.content_hash(b'<html></html>')
@@ -0,0 +1,111 @@
+"""
+Тесты поиска товаров по robots.txt и картам сайта
+"""
+import gzip
+import io
+from datetime import datetime
+
+from crawler import HostRateLimiter
+from parser import RDEParser
+from sitemap import iter_sitemap, parse_lastmod
+from transport import Response, Transport
+
+NS = 'xmlns="http://www.sitemaps.org/schemas/sitemap/0.9"'
+
+SITE = {
+    'https://www.rde.ee/robots.txt': (
+        b'User-agent: *\nDisallow: /et/p/hidden\nSitemap: https://www.rde.ee/sitemap_index.xml\n'
+    ),
+    'https://www.rde.ee/sitemap_index.xml': (
+        f'<sitemapindex {NS}>'
+        '<sitemap><loc>https://www.rde.ee/sitemap-products.xml.gz</loc></sitemap>'
+        '<sitemap><loc>https://www.rde.ee/sitemap_index.xml</loc></sitemap>'
+        '</sitemapindex>'
+    ).encode(),
+    'https://www.rde.ee/sitemap-products.xml.gz': gzip.compress((
+        f'<urlset {NS} xmlns:image="http://www.google.com/schemas/sitemap-image/1.1">'
+        '<url><loc>https://www.rde.ee/et/p/old</loc><lastmod>2024-01-01</lastmod>'
+        '<image:image><image:loc>https://cdn.rde.ee/old.jpg</image:loc></image:image></url>'
+        '<url><loc>https://www.rde.ee/et/p/new</loc><lastmod>2024-06-01T10:00:00</lastmod></url>'
+        '<url><loc>https://www.rde.ee/et/p/hidden</loc></url>'
+        '<url><loc>https://www.rde.ee/et/arvutid</loc></url>'
+        '<url><loc>https://www.example.com/et/p/other</loc></url>'
+        '</urlset>'
+    ).encode()),
+    'https://www.rde.ee/': b'<html><body><p>Pood</p></body></html>',
+    'https://www.rde.ee/et/p/new': (
+        '<html><body><h1>Lenovo IdeaPad 5 14</h1>'
+        '<div><span class="price">699,00 €</span> liising 0% 48 kuud</div></body></html>'
+    ).encode(),
+}
+
+
+class SiteTransport(Transport):
+    """Отдает страницы из SITE и запоминает запросы"""
+
+    def __init__(self):
+        super().__init__()
+        self.requested = []
+
+    def get(self, url, timeout=None, headers=None):
+        self.requested.append(url)
+        if url not in SITE:
+            return Response(url, 404, {}, b'')
+        return Response(url, 200, {}, SITE[url])
+
+
+def make_parser(since=None):
+    parser = RDEParser(transport=SiteTransport(), html_backend='html.parser')
+    parser.max_pages = 10
+    parser.use_sitemaps = True
+    parser.since = since
+    parser.rate_limiter = HostRateLimiter(rate=0, capacity=1)
+    return parser
+
+
+def test_iter_sitemap_plain_and_gzipped():
+    entries = list(iter_sitemap(io.BytesIO(gzip.decompress(SITE['https://www.rde.ee/sitemap-products.xml.gz']))))
+    assert entries == list(iter_sitemap(io.BytesIO(SITE['https://www.rde.ee/sitemap-products.xml.gz'])))
+    # <image:loc> внутри записи не подменяет адрес страницы
+    assert entries[0] == ('url', 'https://www.rde.ee/et/p/old', datetime(2024, 1, 1))
+    assert len(entries) == 5
+
+
+def test_parse_lastmod():
+    assert parse_lastmod('2024-06-01T10:00:00') == datetime(2024, 6, 1, 10)
+    assert parse_lastmod('2024-06-01T10:00:00Z').tzinfo is None
+    assert parse_lastmod('вчера') is None
+    assert parse_lastmod(None) is None
+
+
+def test_discover_follows_robots_and_sitemap_index():
+    parser = make_parser()
+    assert list(parser.discover()) == [
+        ('https://www.rde.ee/et/p/old', datetime(2024, 1, 1)),
+        ('https://www.rde.ee/et/p/new', datetime(2024, 6, 1, 10)),
+    ]
+    # Индекс, ссылающийся сам на себя, читается один раз
+    assert parser.transport.requested.count('https://www.rde.ee/sitemap_index.xml') == 1
+
+
+def test_only_changed_pages_are_fetched():
+    parser = make_parser(since=datetime(2024, 3, 1))
+    results = parser.parse()
+
+    assert [(r['url'], r['title'], r['leasing_period']) for r in results] == [
+        ('https://www.rde.ee/et/p/new', 'Lenovo IdeaPad 5 14', '48 месяцев'),
+    ]
+    assert 'https://www.rde.ee/et/p/old' not in parser.transport.requested
+    assert parser.listed_urls == {'https://www.rde.ee/et/p/old'}
+
+
+def test_listed_products_stay_active(db):
+    product = {'site': 'RDE', 'title': 'Vana', 'url': 'https://www.rde.ee/et/p/old', 'price': '1 €'}
+    gone = {'site': 'RDE', 'title': 'Kadunud', 'url': 'https://www.rde.ee/et/p/gone', 'price': '1 €'}
+    db.record_crawl({'results': [product, gone], 'sites': {'RDE': {'status': 'ok'}}})
+    assert set(db.get_last_crawl_times()) == {'RDE'}
+
+    crawl = db.record_crawl({'results': [], 'sites': {'RDE': {'status': 'ok'}},
+                             'listed': {'RDE': ['https://www.rde.ee/et/p/old']}})
+    assert crawl['disappeared'] == 1
+    assert [p['title'] for p in db.get_active_products()] == ['Vana']
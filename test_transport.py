@@ -0,0 +1,225 @@
+"""
+Тесты HTTP-транспорта на локальном тестовом сервере (без обращения к реальным сайтам)
+"""
+import asyncio
+import gzip
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import brotli
+import pytest
+
+from http_cache import CachingTransport, HttpCache
+import parser as parser_module
+from parser import LeasingParser
+from transport import RequestsTransport
+
+PAGE = '<html><body><div><a href="/p/1">Товар</a> liising 0% 48 kuud</div></body></html>'.encode('utf-8')
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Имитирует сайт магазина: отдает страницы с разными Content-Encoding"""
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        with self.server.stats_lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        with self.server.stats_lock:
+            self.server.active += 1
+            self.server.requests += 1
+            self.server.max_active = max(self.server.max_active, self.server.active)
+        try:
+            time.sleep(self.server.delay)
+            body = PAGE
+            encoding = None
+            if self.path.startswith('/etag'):
+                if self.headers.get('If-None-Match') == '"v1"':
+                    self.server.not_modified += 1
+                    self.send_response(304)
+                    self.send_header('ETag', '"v1"')
+                    self.end_headers()
+                    return
+            if self.path.startswith('/gzip'):
+                body, encoding = gzip.compress(PAGE), 'gzip'
+            elif self.path.startswith('/deflate'):
+                body, encoding = zlib.compress(PAGE), 'deflate'
+            elif self.path.startswith('/brotli'):
+                body, encoding = brotli.compress(PAGE), 'br'
+            elif self.path.startswith('/missing'):
+                self.send_response(404)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            if self.path.startswith('/etag'):
+                self.send_header('ETag', '"v1"')
+            if encoding:
+                self.send_header('Content-Encoding', encoding)
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with self.server.stats_lock:
+                self.server.active -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    httpd.stats_lock = threading.Lock()
+    httpd.connections = 0
+    httpd.active = 0
+    httpd.max_active = 0
+    httpd.requests = 0
+    httpd.not_modified = 0
+    httpd.delay = 0
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    httpd.base_url = f'http://127.0.0.1:{httpd.server_address[1]}'
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_decodes_compressed_responses(server):
+    transport = RequestsTransport()
+    for path in ('/plain', '/gzip', '/deflate', '/brotli'):
+        response = transport.get(server.base_url + path)
+        assert response.status_code == 200
+        assert response.content == PAGE
+    transport.close()
+
+
+def test_keep_alive_reuses_connection(server):
+    transport = RequestsTransport()
+    for _ in range(5):
+        transport.get(server.base_url + '/plain')
+    assert server.connections == 1
+    transport.close()
+
+
+def test_async_requests_respect_per_host_limit(server):
+    server.delay = 0.05
+    transport = RequestsTransport(per_host_limit=2, max_workers=8)
+
+    async def fetch_all():
+        urls = [f'{server.base_url}/gzip?{i}' for i in range(8)]
+        return await asyncio.gather(*(transport.aget(url) for url in urls))
+
+    responses = asyncio.run(fetch_all())
+    assert all(r.content == PAGE for r in responses)
+    assert server.max_active <= 2
+    assert server.connections <= 2
+    transport.close()
+
+
+def test_parser_get_pages_shares_transport(server):
+    transport = RequestsTransport()
+    parser = LeasingParser('Test', server.base_url, transport=transport)
+    urls = [server.base_url + '/plain', server.base_url + '/gzip', server.base_url + '/missing']
+    pages = parser.get_pages(urls)
+    assert pages[urls[0]].find('a')['href'] == '/p/1'
+    assert pages[urls[1]].get_text() == pages[urls[0]].get_text()
+    assert pages[urls[2]] is None
+    transport.close()
+
+
+class StubParser(LeasingParser):
+    """Парсер, считающий вызовы extract"""
+
+    def __init__(self, base_url, transport):
+        super().__init__('Test', base_url, transport=transport)
+        self.extract_calls = 0
+
+    def extract(self, soup):
+        self.extract_calls += 1
+        link = soup.find('a')
+        return [{'site': self.site_name, 'title': link.get_text(), 'url': link['href'],
+                 'found_at': '2024-01-01T00:00:00'}]
+
+
+def test_conditional_get_skips_extraction(server, tmp_path):
+    transport = CachingTransport(RequestsTransport(), HttpCache(str(tmp_path)))
+    parser = StubParser(server.base_url + '/etag', transport)
+
+    first = parser.parse()
+    second = parser.parse()
+
+    assert server.not_modified == 1
+    assert parser.extract_calls == 1
+    assert [r['url'] for r in second] == [r['url'] for r in first]
+    assert second[0]['found_at'] != first[0]['found_at']
+    transport.close()
+
+
+def test_cached_results_follow_extraction_version(server, tmp_path, monkeypatch):
+    transport = CachingTransport(RequestsTransport(), HttpCache(str(tmp_path)))
+    parser = StubParser(server.base_url + '/etag', transport)
+    parser.parse()
+
+    # После изменения логики извлечения страница (ответ 304) разбирается заново
+    monkeypatch.setattr(parser_module, 'EXTRACTION_VERSION', parser_module.EXTRACTION_VERSION + 1)
+    parser.parse()
+    assert server.not_modified == 1
+    assert parser.extract_calls == 2
+
+    parser.parse()
+    assert parser.extract_calls == 2
+    transport.close()
+
+
+def test_cache_evicts_over_size_limit(server, tmp_path):
+    cache = HttpCache(str(tmp_path))
+    transport = CachingTransport(RequestsTransport(), cache)
+    transport.get(f'{server.base_url}/plain?0')
+    entry_size = sum(path.stat().st_size for path in tmp_path.iterdir())
+    cache.max_size = entry_size * 3
+    for i in range(1, 10):
+        transport.get(f'{server.base_url}/plain?{i}')
+    assert cache.lookup(f'{server.base_url}/plain?0') is None
+    assert cache.lookup(f'{server.base_url}/plain?9') is not None
+    transport.close()
+
+
+def test_cache_does_not_rescan_directory_on_every_store(server, tmp_path, monkeypatch):
+    cache = HttpCache(str(tmp_path), evict_every=5)
+    scans = []
+    evict = cache.evict
+    monkeypatch.setattr(cache, 'evict', lambda: scans.append(1) or evict())
+    transport = CachingTransport(RequestsTransport(), cache)
+    for i in range(12):
+        transport.get(f'{server.base_url}/plain?{i}')
+    # Первая запись подсчитывает размер, дальше - просмотр раз в 5 записей
+    assert len(scans) == 3
+    assert cache._size == sum(path.stat().st_size for path in tmp_path.iterdir())
+
+    # Превышение размера вызывает просмотр сразу
+    cache.max_size = cache._size
+    transport.get(f'{server.base_url}/plain?12')
+    assert len(scans) == 4
+    assert cache._size <= cache.max_size
+    transport.close()
+
+
+def test_concurrent_identical_requests_are_coalesced(server, tmp_path):
+    server.delay = 0.2
+    transport = CachingTransport(RequestsTransport(), HttpCache(str(tmp_path)))
+    url = server.base_url + '/plain'
+    responses = []
+    threads = [threading.Thread(target=lambda: responses.append(transport.get(url))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(responses) == 5
+    assert server.requests == 1
+    transport.close()
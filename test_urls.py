@@ -0,0 +1,31 @@
+"""
+Тесты канонизации URL и дедупликации
+"""
+from urls import DedupIndex, canonicalize_url
+
+BASE = 'https://www.rde.ee/'
+
+
+def test_relative_and_absolute_links_match():
+    expected = 'https://www.rde.ee/et/p/lenovo'
+    assert canonicalize_url('/et/p/lenovo', BASE) == expected
+    assert canonicalize_url('et/p/lenovo/', BASE) == expected
+    assert canonicalize_url('HTTPS://WWW.RDE.EE:443/et/p/lenovo#reviews', BASE) == expected
+    assert canonicalize_url('https://www.rde.ee/et/p/lenovo?utm_source=fb&gclid=1', BASE) == expected
+
+
+def test_query_is_sorted_and_kept():
+    assert canonicalize_url('/p?b=2&a=1&utm_medium=x', BASE) == 'https://www.rde.ee/p?a=1&b=2'
+    assert canonicalize_url('/', BASE) == 'https://www.rde.ee/'
+
+
+def test_non_page_links_are_skipped():
+    for href in ('', '  ', '#', '#top', 'javascript:void(0)', 'mailto:info@rde.ee', 'tel:+372555', 'ftp://x.ee/f'):
+        assert canonicalize_url(href, BASE) is None
+
+
+def test_dedup_index():
+    index = DedupIndex()
+    assert index.add('https://www.rde.ee/p')
+    assert not index.add('https://www.rde.ee/p')
+    assert len(index) == 1
@@ -0,0 +1,268 @@
+"""
+Общий HTTP-транспорт для всех парсеров: пул keep-alive соединений и асинхронные запросы
+"""
+import asyncio
+import functools
+import io
+import logging
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.request import ACCEPT_ENCODING
+
+from metrics import HTTP_PHASE_SECONDS, METRICS_ENABLED
+
+logger = logging.getLogger(__name__)
+
+# Таймаут одного HTTP-запроса (секунды)
+REQUEST_TIMEOUT = 10
+# Максимум одновременных соединений к одному хосту
+PER_HOST_LIMIT = int(os.environ.get('PARSER_PER_HOST_LIMIT', '4'))
+# Размер пула соединений и число потоков для асинхронных запросов
+MAX_CONNECTIONS = int(os.environ.get('PARSER_MAX_CONNECTIONS', '16'))
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+
+class Response:
+    """Ответ транспорта, не зависящий от используемой HTTP-библиотеки"""
+
+    def __init__(self, url: str, status_code: int, headers, content: bytes):
+        self.url = url
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers or {})
+        self.content = content
+        # Заполняются кэширующим транспортом (http_cache.CachingTransport)
+        self.from_cache = False
+        self.body_hash = None
+
+    def raise_for_status(self):
+        """Выбрасывает requests.HTTPError для ответов 4xx/5xx"""
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} для {self.url}")
+
+
+class Transport:
+    """
+    Базовый транспорт: синхронный get() и его awaitable-вариант aget().
+
+    Подклассы реализуют get(); aget() выполняет его в общем пуле потоков,
+    ограничивая число одновременных запросов к одному хосту.
+    """
+
+    def __init__(self, per_host_limit: int = PER_HOST_LIMIT, max_workers: int = MAX_CONNECTIONS):
+        self.per_host_limit = per_host_limit
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._executor = None
+        self._host_locks: Dict[str, threading.BoundedSemaphore] = {}
+        # Семафоры asyncio привязаны к event loop, поэтому храним их по циклам
+        self._async_host_locks = weakref.WeakKeyDictionary()
+
+    def get(self, url: str, timeout: float = REQUEST_TIMEOUT,
+            headers: Optional[Dict[str, str]] = None) -> Response:
+        """Выполняет GET-запрос"""
+        raise NotImplementedError("Метод get должен быть реализован в подклассе")
+
+    @contextmanager
+    def stream(self, url: str, timeout: float = REQUEST_TIMEOUT,
+               headers: Optional[Dict[str, str]] = None):
+        """
+        Открывает тело ответа как файлоподобный объект с read().
+
+        Выбрасывает requests.HTTPError для ответов 4xx/5xx. Базовая реализация
+        загружает ответ целиком через get(); подклассы читают тело по частям.
+        """
+        response = self.get(url, timeout=timeout, headers=headers)
+        response.raise_for_status()
+        yield io.BytesIO(response.content)
+
+    async def aget(self, url: str, timeout: float = REQUEST_TIMEOUT,
+                   headers: Optional[Dict[str, str]] = None) -> Response:
+        """Асинхронный вариант get()"""
+        loop = asyncio.get_running_loop()
+        async with self._async_host_lock(loop, urlsplit(url).netloc):
+            return await loop.run_in_executor(
+                self._get_executor(), functools.partial(self.get, url, timeout, headers)
+            )
+
+    @contextmanager
+    def host_slot(self, url: str):
+        """Занимает одно из per_host_limit соединений к хосту url"""
+        host = urlsplit(url).netloc
+        with self._lock:
+            semaphore = self._host_locks.get(host)
+            if semaphore is None:
+                semaphore = self._host_locks[host] = threading.BoundedSemaphore(self.per_host_limit)
+        with semaphore:
+            yield
+
+    def _async_host_lock(self, loop, host: str) -> asyncio.Semaphore:
+        with self._lock:
+            locks = self._async_host_locks.setdefault(loop, {})
+            if host not in locks:
+                locks[host] = asyncio.Semaphore(self.per_host_limit)
+            return locks[host]
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix='transport')
+            return self._executor
+
+    def close(self):
+        """Освобождает пул потоков"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+
+# Время установки соединений (DNS, TCP, TLS) за текущий запрос потока
+_connect_time = threading.local()
+
+
+class _TimedConnectMixin:
+    """Учитывает время connect() соединения urllib3 в _connect_time"""
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            _connect_time.seconds = getattr(_connect_time, 'seconds', 0.0) + time.perf_counter() - started
+
+
+class _TimedHTTPConnection(_TimedConnectMixin, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnectMixin, HTTPSConnection):
+    pass
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter, соединения которого замеряют время установки (для метрик фаз запроса)"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _TimedHTTPConnectionPool,
+            'https': _TimedHTTPSConnectionPool,
+        }
+
+
+class RequestsTransport(Transport):
+    """
+    Транспорт на общей requests.Session с пулом keep-alive соединений.
+
+    Ответы в gzip, deflate и brotli (пакет brotli из requirements.txt) распаковываются urllib3;
+    без пакета brotli заголовок Accept-Encoding его не предлагает.
+    """
+
+    def __init__(self, per_host_limit: int = PER_HOST_LIMIT, max_workers: int = MAX_CONNECTIONS):
+        super().__init__(per_host_limit, max_workers)
+        self.session = requests.Session()
+        adapter_class = TimedHTTPAdapter if METRICS_ENABLED else HTTPAdapter
+        adapter = adapter_class(pool_connections=max_workers, pool_maxsize=max(per_host_limit, 1))
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({
+            'User-Agent': USER_AGENT,
+            'Accept-Encoding': ACCEPT_ENCODING,
+        })
+
+    def get(self, url: str, timeout: float = REQUEST_TIMEOUT,
+            headers: Optional[Dict[str, str]] = None) -> Response:
+        with self.host_slot(url):
+            if not METRICS_ENABLED:
+                response = self.session.get(url, timeout=timeout, headers=headers)
+                return Response(response.url, response.status_code, response.headers, response.content)
+            _connect_time.seconds = 0.0
+            started = time.perf_counter()
+            response = self.session.get(url, timeout=timeout, headers=headers)
+            self._observe_phases(url, response, time.perf_counter() - started)
+            return Response(response.url, response.status_code, response.headers, response.content)
+
+    @staticmethod
+    def _observe_phases(url: str, response: requests.Response, total: float):
+        """
+        Раскладывает время запроса на фазы: connect (установка новых соединений),
+        wait (отправка запроса и ожидание заголовков ответа) и download (чтение тела).
+        """
+        host = urlsplit(url).netloc
+        connect = _connect_time.seconds
+        # elapsed в requests - время до заголовков ответа, с учетом перенаправлений
+        headers_received = sum(r.elapsed.total_seconds() for r in response.history + [response])
+        if connect:
+            HTTP_PHASE_SECONDS.observe(connect, host, 'connect')
+        HTTP_PHASE_SECONDS.observe(max(0.0, headers_received - connect), host, 'wait')
+        HTTP_PHASE_SECONDS.observe(max(0.0, total - headers_received), host, 'download')
+
+    @contextmanager
+    def stream(self, url: str, timeout: float = REQUEST_TIMEOUT,
+               headers: Optional[Dict[str, str]] = None):
+        """Тело ответа читается из соединения по мере чтения, без загрузки в память"""
+        with self.host_slot(url):
+            with self.session.get(url, timeout=timeout, headers=headers, stream=True) as response:
+                Response(response.url, response.status_code, response.headers, b'').raise_for_status()
+                # Content-Encoding (gzip, deflate) снимается при чтении
+                response.raw.decode_content = True
+                # Поток закрывается при выходе из with, а не по концу тела (io.BufferedReader)
+                response.raw.auto_close = False
+                yield response.raw
+
+    def close(self):
+        super().close()
+        self.session.close()
+
+
+_transport: Optional[Transport] = None
+_transport_lock = threading.Lock()
+
+
+def get_transport() -> Transport:
+    """
+    Возвращает общий для всех парсеров транспорт (создается при первом вызове).
+
+    Если задан каталог HTTP-кэша (PARSER_HTTP_CACHE_DIR), запросы идут через кэш.
+    """
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            _transport = RequestsTransport()
+            from http_cache import CACHE_DIR, CachingTransport, HttpCache
+            if CACHE_DIR:
+                try:
+                    _transport = CachingTransport(_transport, HttpCache(CACHE_DIR))
+                except OSError as e:
+                    logger.warning(f"HTTP-кэш отключен, каталог {CACHE_DIR} недоступен: {e}")
+        return _transport
+
+
+def set_transport(transport: Optional[Transport]) -> Optional[Transport]:
+    """Заменяет общий транспорт (например, в тестах). Возвращает предыдущий."""
+    global _transport
+    with _transport_lock:
+        previous, _transport = _transport, transport
+        return previous
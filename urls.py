@@ -0,0 +1,74 @@
+"""
+Канонизация URL товаров и дедупликация в пределах одного запуска парсинга
+"""
+import threading
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+
+# Параметры запроса, которые не меняют товар (метки рекламных кампаний)
+TRACKING_PARAM_PREFIXES = ('utm_',)
+TRACKING_PARAMS = {'gclid', 'fbclid', 'yclid', 'msclkid', 'mc_cid', 'mc_eid', '_ga'}
+# Ссылки, которые не ведут на страницы
+SKIP_PREFIXES = ('javascript:', 'mailto:', 'tel:', 'data:')
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def canonicalize_url(href: str, base_url: str) -> Optional[str]:
+    """
+    Приводит ссылку к каноническому абсолютному URL.
+
+    Относительные ссылки разрешаются относительно base_url, схема и хост
+    приводятся к нижнему регистру, порт по умолчанию, фрагмент, метки utm_*
+    и завершающий слэш отбрасываются, параметры запроса сортируются.
+    Возвращает None для пустых ссылок, якорей и не-HTTP схем.
+    """
+    href = (href or '').strip()
+    if not href or href.startswith('#') or href.lower().startswith(SKIP_PREFIXES):
+        return None
+
+    parts = urlsplit(urljoin(base_url, href))
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS or not parts.hostname:
+        return None
+
+    netloc = parts.hostname.lower()
+    if parts.port and parts.port != DEFAULT_PORTS[scheme]:
+        netloc = f"{netloc}:{parts.port}"
+
+    path = parts.path or '/'
+    if len(path) > 1:
+        path = path.rstrip('/') or '/'
+
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMS and not key.lower().startswith(TRACKING_PARAM_PREFIXES)
+    )
+    return urlunsplit((scheme, netloc, path, urlencode(query), ''))
+
+
+class DedupIndex:
+    """
+    Множество канонических URL, уже найденных за текущий запуск парсинга.
+
+    Один индекс разделяется всеми парсерами запуска (в том числе работающими
+    в разных потоках), поэтому товар, найденный на нескольких сайтах или
+    страницах, попадает в результаты один раз.
+    """
+
+    def __init__(self):
+        self._seen = set()
+        self._lock = threading.Lock()
+
+    def add(self, url: str) -> bool:
+        """Добавляет url. Возвращает False, если он уже был в индексе."""
+        with self._lock:
+            if url in self._seen:
+                return False
+            self._seen.add(url)
+            return True
+
+    def __contains__(self, url: str) -> bool:
+        return url in self._seen
+
+    def __len__(self) -> int:
+        return len(self._seen)